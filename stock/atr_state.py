@@ -0,0 +1,217 @@
+import sqlite3
+import time
+
+import numpy as np
+
+from bar_cache import BarCache
+
+
+def true_ranges(high, low, close):
+    """True range of every bar after the first, along the last axis."""
+    high, low, close = (np.asarray(v, dtype=float) for v in (high, low, close))
+    prev_close = close[..., :-1]
+    h, l = high[..., 1:], low[..., 1:]
+    return np.maximum(h - l, np.maximum(np.abs(h - prev_close), np.abs(l - prev_close)))
+
+
+def wilder_atr_batch(high, low, close, period=14):
+    """
+    Wilder ATR of the last bar, vectorized along the last axis (so a 2-D
+    symbols x bars block is one call). Same definition as the scanners'
+    _wilder_atr: seeded with the mean of the first `period` true ranges, then
+    atr = (atr * (period - 1) + tr) / period. NaN where there are too few bars.
+    """
+    tr = true_ranges(high, low, close)
+    n = tr.shape[-1]
+    if n < period:
+        return np.full(tr.shape[:-1], np.nan) if tr.ndim > 1 else np.nan
+    seed = tr[..., :period].mean(axis=-1)
+    rest = tr[..., period:]
+    a = 1.0 / period
+    m = rest.shape[-1]
+    # Unrolled recursion: atr_m = seed*(1-a)^m + sum_i a*(1-a)^(m-1-i) * tr_i
+    weights = a * (1.0 - a) ** np.arange(m - 1, -1, -1)
+    atr = seed * (1.0 - a) ** m + rest @ weights
+    return atr if np.ndim(atr) else float(atr)
+
+
+class ATRState:
+    """
+    Streaming Wilder ATR for one (symbol, bar size, period).
+
+    Holds only what the recursion needs (current ATR, previous close, seed
+    accumulator, timestamp of the last folded bar), so each closed bar is folded
+    in O(1) and a still-forming bar can be evaluated with peek() without
+    committing it.
+    """
+
+    __slots__ = ('period', 'atr', 'prev_close', 'seed_sum', 'seed_count', 'last_ts', 'bars', 'dirty')
+
+    def __init__(self, period=14):
+        self.period = int(period)
+        self.atr = None
+        self.prev_close = None
+        self.seed_sum = 0.0
+        self.seed_count = 0
+        self.last_ts = None
+        self.bars = 0
+        self.dirty = False
+
+    @staticmethod
+    def _ts(bar):
+        return BarCache._to_ts(bar.date)
+
+    def _next(self, high, low, close):
+        """(atr, seed_sum, seed_count) after one more bar; None ATR until the seed is full."""
+        if self.prev_close is None:
+            return self.atr, self.seed_sum, self.seed_count
+        pc = self.prev_close
+        tr = max(high - low, abs(high - pc), abs(low - pc))
+        if self.seed_count < self.period:
+            seed_sum, seed_count = self.seed_sum + tr, self.seed_count + 1
+            return (seed_sum / self.period if seed_count == self.period else None), seed_sum, seed_count
+        return (self.atr * (self.period - 1) + tr) / self.period, self.seed_sum, self.seed_count
+
+    def update(self, bar):
+        """Fold one closed bar. Bars at or before the last folded one are ignored."""
+        ts = self._ts(bar)
+        if self.last_ts is not None and ts <= self.last_ts:
+            return self.atr
+        self.atr, self.seed_sum, self.seed_count = self._next(bar.high, bar.low, bar.close)
+        self.prev_close = bar.close
+        self.last_ts = ts
+        self.bars += 1
+        self.dirty = True
+        return self.atr
+
+    def extend(self, bars):
+        """
+        Fold the closed bars newer than the state. Walks back from the end only as far
+        as the last folded bar, so the cost is the number of new bars, not the history.
+        Returns False when bars don't connect to the state (gap or empty state).
+        """
+        if self.last_ts is None:
+            return False
+        i = len(bars)
+        while i > 0:
+            ts = self._ts(bars[i - 1])
+            if ts == self.last_ts:
+                break
+            if ts < self.last_ts:
+                return False
+            i -= 1
+        else:
+            return False
+        for bar in bars[i:]:
+            self.update(bar)
+        return True
+
+    def peek(self, bar):
+        """ATR with a provisional (still forming) bar included, without committing it."""
+        if bar is None or (self.last_ts is not None and self._ts(bar) <= self.last_ts):
+            return self.atr
+        return self._next(bar.high, bar.low, bar.close)[0]
+
+    @classmethod
+    def from_bars(cls, bars, period=14):
+        """Cold start from a bar list with one vectorized pass instead of a Python replay."""
+        state = cls(period)
+        if not bars:
+            return state
+        high = np.fromiter((b.high for b in bars), float, len(bars))
+        low = np.fromiter((b.low for b in bars), float, len(bars))
+        close = np.fromiter((b.close for b in bars), float, len(bars))
+        tr = true_ranges(high, low, close)
+        state.seed_count = min(len(tr), state.period)
+        state.seed_sum = float(tr[:state.period].sum())
+        if len(tr) >= state.period:
+            state.atr = float(wilder_atr_batch(high, low, close, period))
+        state.prev_close = float(close[-1])
+        state.last_ts = cls._ts(bars[-1])
+        state.bars = len(bars)
+        state.dirty = True
+        return state
+
+
+class ATRStore:
+    """
+    ATR states keyed by (conId, bar size, period), kept in memory and persisted
+    to SQLite next to the bar cache (same file) so a restart resumes the
+    recursion instead of replaying history. path=None keeps them in memory only.
+    """
+
+    def __init__(self, path='bar_cache.sqlite'):
+        self.path = path
+        self.states = {}
+        self.cold_starts = 0
+        self.incremental = 0
+        self.conn = None
+        if path:
+            self.conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS atr_state (
+                    con_id INTEGER NOT NULL,
+                    bar_size TEXT NOT NULL,
+                    period INTEGER NOT NULL,
+                    atr REAL, prev_close REAL, seed_sum REAL NOT NULL, seed_count INTEGER NOT NULL,
+                    last_ts TEXT, bars INTEGER NOT NULL, updated_at REAL NOT NULL,
+                    PRIMARY KEY (con_id, bar_size, period)
+                )
+            """)
+            self.conn.commit()
+
+    def get(self, con_id, bar_size, period):
+        key = (con_id, bar_size, int(period))
+        if key in self.states:
+            return self.states[key]
+        if self.conn is None:
+            return None
+        row = self.conn.execute(
+            "SELECT atr, prev_close, seed_sum, seed_count, last_ts, bars FROM atr_state "
+            "WHERE con_id=? AND bar_size=? AND period=?", key
+        ).fetchone()
+        if not row:
+            return None
+        state = ATRState(period)
+        state.atr, state.prev_close, state.seed_sum, state.seed_count, state.last_ts, state.bars = row
+        self.states[key] = state
+        return state
+
+    def put(self, con_id, bar_size, state):
+        self.states[(con_id, bar_size, state.period)] = state
+        if self.conn is None or not state.dirty:
+            return
+        self.conn.execute(
+            "INSERT OR REPLACE INTO atr_state "
+            "(con_id, bar_size, period, atr, prev_close, seed_sum, seed_count, last_ts, bars, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (con_id, bar_size, state.period, state.atr, state.prev_close, state.seed_sum,
+             state.seed_count, state.last_ts, state.bars, time.time())
+        )
+        self.conn.commit()
+        state.dirty = False
+
+    def atr(self, con_id, bar_size, bars, period=14):
+        """
+        ATR of bars with the last (possibly still forming) bar included provisionally.
+        Closed bars are folded into the stored state once; a state that doesn't
+        connect to these bars is rebuilt with the vectorized cold start.
+        """
+        if not bars:
+            return None
+        closed, forming = bars[:-1], bars[-1]
+        state = self.get(con_id, bar_size, period)
+        if state is not None and state.extend(closed):
+            self.incremental += 1
+        else:
+            state = ATRState.from_bars(closed, period)
+            self.cold_starts += 1
+        self.put(con_id, bar_size, state)
+        return state.peek(forming)
+
+    def summary(self):
+        return f"{len(self.states)} states | incremental {self.incremental} | cold starts {self.cold_starts}"
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
@@ -0,0 +1,169 @@
+import math
+import sqlite3
+import time
+from collections import namedtuple
+from datetime import date, datetime, timezone
+
+# Same attribute names as ib_insync.BarData so _wilder_atr and friends work unchanged
+CachedBar = namedtuple('CachedBar', ['date', 'open', 'high', 'low', 'close', 'volume'])
+
+BAR_SIZE_SECONDS = {
+    '1 secs': 1, '5 secs': 5, '10 secs': 10, '15 secs': 15, '30 secs': 30,
+    '1 min': 60, '2 mins': 120, '3 mins': 180, '5 mins': 300, '10 mins': 600,
+    '15 mins': 900, '20 mins': 1200, '30 mins': 1800,
+    '1 hour': 3600, '2 hours': 7200, '3 hours': 10800, '4 hours': 14400, '8 hours': 28800,
+    '1 day': 86400,
+}
+SCHEMA_VERSION = 1  # bumped when stored rows can't be read by the current code
+
+
+class BarCache:
+    """
+    Local SQLite store of historical bars keyed by (conId, bar size, bar date).
+
+    Both scanners read from here first and only ask IB for the missing tail:
+    the durationStr of the refresh request is computed from the last cached bar
+    (the last bar itself is re-requested since it may still be forming).
+    If the series was refreshed less than max_age_secs ago no request is needed at all.
+    """
+
+    def __init__(self, path='bar_cache.sqlite', max_age_secs=300):
+        self.path = path
+        self.max_age_secs = float(max_age_secs)
+        self.conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)  # shared by sharded workers
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS bars (
+                con_id INTEGER NOT NULL,
+                bar_size TEXT NOT NULL,
+                ts TEXT NOT NULL,
+                open REAL, high REAL, low REAL, close REAL, volume REAL,
+                PRIMARY KEY (con_id, bar_size, ts)
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS series (
+                con_id INTEGER NOT NULL,
+                bar_size TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                window_bars INTEGER NOT NULL,
+                PRIMARY KEY (con_id, bar_size)
+            )
+        """)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            # Before version 1, naive TWS-local intraday times were stored as if they were UTC
+            self.conn.execute("DELETE FROM bars WHERE bar_size != '1 day'")
+            self.conn.execute("DELETE FROM series WHERE bar_size != '1 day'")
+            if self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'atr_state'").fetchone():
+                self.conn.execute("DELETE FROM atr_state WHERE bar_size != '1 day'")  # ATRStore, same file
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.commit()
+        self.hits = 0
+        self.partial_refreshes = 0
+        self.full_fetches = 0
+
+    # ---------- Date helpers ----------
+    @staticmethod
+    def _to_ts(d):
+        """Bar date -> UTC timestamp string; naive datetimes are local time (ib_insync with formatDate=1)"""
+        if isinstance(d, datetime):
+            return d.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+        return d.isoformat()
+
+    @staticmethod
+    def _from_ts(ts):
+        if len(ts) == 10:
+            return date.fromisoformat(ts)
+        return datetime.fromisoformat(ts).replace(tzinfo=timezone.utc)
+
+    @staticmethod
+    def _duration_secs(duration):
+        n, unit = duration.split()
+        return int(n) * {'S': 1, 'D': 86400, 'W': 7 * 86400, 'M': 31 * 86400, 'Y': 366 * 86400}[unit]
+
+    # ---------- Reads ----------
+    def _series(self, con_id, bar_size):
+        return self.conn.execute(
+            "SELECT fetched_at, window_bars FROM series WHERE con_id=? AND bar_size=?",
+            (con_id, bar_size)
+        ).fetchone()
+
+    def load(self, con_id, bar_size, limit=None):
+        """Cached bars, oldest first. limit defaults to the window size of the last full fetch."""
+        if limit is None:
+            series = self._series(con_id, bar_size)
+            limit = series[1] if series else -1
+        rows = self.conn.execute(
+            "SELECT ts, open, high, low, close, volume FROM bars "
+            "WHERE con_id=? AND bar_size=? ORDER BY ts DESC LIMIT ?",
+            (con_id, bar_size, limit)
+        ).fetchall()
+        return [CachedBar(self._from_ts(r[0]), *r[1:]) for r in reversed(rows)]
+
+    def fetched_at(self, con_id, bar_size):
+        """Epoch of the last request that refreshed this series, or None"""
+        series = self._series(con_id, bar_size)
+        return series[0] if series else None
+
+    def refresh_duration(self, con_id, bar_size, full_duration):
+        """
+        durationStr needed to bring the series up to date:
+          None          -> cache is fresh, no request needed
+          full_duration -> nothing usable cached, do the full request
+          otherwise     -> a short duration covering only the missing tail
+        """
+        series = self._series(con_id, bar_size)
+        if not series:
+            return full_duration
+        fetched_at, _ = series
+        if time.time() - fetched_at < self.max_age_secs:
+            self.hits += 1
+            return None
+
+        last = self.conn.execute(
+            "SELECT MAX(ts) FROM bars WHERE con_id=? AND bar_size=?", (con_id, bar_size)
+        ).fetchone()[0]
+        if last is None:
+            return full_duration
+
+        last_dt = self._from_ts(last)
+        bar_secs = BAR_SIZE_SECONDS.get(bar_size, 86400)
+        if isinstance(last_dt, datetime):
+            gap_secs = (datetime.now(timezone.utc) - last_dt).total_seconds() + bar_secs
+        else:
+            gap_secs = ((date.today() - last_dt).days + 1) * 86400
+
+        if gap_secs >= self._duration_secs(full_duration):
+            return full_duration
+        if bar_secs >= 86400 or gap_secs > 86400:
+            # IB only accepts 'S' durations up to one day
+            return f"{max(1, math.ceil(gap_secs / 86400))} D"
+        return f"{int(math.ceil(gap_secs))} S"
+
+    # ---------- Writes ----------
+    def update(self, con_id, bar_size, bars, full_fetch):
+        """Upsert freshly fetched bars and return the cached window (same length as a full fetch)."""
+        if not bars and full_fetch:
+            return bars  # nothing to anchor a series on; try again next time
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO bars (con_id, bar_size, ts, open, high, low, close, volume) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(con_id, bar_size, self._to_ts(b.date), b.open, b.high, b.low, b.close, b.volume) for b in bars]
+        )
+        series = self._series(con_id, bar_size)
+        window_bars = len(bars) if (full_fetch or not series) else series[1]
+        self.conn.execute(
+            "INSERT OR REPLACE INTO series (con_id, bar_size, fetched_at, window_bars) VALUES (?, ?, ?, ?)",
+            (con_id, bar_size, time.time(), window_bars)
+        )
+        self.conn.commit()
+        if full_fetch:
+            self.full_fetches += 1
+        else:
+            self.partial_refreshes += 1
+        return self.load(con_id, bar_size, limit=window_bars)
+
+    def summary(self):
+        return f"hits {self.hits} | tail refreshes {self.partial_refreshes} | full fetches {self.full_fetches}"
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,357 @@
+"""
+End-to-end benchmark: both scanners' staged scans (pre-screen, option chains, scoring,
+CSV) against replayed market sessions of 50, 500 and 5,000 symbols, plus the two run
+as strategies of one scan_engine.ScanEngine pass ('combined').
+
+For every (scanner, universe size) it reports wall time, time per stage, IB requests
+per limit class (with the time those requests would need at IB's pacing limits) and
+peak RSS. Each case runs in a fresh process so RSS is its own. Sessions come from the
+synthetic market (recorded once into benchmarks/sessions/) or from a real session
+recorded with ib_replay.RecordingIB.
+
+Run from the stock/ directory:
+    python benchmarks/bench_scanners.py                        # 50 / 500 / 5000 synthetic symbols
+    python benchmarks/bench_scanners.py --save-baseline        # store these numbers as the baseline
+    python benchmarks/bench_scanners.py --check                # exit 1 if a case regressed past --threshold
+    python benchmarks/bench_scanners.py --session ib_session.jsonl.gz --time-scale 1.0
+"""
+import argparse
+import contextlib
+import importlib
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+from ib_replay import ReplayIB  # noqa: E402
+from prescreen import StageTimer  # noqa: E402
+from shard_scan import SCANNERS, _scanner_class  # noqa: E402
+import slack_notify  # noqa: E402
+from synthetic_market import SyntheticRecorder, synthetic_symbols  # noqa: E402
+
+SESSIONS_DIR = os.path.join(HERE, 'sessions')
+DEFAULT_BASELINE = os.path.join(HERE, 'scanner_baseline.json')
+STAGES = ['quote', 'bars', 'screen', 'qualify', 'chain', 'tickers', 'scoring', 'csv']
+# The standalone scanners, plus both as strategies of one engine pass
+CASES = dict(SCANNERS, combined=('scan_engine', 'ScanEngine', 85))
+ASYNC_CASES = {'cheap', 'combined'}
+
+# Offline scans: no caches, no pacing sleeps (request counts are reported against the limits instead)
+BENCH_KWARGS = dict(
+    bar_cache_path=None,
+    chain_cache_path=None,
+    snapshot_path=None,
+    respect_rate_limits=False,
+    delay_between_symbols=0,
+    auto_connect=False,
+)
+
+
+@contextmanager
+def offline_reporting():
+    """Write CSVs into a scratch directory and keep Slack out of it."""
+    saved = slack_notify.send_to_slack
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, 'w') as devnull:
+        slack_notify.send_to_slack = lambda *args, **kwargs: None
+        os.chdir(tmp)
+        try:
+            with contextlib.redirect_stdout(devnull):
+                yield tmp
+        finally:
+            os.chdir(cwd)
+            slack_notify.send_to_slack = saved
+
+
+# ---------- Sessions ----------
+def synthetic_session(n_symbols, seed=7, rebuild=False):
+    """Path of the recorded synthetic session for n_symbols, recording it on first use."""
+    path = os.path.join(SESSIONS_DIR, f"synthetic_{n_symbols}_seed{seed}.jsonl.gz")
+    if os.path.exists(path) and not rebuild:
+        return path
+    os.makedirs(SESSIONS_DIR, exist_ok=True)
+    print(f"📼 Recording synthetic session: {n_symbols} symbols -> {path}")
+    symbols = synthetic_symbols(n_symbols)
+    recorder = SyntheticRecorder(path)
+    recorder.seed = seed
+    for name in SCANNERS:
+        cls = _scanner_class(name)
+        with offline_reporting():
+            cls(ib_client=recorder, **BENCH_KWARGS).scan_watchlist_staged(symbols)
+    recorder.disconnect()
+    return path
+
+
+# ---------- Stage attribution ----------
+class StageProfiler:
+    """Exclusive wall time of wrapped scanner methods, counted only while the options stage runs."""
+
+    def __init__(self):
+        self.secs = Counter()
+        self.active = False
+        self._children = []
+
+    def wrap(self, obj, name, stage):
+        fn = getattr(obj, name)
+
+        def timed(*args, **kwargs):
+            if not self.active:
+                return fn(*args, **kwargs)
+            self._children.append(0.0)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.secs[stage] += elapsed - self._children.pop()
+                if self._children:
+                    self._children[-1] += elapsed
+
+        setattr(obj, name, timed)
+
+
+class BenchTimer(StageTimer):
+    def __init__(self, profiler):
+        super().__init__()
+        self.profiler = profiler
+
+    @contextmanager
+    def stage(self, name, items=None):
+        self.profiler.active = name == 'options'
+        try:
+            with super().stage(name, items):
+                yield
+        finally:
+            self.profiler.active = False
+
+
+def _stage_breakdown(timer, profiler, split_options):
+    t = {name: secs for name, (secs, _) in timer.stages.items()}
+    p = profiler.secs
+    options = t.get('options', 0.0)
+    stages = {
+        'quote': t.get('quotes', 0.0),
+        'bars': t.get('daily bars', 0.0) + t.get('intraday bars', 0.0),
+        'screen': t.get('daily screen', 0.0) + t.get('intraday screen', 0.0),
+        'qualify': t.get('qualify', 0.0) + (p['qualify'] if split_options else 0.0),
+        'chain': p['chain'] if split_options else 0.0,
+        'tickers': p['tickers'] if split_options else 0.0,
+        'scoring': options - (p['qualify'] + p['chain'] + p['tickers'] if split_options else 0.0),
+        'csv': t.get('report', 0.0),
+    }
+    return {k: round(v, 4) for k, v in stages.items()}
+
+
+# ---------- One case ----------
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+
+
+def _case_class(name):
+    module, cls, _ = CASES[name]
+    return getattr(importlib.import_module(module), cls)
+
+
+def _symbols_with_candidates(found):
+    if found and all(isinstance(f, dict) for f in found.values()):  # engine: {strategy: found}
+        return len(set().union(*found.values()))
+    return len(found)
+
+
+def run_case(name, session_path, n_symbols, time_scale=0.0, in_flight=1, cached=False):
+    """Replay one staged scan in this process and return its measurements."""
+    cls = _case_class(name)
+    with offline_reporting() as tmp:
+        replay = ReplayIB(session_path, time_scale=time_scale)
+        symbols = replay.symbols()[:n_symbols]
+        kwargs = dict(BENCH_KWARGS)
+        if cached:
+            kwargs.update(bar_cache_path=os.path.join(tmp, 'bars.sqlite'), chain_cache_path=os.path.join(tmp, 'chains.sqlite'))
+            with replay.clock():
+                cls(ib_client=replay, **kwargs).scan_watchlist_staged(symbols)  # warm the caches
+            replay = ReplayIB(session_path, time_scale=time_scale)
+
+        scanner = cls(ib_client=replay, **kwargs)
+        profiler = StageProfiler()
+        profiler.wrap(scanner, '_option_chains', 'chain')
+        profiler.wrap(scanner, '_qualify', 'qualify')
+        profiler.wrap(scanner, '_req_mkt_data', 'tickers')
+        profiler.wrap(scanner, '_cancel_mkt_data', 'tickers')
+        profiler.wrap(replay, 'waitOnUpdate', 'tickers')
+        timer = BenchTimer(profiler)
+        extra = {'max_in_flight': in_flight} if in_flight > 1 else {}
+
+        start = time.perf_counter()
+        with replay.clock():
+            found = scanner.scan_watchlist_staged(symbols, timer=timer, **extra)
+        wall = time.perf_counter() - start
+
+    requests = {kind: replay.served[kind] + replay.fuzzy[kind] + replay.misses[kind]
+                for kind in ('hist', 'mkt', 'secdef', 'qualify')}
+    hist_limit = scanner.pacer.hist_requests_per_10min
+    msg_limit = scanner.pacer.messages_per_second
+    messages = requests['hist'] + 2 * requests['mkt'] + requests['secdef'] + requests['qualify']  # lines are req + cancel
+    return {
+        'case': _case_key(name, n_symbols, in_flight, cached),
+        'scanner': name,
+        'symbols': len(symbols),
+        'wall_secs': round(wall, 4),
+        'stages': _stage_breakdown(timer, profiler, split_options=in_flight == 1),
+        'requests': {
+            'historical': requests['hist'],
+            'market_data': requests['mkt'],
+            'peak_lines': scanner.pacer.peak_lines,
+            'sec_def': requests['secdef'],
+            'contract_details': requests['qualify'],
+            'messages': messages,
+            'unrecorded': sum(replay.misses.values()),
+        },
+        'ib_floor_secs': {
+            'historical': round(requests['hist'] / hist_limit * 600.0, 1),
+            'messages': round(messages / msg_limit, 1),
+        },
+        'peak_rss_mb': _peak_rss_mb(),
+        'candidates': _symbols_with_candidates(found),
+    }
+
+
+def _case_key(name, n_symbols, in_flight, cached):
+    key = f"{name}/{n_symbols}"
+    if in_flight > 1:
+        key += f"/inflight{in_flight}"
+    if cached:
+        key += "/cached"
+    return key
+
+
+def run_isolated(*args, **kwargs):
+    """run_case in a fresh interpreter so peak RSS belongs to this case alone."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(run_case, *args, **kwargs).result()
+
+
+# ---------- Reporting ----------
+def _fmt_secs(secs):
+    if secs >= 3600:
+        return f"{secs / 3600:.1f}h"
+    if secs >= 60:
+        return f"{secs / 60:.1f}m"
+    return f"{secs:.1f}s"
+
+
+def print_result(r):
+    s, q = r['stages'], r['requests']
+    rss = f"{r['peak_rss_mb']:.0f} MB" if r['peak_rss_mb'] is not None else "n/a"
+    print(f"{r['case']:<32} wall {r['wall_secs']:8.2f}s | peak RSS {rss:>7} | {r['candidates']} symbols with candidates")
+    print("   stages   " + " | ".join(f"{k} {s[k]:.2f}s" for k in STAGES))
+    print(f"   requests hist {q['historical']} (≥ {_fmt_secs(r['ib_floor_secs']['historical'])} at IB pacing) | "
+          f"mkt data {q['market_data']} (peak lines {q['peak_lines']}) | secdef {q['sec_def']} | "
+          f"contract details {q['contract_details']} | messages {q['messages']} "
+          f"(≥ {_fmt_secs(r['ib_floor_secs']['messages'])})")
+    if q['unrecorded']:
+        print(f"   ⚠️ {q['unrecorded']} requests were not in the session (re-record it, e.g. --rebuild)")
+
+
+def compare(results, baseline, threshold, min_secs=0.25):
+    """
+    Regressions against a baseline: wall time, any stage and peak RSS may grow by at most
+    `threshold` (stages under min_secs are noise and skipped); request counts are
+    deterministic, so any increase counts.
+    """
+    regressions = []
+    for r in results:
+        base = baseline.get(r['case'])
+        if not base:
+            continue
+        timed = [('wall', r['wall_secs'], base['wall_secs'])]
+        timed += [(f"stage {k}", r['stages'][k], base['stages'].get(k, 0.0)) for k in STAGES]
+        for label, now, then in timed:
+            if then >= min_secs and now > then * (1 + threshold):
+                regressions.append(f"{r['case']}: {label} {then:.2f}s -> {now:.2f}s (+{(now / then - 1) * 100:.0f}%)")
+        if r['peak_rss_mb'] and base.get('peak_rss_mb') and r['peak_rss_mb'] > base['peak_rss_mb'] * (1 + threshold):
+            regressions.append(f"{r['case']}: peak RSS {base['peak_rss_mb']:.0f} MB -> {r['peak_rss_mb']:.0f} MB")
+        for k, n in r['requests'].items():
+            if k in base['requests'] and n > base['requests'][k]:
+                regressions.append(f"{r['case']}: {k} requests {base['requests'][k]} -> {n}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 500, 5000])
+    parser.add_argument('--scanners', nargs='+', default=list(CASES), choices=list(CASES))
+    parser.add_argument('--session', help='recorded session to replay instead of the synthetic market')
+    parser.add_argument('--time-scale', type=float, default=0.0, help='1.0 = recorded latencies, 0 = instant')
+    parser.add_argument('--in-flight', type=int, default=1, help='symbols in flight (scanners with an async path)')
+    parser.add_argument('--cached', action='store_true', help='measure a warm bar/chain cache run')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--rebuild', action='store_true', help='re-record the synthetic sessions')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--check', action='store_true', help='exit 1 on a regression against the baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed growth, 0.25 = +25%%')
+    parser.add_argument('--json', help='write the raw results here')
+    args = parser.parse_args()
+
+    if args.session:
+        cases = [(args.session, len(ReplayIB(args.session).symbols()))]
+    else:
+        cases = [(synthetic_session(n, args.seed, args.rebuild), n) for n in args.sizes]
+
+    print("📊 Scanner end-to-end benchmark (replayed sessions)")
+    print("=" * 120)
+    results = []
+    for session_path, n in cases:
+        for name in args.scanners:
+            in_flight = args.in_flight if name in ASYNC_CASES else 1
+            r = run_isolated(name, session_path, n, args.time_scale, in_flight, args.cached)
+            print_result(r)
+            results.append(r)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update({r['case']: r for r in results})
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        print(f"💾 Baseline saved to {args.baseline}")
+
+    if args.check:
+        if not os.path.exists(args.baseline):
+            print(f"❌ No baseline at {args.baseline} (run with --save-baseline first)")
+            sys.exit(1)
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regressions beyond +{args.threshold * 100:.0f}%:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print(f"\n✅ No regressions beyond +{args.threshold * 100:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Deterministic synthetic market for the scanner benchmarks.
+
+SyntheticMarket answers the IB calls the scanners make (qualify, quotes, daily and
+intraday bars, option chains, option quotes with model greeks) from a seeded model
+of each symbol, with no TWS connection. Scanning through SyntheticRecorder writes a
+session file that ib_replay.ReplayIB serves exactly like one recorded against a
+live gateway (see bench_scanners.py).
+"""
+import os
+import sys
+import zlib
+from datetime import datetime, timedelta, timezone
+
+import ib_insync as ib
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bs_pricing  # noqa: E402
+from ib_replay import RecordingIB  # noqa: E402
+
+DAILY_BARS = 60
+INTRADAY_BARS_PER_DAY = 13  # 30-minute bars in a regular session
+
+
+def synthetic_symbols(n):
+    return [f"SYN{i:04d}" for i in range(n)]
+
+
+def _strike_step(price):
+    return 0.5 if price < 25 else 1.0 if price < 100 else 2.5 if price < 250 else 5.0
+
+
+class SyntheticMarket(ib.IB):
+    """ib.IB look-alike backed by a seeded per-symbol model; every request completes immediately."""
+
+    def __init__(self, seed=7):
+        super().__init__()
+        self.seed = seed
+        self.now = datetime.now()
+        self._models = {}
+        self._tickers = {}
+
+    # ---------- Model ----------
+    def _rng(self, *key):
+        return np.random.default_rng([self.seed, zlib.crc32('|'.join(map(str, key)).encode())])
+
+    def _model(self, symbol):
+        if symbol in self._models:
+            return self._models[symbol]
+        rng = self._rng(symbol)
+        vol = rng.uniform(0.25, 1.1)  # annualized
+        daily_sigma = vol / np.sqrt(252)
+        start = float(np.exp(rng.uniform(np.log(5), np.log(300))))
+        closes = start * np.exp(np.cumsum(rng.normal(0, daily_sigma, DAILY_BARS)))
+        opens = np.r_[start, closes[:-1]]
+        wick = np.abs(rng.normal(0, daily_sigma / 2, (2, DAILY_BARS)))
+        highs = np.maximum(opens, closes) * (1 + wick[0])
+        lows = np.minimum(opens, closes) * (1 - wick[1])
+        days = [self.now.date() - timedelta(days=DAILY_BARS - 1 - i) for i in range(DAILY_BARS)]
+
+        n = 2 * INTRADAY_BARS_PER_DAY
+        isigma = daily_sigma / np.sqrt(INTRADAY_BARS_PER_DAY)
+        path = np.cumsum(rng.normal(0, isigma, n))
+        icloses = closes[-1] * np.exp(path - path[-1])  # ends on the latest daily close
+        iopens = np.r_[icloses[0], icloses[:-1]]
+        iwick = np.abs(rng.normal(0, isigma / 2, (2, n)))
+        end = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+        times = [end - timedelta(minutes=30 * (n - 1 - i)) for i in range(n)]
+
+        model = {
+            'vol': vol,
+            'price': float(closes[-1]),
+            'daily': [ib.BarData(d, o, h, l, c, int(v), c, 1) for d, o, h, l, c, v in zip(
+                days, opens, highs, lows, closes, rng.integers(1e5, 5e6, DAILY_BARS))],
+            'intraday': [ib.BarData(t, o, max(o, c) * (1 + w0), min(o, c) * (1 - w1), c, 1000, c, 1) for t, o, c, w0, w1 in zip(
+                times, iopens, icloses, iwick[0], iwick[1])],
+        }
+        self._models[symbol] = model
+        return model
+
+    def _expirations(self):
+        friday = self.now.date() + timedelta(days=(4 - self.now.weekday()) % 7 or 7)
+        return [(friday + timedelta(weeks=w)).strftime('%Y%m%d') for w in range(8)]
+
+    def _strikes(self, price):
+        step = _strike_step(price)
+        lo, hi = np.floor(price * 0.6 / step), np.ceil(price * 1.4 / step)
+        return [round(k * step, 2) for k in np.arange(lo, hi + 1)]
+
+    # ---------- Session ----------
+    def connect(self, *args, **kwargs):
+        return self
+
+    def disconnect(self):
+        pass
+
+    def sleep(self, *args):
+        return True
+
+    def waitOnUpdate(self, timeout=0):
+        return False
+
+    # ---------- Requests ----------
+    async def qualifyContractsAsync(self, *contracts):
+        for c in contracts:
+            c.conId = zlib.crc32(f"{c.secType}|{c.symbol}|{c.lastTradeDateOrContractMonth}|{c.strike}".encode()) % 2 ** 31 or 1
+            c.currency = 'USD'
+            c.tradingClass = c.symbol
+            if c.secType == 'STK':
+                c.primaryExchange = 'NASDAQ'
+                c.localSymbol = c.symbol
+            else:
+                c.multiplier = '100'
+                c.localSymbol = f"{c.symbol} {c.lastTradeDateOrContractMonth} C{c.strike:g}"
+        return list(contracts)
+
+    async def reqHistoricalDataAsync(self, contract, endDateTime, durationStr, barSizeSetting, whatToShow, useRTH,
+                                     formatDate=1, keepUpToDate=False, chartOptions=[], timeout=60):
+        model = self._model(contract.symbol)
+        n, unit = durationStr.split()
+        days = max(1, int(n) // 86400) if unit == 'S' else int(n)
+        bars = ib.BarDataList()
+        if barSizeSetting == '1 day':
+            bars.extend(model['daily'][-days:])
+        else:
+            bars.extend(model['intraday'][-days * INTRADAY_BARS_PER_DAY:])
+        return bars
+
+    async def reqSecDefOptParamsAsync(self, underlyingSymbol, futFopExchange, underlyingSecType, underlyingConId):
+        price = self._model(underlyingSymbol)['price']
+        return [ib.OptionChain('SMART', underlyingConId, underlyingSymbol, '100', self._expirations(), self._strikes(price))]
+
+    def reqMktData(self, contract, genericTickList='', snapshot=False, regulatorySnapshot=False, mktDataOptions=None):
+        model = self._model(contract.symbol)
+        S = model['price']
+        t = ib.Ticker(contract=contract, time=datetime.now(timezone.utc))
+        if contract.secType != 'OPT':
+            t.bid, t.ask, t.last, t.close = round(S - 0.01, 2), round(S + 0.01, 2), S, model['daily'][-2].close
+            t.volume = float(model['daily'][-1].volume)
+        else:
+            rng = self._rng(contract.symbol, contract.lastTradeDateOrContractMonth, contract.strike)
+            T = bs_pricing.years_to_expiry([contract.lastTradeDateOrContractMonth], now=self.now)[0]
+            iv = model['vol'] * (1 + 0.4 * abs(np.log(contract.strike / S)))
+            g = {k: float(v) for k, v in bs_pricing.black_scholes(S, contract.strike, T, iv).items()
+                 if k in ('price', 'delta', 'gamma', 'vega', 'theta')}
+            mid = max(g['price'], 0.01)
+            half = max(0.005, mid * rng.uniform(0.02, 0.15))
+            t.bid, t.ask = round(max(0.0, mid - half), 2), round(mid + half, 2)
+            t.last = round(mid, 2)
+            t.volume = float(rng.integers(0, 3000))
+            t.optOpenInterest = float(rng.integers(0, 8000))
+            if '106' in genericTickList.split(','):
+                t.modelGreeks = ib.OptionComputation(0, iv, g['delta'], mid, 0.0, g['gamma'], g['vega'], g['theta'], S)
+        self._tickers[contract.conId] = t
+        return t
+
+    def ticker(self, contract):
+        return self._tickers.get(contract.conId)
+
+    def cancelMktData(self, contract):
+        self._tickers.pop(contract.conId, None)
+
+
+class SyntheticRecorder(RecordingIB, SyntheticMarket):
+    """RecordingIB over the synthetic market: writes a replayable session without TWS."""
+
@@ -0,0 +1,191 @@
+import math
+from datetime import datetime
+
+import numpy as np
+
+try:
+    from scipy.special import ndtr as _ndtr
+except ImportError:
+    _ndtr = None
+
+DAYS_PER_YEAR = 365.0
+_SQRT_2PI = math.sqrt(2.0 * math.pi)
+_erf = np.vectorize(math.erf, otypes=[float])
+
+
+def norm_cdf(x):
+    """Standard normal CDF on arrays (scipy's ndtr when available, math.erf otherwise)."""
+    x = np.asarray(x, dtype=float)
+    if _ndtr is not None:
+        return _ndtr(x)
+    return 0.5 * (1.0 + _erf(x / math.sqrt(2.0)))
+
+
+def norm_pdf(x):
+    x = np.asarray(x, dtype=float)
+    return np.exp(-0.5 * x * x) / _SQRT_2PI
+
+
+def _inputs(S, K, T, sigma):
+    S, K, T, sigma = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (S, K, T, sigma)))
+    valid = (S > 0) & (K > 0) & (T > 0) & (sigma > 0)
+    # Placeholders keep the math finite; invalid cells are masked to NaN at the end
+    return (np.where(valid, S, 1.0), np.where(valid, K, 1.0),
+            np.where(valid, T, 1.0), np.where(valid, sigma, 1.0), valid)
+
+
+def d1_d2(S, K, T, sigma, r=0.045, q=0.0):
+    S, K, T, sigma, valid = _inputs(S, K, T, sigma)
+    vol_sqrt_t = sigma * np.sqrt(T)
+    d1 = (np.log(S / K) + (r - q + 0.5 * sigma ** 2) * T) / vol_sqrt_t
+    d2 = d1 - vol_sqrt_t
+    return np.where(valid, d1, np.nan), np.where(valid, d2, np.nan)
+
+
+def prob_itm(S, K, T, sigma, r=0.045, q=0.0, right='C'):
+    """P(finish ITM) = N(d2) for calls, N(-d2) for puts. NaN where inputs are unusable."""
+    _, d2 = d1_d2(S, K, T, sigma, r, q)
+    return norm_cdf(d2 if right == 'C' else -d2)
+
+
+def prob_touch(S, H, T, sigma, r=0.045, q=0.0):
+    """
+    Probability that the underlying trades at or above H (H above spot) or at or
+    below H (H below spot) at any time before T, under the same lognormal model.
+    """
+    S, H, T, sigma, valid = _inputs(S, H, T, sigma)
+    nu = r - q - 0.5 * sigma ** 2
+    vol_sqrt_t = sigma * np.sqrt(T)
+    b = np.log(H / S)
+    up = norm_cdf((-b + nu * T) / vol_sqrt_t) + np.exp(2.0 * nu * b / sigma ** 2) * norm_cdf((-b - nu * T) / vol_sqrt_t)
+    down = norm_cdf((b - nu * T) / vol_sqrt_t) + np.exp(2.0 * nu * b / sigma ** 2) * norm_cdf((b + nu * T) / vol_sqrt_t)
+    p = np.where(b >= 0, up, down)
+    return np.where(valid, np.clip(p, 0.0, 1.0), np.nan)
+
+
+def black_scholes(S, K, T, sigma, r=0.045, q=0.0, right='C'):
+    """
+    Theoretical price, greeks and probabilities for whole chains in one call.
+
+    All inputs broadcast, so a strike x expiry grid is just
+    black_scholes(S, strikes[None, :], T_years[:, None], iv_grid).
+    Theta is per calendar day, vega per 1 vol point. Returns a dict of arrays.
+    """
+    d1, d2 = d1_d2(S, K, T, sigma, r, q)
+    S, K, T, sigma, valid = _inputs(S, K, T, sigma)
+    sqrt_t = np.sqrt(T)
+    disc_r = np.exp(-r * T)
+    disc_q = np.exp(-q * T)
+    nd1, nd2 = norm_cdf(d1), norm_cdf(d2)
+    pdf_d1 = norm_pdf(d1)
+
+    if right == 'C':
+        price = S * disc_q * nd1 - K * disc_r * nd2
+        delta = disc_q * nd1
+        theta = (-S * disc_q * pdf_d1 * sigma / (2 * sqrt_t) - r * K * disc_r * nd2 + q * S * disc_q * nd1)
+        rho = K * T * disc_r * nd2
+        p_itm = nd2
+    else:
+        price = K * disc_r * norm_cdf(-d2) - S * disc_q * norm_cdf(-d1)
+        delta = -disc_q * norm_cdf(-d1)
+        theta = (-S * disc_q * pdf_d1 * sigma / (2 * sqrt_t) + r * K * disc_r * norm_cdf(-d2) - q * S * disc_q * norm_cdf(-d1))
+        rho = -K * T * disc_r * norm_cdf(-d2)
+        p_itm = norm_cdf(-d2)
+
+    gamma = disc_q * pdf_d1 / (S * sigma * sqrt_t)
+    vega = S * disc_q * pdf_d1 * sqrt_t
+
+    def masked(a):
+        return np.where(valid, a, np.nan)
+
+    return {
+        'd1': d1,
+        'd2': d2,
+        'nd1': masked(nd1),
+        'nd2': masked(nd2),
+        'price': masked(price),
+        'delta': masked(delta),
+        'gamma': masked(gamma),
+        'vega': masked(vega / 100.0),
+        'theta': masked(theta / DAYS_PER_YEAR),
+        'rho': masked(rho / 100.0),
+        'prob_itm': masked(p_itm),
+        'prob_touch': prob_touch(S, np.where(valid, K, np.nan), T, sigma, r, q),
+    }
+
+
+def years_to_expiry(expirations, now=None):
+    """'YYYYMMDD' strings (or an array of them) -> whole calendar days / 365, floored at 0."""
+    now = now or datetime.now()
+    exps = np.atleast_1d(np.asarray(expirations, dtype=str))
+    # A chain only has a handful of distinct expirations: parse each once
+    unique, inverse = np.unique(exps, return_inverse=True)
+    days = np.array([(datetime.strptime(e, '%Y%m%d') - now).days for e in unique], dtype=float)
+    return np.maximum(days, 0.0)[inverse.reshape(-1)] / DAYS_PER_YEAR
+
+
+def implied_vol(price, S, K, T, r=0.045, q=0.0, right='C', tol=1e-6, max_iter=50, vol_low=1e-4, vol_high=10.0):
+    """
+    Vectorized implied volatility from option prices (e.g. bid/ask mids) for a whole chain.
+
+    Newton-Raphson seeded with the Brenner-Subrahmanyam approximation
+    sigma ~ sqrt(2*pi/T) * price / S, with a bisection fallback for the cells
+    where Newton stalls (tiny vega far OTM) or leaves [vol_low, vol_high].
+    Prices outside the no-arbitrage bounds come back as NaN.
+    """
+    price, S, K, T = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (price, S, K, T)))
+    price, S, K, T = price.copy(), S.copy(), K.copy(), T.copy()
+    disc_r, disc_q = np.exp(-r * np.where(T > 0, T, 0)), np.exp(-q * np.where(T > 0, T, 0))
+    if right == 'C':
+        lower, upper = np.maximum(S * disc_q - K * disc_r, 0.0), S * disc_q
+    else:
+        lower, upper = np.maximum(K * disc_r - S * disc_q, 0.0), K * disc_r
+    solvable = (price > 0) & (S > 0) & (K > 0) & (T > 0) & (price > lower) & (price < upper)
+
+    # Brenner-Subrahmanyam seed (exact for ATM, reasonable elsewhere)
+    safe_T = np.where(T > 0, T, 1.0)
+    safe_S = np.where(S > 0, S, 1.0)
+    sigma = np.clip(np.sqrt(2.0 * np.pi / safe_T) * price / safe_S, vol_low, vol_high)
+
+    active = solvable.copy()
+    needs_bisection = np.zeros(price.shape, dtype=bool)
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        with np.errstate(over='ignore', invalid='ignore'):
+            bs = black_scholes(S, K, T, sigma, r, q, right)
+        diff = bs['price'] - price
+        vega = bs['vega'] * 100.0  # back to per unit of vol
+        active &= ~(np.abs(diff) < tol)
+        stalled = active & ~(vega > 1e-8)  # far OTM: vega underflows
+        sigma = np.where(active & ~stalled, sigma - diff / np.where(vega > 1e-8, vega, 1.0), sigma)
+        escaped = active & ((sigma <= vol_low) | (sigma >= vol_high) | np.isnan(sigma))
+        needs_bisection |= stalled | escaped
+        active &= ~(stalled | escaped)
+    needs_bisection |= active  # ran out of Newton iterations
+
+    if needs_bisection.any():
+        sigma = np.where(needs_bisection, _bisect_vol(price, S, K, T, r, q, right, vol_low, vol_high, tol, needs_bisection), sigma)
+    return np.where(solvable, sigma, np.nan)
+
+
+def _bisect_vol(price, S, K, T, r, q, right, vol_low, vol_high, tol, mask, max_iter=100):
+    """Bisection on the masked cells only; the call price is monotonic in sigma."""
+    out = np.full(price.shape, np.nan)
+    idx = np.nonzero(mask)
+    if not idx[0].size:
+        return out
+    p, s, k, t = price[idx], S[idx], K[idx], T[idx]
+    lo = np.full(p.shape, float(vol_low))
+    hi = np.full(p.shape, float(vol_high))
+    for _ in range(max_iter):
+        mid = 0.5 * (lo + hi)
+        with np.errstate(over='ignore', invalid='ignore'):
+            val = black_scholes(s, k, t, mid, r, q, right)['price']
+        too_high = val > p
+        hi = np.where(too_high, mid, hi)
+        lo = np.where(too_high, lo, mid)
+        if np.all(hi - lo < tol):
+            break
+    out[idx] = 0.5 * (lo + hi)
+    return out
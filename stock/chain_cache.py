@@ -0,0 +1,118 @@
+import json
+import sqlite3
+import time
+
+import ib_insync as ib
+
+
+class ChainCache:
+    """
+    TTL cache for option chain metadata, persisted in SQLite between runs.
+
+    Holds two things that barely change intraday:
+      • reqSecDefOptParams results (expirations/strikes per underlying conId)
+      • qualified contracts (conId and the other fields qualifyContracts fills in),
+        keyed by the fields the scanner builds the contract from
+    so repeat scans skip those round trips entirely.
+    """
+
+    def __init__(self, path='chain_cache.sqlite', chain_ttl_secs=6 * 3600, contract_ttl_secs=24 * 3600):
+        self.path = path
+        self.chain_ttl_secs = float(chain_ttl_secs)
+        self.contract_ttl_secs = float(contract_ttl_secs)
+        self.conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)  # shared by sharded workers
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS chains (
+                underlying_con_id INTEGER PRIMARY KEY,
+                payload TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS contracts (
+                contract_key TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self.chain_hits = 0
+        self.chain_misses = 0
+        self.contract_hits = 0
+        self.contract_misses = 0
+
+    # ---------- Option chains ----------
+    def get_chains(self, underlying_con_id):
+        row = self.conn.execute(
+            "SELECT payload, fetched_at FROM chains WHERE underlying_con_id=?", (underlying_con_id,)
+        ).fetchone()
+        if not row or time.time() - row[1] > self.chain_ttl_secs:
+            self.chain_misses += 1
+            return None
+        self.chain_hits += 1
+        return [ib.OptionChain(**c) for c in json.loads(row[0])]
+
+    def store_chains(self, underlying_con_id, chains):
+        if not chains:
+            return
+        payload = json.dumps([{
+            'exchange': c.exchange,
+            'underlyingConId': c.underlyingConId,
+            'tradingClass': c.tradingClass,
+            'multiplier': c.multiplier,
+            'expirations': sorted(c.expirations),
+            'strikes': sorted(c.strikes),
+        } for c in chains])
+        self.conn.execute(
+            "INSERT OR REPLACE INTO chains (underlying_con_id, payload, fetched_at) VALUES (?, ?, ?)",
+            (underlying_con_id, payload, time.time())
+        )
+        self.conn.commit()
+
+    # ---------- Qualified contracts ----------
+    @staticmethod
+    def contract_key(c):
+        return '|'.join(str(x) for x in (
+            c.secType, c.symbol, c.lastTradeDateOrContractMonth, float(c.strike or 0),
+            c.right, c.exchange, c.currency,
+        ))
+
+    def fill_contracts(self, contracts):
+        """
+        Fill cached qualification data into contracts in place.
+        Returns (keys, misses): the pre-qualification key of every contract and
+        the ones that still need qualifyContracts.
+        """
+        keys = [self.contract_key(c) for c in contracts]
+        misses = []
+        now = time.time()
+        for c, key in zip(contracts, keys):
+            row = self.conn.execute(
+                "SELECT payload, fetched_at FROM contracts WHERE contract_key=?", (key,)
+            ).fetchone()
+            if row and now - row[1] <= self.contract_ttl_secs:
+                for field, value in json.loads(row[0]).items():
+                    setattr(c, field, value)
+                self.contract_hits += 1
+            else:
+                misses.append(c)
+                self.contract_misses += 1
+        return keys, misses
+
+    def store_contracts(self, keys, contracts):
+        now = time.time()
+        rows = [
+            (key, json.dumps(ib.util.dataclassNonDefaults(c)), now)
+            for key, c in zip(keys, contracts) if c.conId
+        ]
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO contracts (contract_key, payload, fetched_at) VALUES (?, ?, ?)", rows
+        )
+        self.conn.commit()
+
+    def summary(self):
+        return (f"chains {self.chain_hits} hit / {self.chain_misses} miss | "
+                f"contracts {self.contract_hits} hit / {self.contract_misses} miss")
+
+    def close(self):
+        self.conn.close()
@@ -1,100 +1,36 @@
-import ib_insync as ib
 from datetime import datetime
+import numpy as np
 import pandas as pd
-import time
-from math import erf, sqrt, log
-from collections import deque
-import requests
-
-try:
-    from config import SLACK_WEBHOOK_URL
-except ImportError:
-    print("⚠️ Warning: config.py not found. Slack notifications disabled.")
-    SLACK_WEBHOOK_URL = None
-
-def send_to_slack(scanner_name, found_dict, filename=None):
-    """Send scanner results to Slack"""
-    if not SLACK_WEBHOOK_URL:
-        return
-
-    webhook_url = SLACK_WEBHOOK_URL
-
-    if not found_dict:
-        # No results found
-        message = {
-            "text": f"🎲 {scanner_name}",
-            "attachments": [{
-                "color": "warning",
-                "text": "No opportunities found in current market conditions",
-                "footer": datetime.now().strftime('%Y-%m-%d %H:%M ET')
-            }]
-        }
-    else:
-        # Format ALL opportunities with expanded details
-        summary_lines = []
-        for symbol, df in list(found_dict.items())[:20]:  # Limit to 20 for Slack readability
-            best = df.iloc[0]
-            prob = best.get('prob_itm', 0) * 100
-            exp_date = best['expiration']
-            # Format expiration date if it's in YYYYMMDD format
-            if len(str(exp_date)) == 8:
-                exp_date = f"{str(exp_date)[4:6]}/{str(exp_date)[6:]}"  # MM/DD format
-            
-            summary_lines.append(
-                f"• {symbol} ${best['strike']:.0f}C @ ${best['mid_price']:.2f} | "
-                f"Exp: {exp_date} | {prob:.0f}% ITM | "
-                f"R/R: {best['risk_reward']:.1f}x | {best['tier']}"
-            )
-        
-        # Create the message with all results
-        results_text = "\n".join(summary_lines)
-        
-        # If there are more than 20, add a note
-        if len(found_dict) > 20:
-            results_text += f"\n\n... and {len(found_dict) - 20} more in the CSV file"
-        
-        message = {
-            "text": f"🎲 {scanner_name} - Found {len(found_dict)} opportunities",
-            "attachments": [{
-                "color": "good",
-                "text": results_text,
-                "footer": f"File: {filename}" if filename else datetime.now().strftime('%Y-%m-%d %H:%M ET')
-            }]
-        }
 
-    try:
-        response = requests.post(webhook_url, json=message)
-        if response.status_code == 200:
-            print("📨 Results sent to Slack")
-        else:
-            print(f"⚠️ Slack notification failed: {response.status_code}")
-    except Exception as e:
-        print(f"⚠️ Could not send to Slack: {e}")
+import bs_pricing
+from prescreen import StageTimer, run_prescreen
+from scan_metrics import timed_op
+from scanner_base import ScannerBase
+from payoff_engine import PayoffEngine
+from slack_notify import short_expiration
+from universe_scoring import normalized
+from vol_index import VolIndex
 
-class CheapOptionsScanner:
+
+class CheapOptionsScanner(ScannerBase):
     """
     Enhanced scanner for finding cheap call options with high reward potential.
     Combines pullback-recovery patterns with probability calculations and risk/reward analysis.
     """
-    
+
+    name = 'cheap_calls'
+    rank_by = ['score', 'risk_reward', 'breakeven_move_pct']
+    rank_ascending = [False, False, True]
+
     def __init__(
         self,
-        host='127.0.0.1',
-        port=7496,
-        client_id=4,
-        # Daily ATR filters
-        min_atr_pct=2.0,
-        min_abs_atr=None,
-        low_price_threshold=10.0,
-        min_abs_atr_low_price=0.25,
-        # Intraday ATR gate
-        use_intraday_atr=True,
-        intraday_bar='30 mins',
-        intraday_period=20,
-        intraday_min_atr_pct=0.8,
         # Option price constraints - EXPANDED RANGE
         min_option_price=0.05,
         max_option_price=1.00,  # Expanded from 0.50 to 1.00
+        # Expiration window (multi_expiration scans every expiry in it, not just the one nearest the middle)
+        target_expiry_min_days=7,
+        target_expiry_max_days=14,
+        multi_expiration=False,
         # Quality filters for cheap options - DYNAMIC
         min_volume_base=25,     # Will be adjusted based on option price
         min_dollar_volume=2500,  # Minimum dollar volume traded
@@ -103,39 +39,33 @@ class CheapOptionsScanner:
         # Probability and scoring - ADJUSTED
         min_probability=0.10,    # Lowered to 10% for true lottery tickets
         min_risk_reward=5.0,     # At least 5:1 payoff
-        risk_free_rate=0.045,    # For Black-Scholes
         # Scoring weights for cheap options
         weight_risk_reward=0.30,  # Emphasize asymmetric payoffs
         weight_liquidity=0.25,
         weight_spread=0.20,
         weight_probability=0.15,  # Lower weight for cheap options
         weight_breakeven=0.10,
-        # Rate limiting
-        respect_rate_limits=True,
-        hist_requests_per_10min=60,
-        delay_between_symbols=1.0, # 1 seconds between each symbol
-        delay_after_hist_batch=5.0, # 5 second pause after 30 requests
-        hist_batch_size=30, # pause after every 30 historical requests
+        weight_iv_value=0.0,      # Bonus for IV below its expiry's ATM IV (needs multi_expiration)
+        # Touch / 10-bagger odds and expected payoff per contract (see payoff_engine.py)
+        payoff_model='closed_form',  # 'closed_form', 'monte_carlo' or None to skip
+        payoff_paths=20000,       # Monte Carlo paths per expiration
+        payoff_seed=7,            # same seed -> same Monte Carlo numbers
+        payoff_budget_secs=0.1,   # Monte Carlo time budget per chain
+        auto_connect=True,
+        **kwargs,  # connection, gates, pacing, stores, market data: see ScannerBase
     ):
-        self.ib = ib.IB()
-        self.host = host
-        self.port = port
-        self.client_id = client_id
-
-        # ATR filters
-        self.min_atr_pct = float(min_atr_pct) if min_atr_pct is not None else None
-        self.min_abs_atr = float(min_abs_atr) if min_abs_atr is not None else None
-        self.low_price_threshold = float(low_price_threshold)
-        self.min_abs_atr_low_price = float(min_abs_atr_low_price)
-
-        self.use_intraday_atr = use_intraday_atr
-        self.intraday_bar = intraday_bar
-        self.intraday_period = int(intraday_period)
-        self.intraday_min_atr_pct = float(intraday_min_atr_pct)
+        super().__init__(auto_connect=False, **kwargs)
 
         # Option constraints
         self.min_option_price = float(min_option_price)
         self.max_option_price = float(max_option_price)
+        self.target_expiry_min_days = int(target_expiry_min_days)
+        self.target_expiry_max_days = int(target_expiry_max_days)
+        self.multi_expiration = multi_expiration
+        self.vol_index = VolIndex() if multi_expiration else None
+        self.payoff = PayoffEngine(
+            payoff_model, drift=self.risk_free_rate, n_paths=payoff_paths, seed=payoff_seed, budget_secs=payoff_budget_secs,
+        ) if payoff_model else None
         
         # Quality filters
         self.min_volume_base = int(min_volume_base)
@@ -144,7 +74,6 @@ class CheapOptionsScanner:
         self.max_spread_pct = float(max_spread_pct)
         self.min_probability = float(min_probability)
         self.min_risk_reward = float(min_risk_reward)
-        self.risk_free_rate = float(risk_free_rate)
         
         # Scoring weights
         self.weight_risk_reward = float(weight_risk_reward)
@@ -152,197 +81,13 @@ class CheapOptionsScanner:
         self.weight_spread = float(weight_spread)
         self.weight_probability = float(weight_probability)
         self.weight_breakeven = float(weight_breakeven)
-        
-        # Rate limiting
-        self.respect_rate_limits = respect_rate_limits
-        self.hist_requests_per_10min = hist_requests_per_10min
-        self.delay_between_symbols = delay_between_symbols
-        self.delay_after_hist_batch = delay_after_hist_batch
-        self.hist_batch_size = hist_batch_size
-        
-        # Track historical data requests
-        self.hist_request_times = deque(maxlen=hist_requests_per_10min)
-        self.hist_request_count = 0
-
-        self.connect()
-
-    def connect(self):
-        print("🔌 Connecting to TWS...")
-        self.ib.connect(self.host, self.port, clientId=self.client_id)
-        print("✅ Connected to TWS")
-
-    def _check_hist_rate_limit(self):
-        """Check if we need to pause for rate limiting"""
-        if not self.respect_rate_limits:
-            return
-        
-        # Check batch limit
-        if self.hist_request_count > 0 and self.hist_request_count % self.hist_batch_size == 0:
-            print(f"⏸️  Rate limit pause: {self.delay_after_hist_batch:.1f}s after {self.hist_request_count} requests")
-            time.sleep(self.delay_after_hist_batch)
-        
-        # Check 10-minute window
-        now = time.time()
-        while self.hist_request_times and (now - self.hist_request_times[0]) > 600:
-            self.hist_request_times.popleft()
-        
-        if len(self.hist_request_times) >= self.hist_requests_per_10min - 1:
-            wait_time = 600 - (now - self.hist_request_times[0]) + 1
-            if wait_time > 0:
-                print(f"⏸️  Rate limit reached: waiting {wait_time:.1f}s")
-                time.sleep(wait_time)
-
-    # ---------- Data helpers ----------
-    def _fetch_daily_bars(self, contract, days='60 D'):
-        self._check_hist_rate_limit()
-        bars = self.ib.reqHistoricalData(
-            contract, endDateTime='', durationStr=days,
-            barSizeSetting='1 day', whatToShow='TRADES', useRTH=True
-        )
-        self.hist_request_times.append(time.time())
-        self.hist_request_count += 1
-        return bars
-
-    def _fetch_intraday_bars(self, contract, duration='2 D', bar='30 mins'):
-        self._check_hist_rate_limit()
-        bars = self.ib.reqHistoricalData(
-            contract, endDateTime='', durationStr=duration,
-            barSizeSetting=bar, whatToShow='TRADES', useRTH=True
-        )
-        self.hist_request_times.append(time.time())
-        self.hist_request_count += 1
-        return bars
+        self.weight_iv_value = float(weight_iv_value)
 
-    @staticmethod
-    def _wilder_atr(bars, period=14):
-        if len(bars) < period + 1:
-            return None
-        trs = []
-        for i in range(1, len(bars)):
-            high = bars[i].high
-            low = bars[i].low
-            prev_close = bars[i-1].close
-            tr = max(high - low, abs(high - prev_close), abs(low - prev_close))
-            trs.append(tr)
-        if len(trs) < period:
-            return None
-        atr = sum(trs[:period]) / period
-        for tr in trs[period:]:
-            atr = (atr * (period - 1) + tr) / period
-        return atr
-
-    @staticmethod
-    def _atr_pct(atr, price):
-        return (atr / price) * 100.0 if atr and price else None
-
-    @staticmethod
-    def _norm_cdf(x):
-        """Cumulative distribution function for standard normal distribution"""
-        return 0.5 * (1.0 + erf(x / sqrt(2.0)))
-
-    def _prob_itm_from_iv(self, S, K, T_years, iv, r=None):
-        """
-        Calculate probability of call being ITM at expiry using Black-Scholes.
-        For cheap OTM options, this will typically be low (15-35%).
-        """
-        try:
-            if not all([S, K, T_years, iv]) or S <= 0 or K <= 0 or T_years <= 0 or iv <= 0:
-                return None
-            
-            if r is None:
-                r = self.risk_free_rate
-            
-            # Black-Scholes d1 and d2
-            d1 = (log(S / K) + (r + 0.5 * iv ** 2) * T_years) / (iv * sqrt(T_years))
-            d2 = d1 - iv * sqrt(T_years)
-            
-            # For call options: P(ITM) = N(d2)
-            return self._norm_cdf(d2)
-            
-        except Exception as e:
-            return None
-
-    def get_stock_data(self, symbol):
-        """Current price, 5D hi/lo, daily bars (for ATR)."""
-        try:
-            contract = ib.Stock(symbol, 'SMART', 'USD')
-            self.ib.qualifyContracts(contract)
-
-            # Live price
-            t = self.ib.reqMktData(contract, '', False, False)
-            self.ib.sleep(2)
-            price = t.marketPrice() or t.last
-            self.ib.cancelMktData(contract)
-            if not price or price <= 0:
-                return None, None, None, None, None
-
-            # Daily bars for ATR + 5D hi/lo
-            bars = self._fetch_daily_bars(contract, days='60 D')
-            if len(bars) < 15:
-                return price, None, None, None, contract
-
-            last5 = bars[-5:]
-            high_5d = max(b.high for b in last5)
-            low_5d = min(b.low for b in last5)
-
-            return price, high_5d, low_5d, bars, contract
-        except Exception as e:
-            print(f"❌ {symbol} data error: {e}")
-            return None, None, None, None, None
-
-    # ---------- Filters ----------
-    def passes_daily_atr_filters(self, atr, price):
-        if atr is None or price is None or price <= 0:
-            return False, "No ATR", None
-        reasons = []
-        ok = True
-
-        atr_pct = self._atr_pct(atr, price)
-        if self.min_atr_pct is not None:
-            if (atr_pct or 0) < self.min_atr_pct:
-                ok = False
-                reasons.append(f"ATR% {atr_pct:.2f}% < {self.min_atr_pct:.2f}%")
-            else:
-                reasons.append(f"ATR% {atr_pct:.2f}% ≥ {self.min_atr_pct:.2f}%")
-
-        if self.min_abs_atr is not None:
-            if atr < self.min_abs_atr:
-                ok = False
-                reasons.append(f"ATR ${atr:.2f} < ${self.min_abs_atr:.2f}")
-
-        if price < self.low_price_threshold:
-            if atr < self.min_abs_atr_low_price:
-                ok = False
-                reasons.append(f"Low-price floor: ATR ${atr:.2f} < ${self.min_abs_atr_low_price:.2f}")
-
-        return ok, "; ".join(reasons), atr_pct
-
-    def passes_intraday_atr_gate(self, contract, price):
-        if not self.use_intraday_atr:
-            return True, "Intraday gate disabled", None, None
-        try:
-            intrabars = self._fetch_intraday_bars(contract, duration='2 D', bar=self.intraday_bar)
-            if len(intrabars) < self.intraday_period + 1:
-                return True, "Not enough intraday bars; skipping gate", None, None
-            iatr = self._wilder_atr(intrabars, period=self.intraday_period)
-            iatr_pct = self._atr_pct(iatr, price)
-            if iatr_pct is None or iatr_pct < self.intraday_min_atr_pct:
-                return False, f"Intraday ATR% {0 if iatr_pct is None else iatr_pct:.2f}% < {self.intraday_min_atr_pct:.2f}%", iatr, iatr_pct
-            return True, f"Intraday ATR: ${iatr:.2f} ({iatr_pct:.2f}%) ≥ {self.intraday_min_atr_pct:.2f}%", iatr, iatr_pct
-        except Exception as e:
-            return True, f"Intraday ATR gate skipped (error: {e})", None, None
+        if auto_connect:
+            self.connect()
 
     # ---------- Strategy logic ----------
-    def is_pullback_recovery_candidate(self, price, high_5d, low_5d):
-        if not all([price, high_5d, low_5d]):
-            return False, "No data"
-        pullback = ((high_5d - price) / high_5d) * 100
-        recovery = ((price - low_5d) / low_5d) * 100
-        if 3 <= pullback <= 15 and recovery >= 1:
-            return True, f"Pullback {pullback:.1f}%, Recovery {recovery:.1f}%"
-        return False, f"Pullback {pullback:.1f}%, Recovery {recovery:.1f}%"
-
-    def find_target_expiration(self, expirations):
+    def _expirations_in_window(self, expirations):
         now = datetime.now()
         choices = []
         for s in expirations:
@@ -351,11 +96,20 @@ class CheapOptionsScanner:
             except ValueError:
                 continue
             days = (d - now).days
-            if 7 <= days <= 14:
+            if self.target_expiry_min_days <= days <= self.target_expiry_max_days:
                 choices.append((s, days))
+        return sorted(choices, key=lambda x: x[1])
+
+    def find_target_expiration(self, expirations):
+        choices = self._expirations_in_window(expirations)
         if not choices:
             return None
-        return min(choices, key=lambda x: abs(x[1] - 10))[0]
+        target = (self.target_expiry_min_days + self.target_expiry_max_days) // 2
+        return min(choices, key=lambda x: abs(x[1] - target))[0]
+
+    def find_target_expirations(self, expirations):
+        """Every expiration in the DTE window, nearest first"""
+        return [s for s, _ in self._expirations_in_window(expirations)]
     
     def get_nearby_strikes(self, strikes, price):
         """Get strikes around ATM for cheap options"""
@@ -372,140 +126,120 @@ class CheapOptionsScanner:
         return out
 
     def get_dynamic_min_volume(self, option_price):
-        """Dynamic volume threshold based on option price tier"""
-        if option_price < 0.25:
-            return 25  # Ultra-cheap: lower volume acceptable
-        elif option_price < 0.50:
-            return 50  # Cheap: moderate volume
-        else:
-            return 100  # Budget ($0.50-$1.00): need better liquidity
+        """Dynamic volume threshold based on option price tier (scalar or array)"""
+        price = np.asarray(option_price, dtype=float)
+        min_vol = np.select(
+            [price < 0.25, price < 0.50],
+            [25, 50],   # Ultra-cheap: lower volume acceptable / Cheap: moderate volume
+            default=100  # Budget ($0.50-$1.00): need better liquidity
+        )
+        return min_vol.item() if min_vol.ndim == 0 else min_vol
     
     def classify_option_tier(self, option_price, prob, risk_reward):
-        """Classify option into tier based on characteristics"""
-        if prob >= 0.25 and risk_reward >= 5:
-            return "HIGH_PROB_CHEAP"  # Best of both worlds
-        elif prob >= 0.15 and risk_reward >= 7:
-            return "BALANCED"  # Good balance
-        elif prob >= 0.10 and risk_reward >= 10:
-            return "PURE_LOTTERY"  # True lottery ticket
-        else:
-            return "SPECULATIVE"  # High risk speculation
+        """Classify option(s) into tier based on characteristics (scalar or array)"""
+        prob = np.asarray(prob, dtype=float)
+        risk_reward = np.asarray(risk_reward, dtype=float)
+        tiers = np.select(
+            [
+                (prob >= 0.25) & (risk_reward >= 5),   # Best of both worlds
+                (prob >= 0.15) & (risk_reward >= 7),   # Good balance
+                (prob >= 0.10) & (risk_reward >= 10),  # True lottery ticket
+            ],
+            ["HIGH_PROB_CHEAP", "BALANCED", "PURE_LOTTERY"],
+            default="SPECULATIVE"  # High risk speculation
+        )
+        return tiers.item() if tiers.ndim == 0 else tiers
 
-    def get_option_prices_with_probability(self, symbol, expiration, strikes, price, high_5d, low_5d):
-        """Enhanced option pricing with probability calculations"""
-        try:
-            print("📊 Getting option prices and calculating probabilities...")
-            contracts = [ib.Option(symbol, expiration, k, 'C', 'SMART') for k in strikes]
-            qualified = self.ib.qualifyContracts(*contracts)
-            
-            # Request market data with greeks
-            tickers = [self.ib.reqMktData(c, genericTickList='106', snapshot=False, regulatorySnapshot=False) for c in qualified]
-            self.ib.sleep(3)
+    @timed_op('option_rows')
+    def _option_rows(self, symbol, quotes, price, high_5d, low_5d):
+        """Derive every metric for the whole quoted chain at once (quotes from _collect_option_quotes)"""
+        q = quotes
+        if q.empty:
+            return None
 
-            rows = []
-            for t in tickers:
-                try:
-                    c = t.contract
-                    bid = t.bid if t.bid and t.bid > 0 else 0
-                    ask = t.ask if t.ask and t.ask > 0 else 0
-                    vol = t.volume or 0
-                    oi = getattr(t, 'optOpenInterest', None) or 0
-                    
-                    if bid > 0 and ask > 0:
-                        mid = (bid + ask) / 2
-                        
-                        # Check price constraints for cheap options
-                        if self.min_option_price <= mid <= self.max_option_price:
-                            # Get greeks for probability
-                            mg = t.modelGreeks
-                            delta = abs(mg.delta) if (mg and mg.delta is not None) else None
-                            iv = mg.impliedVol if (mg and mg.impliedVol and mg.impliedVol > 0) else None
-                            
-                            # Calculate time to expiry
-                            dtexp = datetime.strptime(c.lastTradeDateOrContractMonth, '%Y%m%d')
-                            T_years = max((dtexp - datetime.now()).days, 0) / 365.0
-                            
-                            # Calculate probability
-                            prob_iv = self._prob_itm_from_iv(price, c.strike, T_years, iv) if iv else None
-                            prob = prob_iv if prob_iv is not None else delta
-                            
-                            # Calculate key metrics
-                            breakeven = c.strike + mid
-                            breakeven_move_pct = ((breakeven / price - 1) * 100)
-                            profit_at_high = max(0, high_5d - c.strike - mid)
-                            profit_at_high_pct = (profit_at_high / mid * 100) if mid > 0 else 0
-                            
-                            # Risk/Reward ratio
-                            risk_reward = profit_at_high / mid if mid > 0 else 0
-                            
-                            # 10-bagger calculation
-                            ten_bagger_price = c.strike + (mid * 10)
-                            ten_bagger_move_pct = ((ten_bagger_price / price - 1) * 100)
-                            
-                            # Dollar volume for liquidity check
-                            dollar_volume = vol * mid * 100  # 100 shares per contract
-                            
-                            # Get dynamic volume threshold
-                            min_vol_for_price = self.get_dynamic_min_volume(mid)
-                            
-                            # Classify the option tier
-                            tier = self.classify_option_tier(mid, prob, risk_reward)
-                            
-                            rows.append({
-                                'symbol': symbol,
-                                'strike': c.strike,
-                                'expiration': expiration,
-                                'bid': bid,
-                                'ask': ask,
-                                'mid_price': mid,
-                                'volume': vol,
-                                'open_interest': oi,
-                                'delta': delta,
-                                'iv': iv,
-                                'prob_itm': prob,
-                                'current_price': price,
-                                'high_5d': high_5d,
-                                'low_5d': low_5d,
-                                'breakeven': breakeven,
-                                'breakeven_move_pct': breakeven_move_pct,
-                                'profit_at_high': profit_at_high,
-                                'profit_at_high_pct': profit_at_high_pct,
-                                'risk_reward': risk_reward,
-                                'ten_bagger_price': ten_bagger_price,
-                                'ten_bagger_move_pct': ten_bagger_move_pct,
-                                'dollar_volume': dollar_volume,
-                                'min_vol_required': min_vol_for_price,
-                                'tier': tier,
-                                'spread': ask - bid,
-                                'spread_pct': ((ask - bid) / mid * 100) if mid > 0 else 0
-                            })
-                except:
-                    continue
-                    
-            # Cancel market data
-            for t in tickers:
-                try:
-                    self.ib.cancelMktData(t.contract)
-                except:
-                    pass
-                    
-            return pd.DataFrame(rows) if rows else None
-        except Exception as e:
-            print(f"❌ Option pricing error: {e}")
+        # Two-sided quotes only
+        q = q[(q['bid'] > 0) & (q['ask'] > 0)].copy()
+        if q.empty:
+            return None
+        mid = (q['bid'] + q['ask']) / 2
+
+        # IV/delta from IB's model greeks; solve them from the mid wherever they're missing
+        T_years = bs_pricing.years_to_expiry(q['expiration'])
+        q['iv'], q['delta'] = self._fill_missing_greeks(q, mid, price, T_years)
+        if self.vol_index is not None:
+            # Index the whole quoted chain before the price band drops the near-the-money strikes
+            self.vol_index.update(symbol, price, q['expiration'], q['strike'], q['iv'], T_years)
+
+        # Inside the cheap price band only
+        in_band = ((mid >= self.min_option_price) & (mid <= self.max_option_price)).to_numpy()
+        q, mid, T_years = q[in_band], mid[in_band], T_years[in_band]
+        if q.empty:
             return None
 
-    def score_cheap_options(self, df):
-        """Score options based on risk/reward and lottery ticket potential"""
+        # Probability: IV-based N(d2), delta as a fallback
+        prob_iv = bs_pricing.prob_itm(price, q['strike'].to_numpy(), T_years, q['iv'].fillna(0).to_numpy(), r=self.risk_free_rate)
+        prob = np.where(np.isnan(prob_iv), q['delta'].to_numpy(), prob_iv)
+        keep = ~np.isnan(prob)  # rows without any probability can't be tiered
+        q, mid, prob, T_years = q[keep], mid[keep], prob[keep], T_years[keep]
+        if q.empty:
+            return None
+
+        strike = q['strike']
+        breakeven = strike + mid
+        profit_at_high = (high_5d - strike - mid).clip(lower=0)
+        risk_reward = profit_at_high / mid
+        ten_bagger_price = strike + (mid * 10)
+        spread = q['ask'] - q['bid']
+
+        df = pd.DataFrame({
+            'symbol': symbol,
+            'strike': strike,
+            'expiration': q['expiration'],
+            'bid': q['bid'],
+            'ask': q['ask'],
+            'mid_price': mid,
+            'volume': q['volume'],
+            'open_interest': q['open_interest'],
+            'delta': q['delta'],
+            'iv': q['iv'],
+            'prob_itm': prob,
+            'current_price': price,
+            'high_5d': high_5d,
+            'low_5d': low_5d,
+            'breakeven': breakeven,
+            'breakeven_move_pct': (breakeven / price - 1) * 100,
+            'profit_at_high': profit_at_high,
+            'profit_at_high_pct': profit_at_high / mid * 100,
+            'risk_reward': risk_reward,
+            'ten_bagger_price': ten_bagger_price,
+            'ten_bagger_move_pct': (ten_bagger_price / price - 1) * 100,
+            'dollar_volume': q['volume'] * mid * 100,  # 100 shares per contract
+            'min_vol_required': self.get_dynamic_min_volume(mid),
+            'tier': self.classify_option_tier(mid, prob, risk_reward),
+            'spread': spread,
+            'spread_pct': spread / mid * 100,
+        })
+        df = df.reset_index(drop=True)
+        if self.vol_index is not None:
+            df = pd.concat([df, self.vol_index.features(symbol, df['expiration'], df['iv'])], axis=1)
+        if self.payoff is not None:
+            # Path-aware odds instead of assuming the 5D high is reached
+            df = pd.concat([df, self.payoff.features(price, df['strike'], T_years, df['iv'], df['mid_price'], high_5d)], axis=1)
+        return df
+
+    @timed_op('scoring')
+    def score_cheap_options(self, df, normalization='symbol'):
+        """Score options based on risk/reward and lottery ticket potential (vectorized; df may hold many symbols)"""
         if df is None or df.empty:
             return df
         
-        # Normalize components for scoring
+        # Normalize components for scoring (per symbol, or across the universe; see universe_scoring.py)
         # Risk/Reward component (higher is better)
-        rr_norm = (df['risk_reward'] / df['risk_reward'].max()).clip(0, 1) if df['risk_reward'].max() > 0 else 0
+        rr_norm = normalized(df['risk_reward'], df['symbol'], normalization)
         
         # Liquidity component (volume + OI)
-        vol_norm = (df['volume'] / df['volume'].max()).clip(0, 1) if df['volume'].max() > 0 else 0
-        oi_norm = (df['open_interest'] / df['open_interest'].max()).clip(0, 1) if df['open_interest'].max() > 0 else 0
+        vol_norm = normalized(df['volume'], df['symbol'], normalization)
+        oi_norm = normalized(df['open_interest'], df['symbol'], normalization)
         liquidity = 0.7 * vol_norm + 0.3 * oi_norm
         
         # Spread quality (tighter is better)
@@ -525,30 +259,25 @@ class CheapOptionsScanner:
             self.weight_probability * prob_score +
             self.weight_breakeven * be_score
         )
+
+        # Relative value vs the term structure: IV below its expiry's ATM IV is cheap vol
+        if self.weight_iv_value and 'iv_vs_atm' in df:
+            df['score'] += self.weight_iv_value * (-df['iv_vs_atm']).fillna(0).clip(0, 1)
         
         return df
 
+    _score_contracts = score_cheap_options
+
+    def _report_mask(self, df):
+        return df['score'] > 0.3  # Minimum score threshold
+
     def get_cheap_recovery_options(self, symbol):
         print(f"\n🎲 ANALYZING {symbol} FOR CHEAP OPTIONS")
         print("-" * 50)
         
         price, high_5d, low_5d, bars, contract = self.get_stock_data(symbol)
-        if not price:
-            print(f"❌ Could not get price data for {symbol}")
-            return None
-        print(f"📈 Current: ${price:.2f}")
-        if high_5d and low_5d:
-            print(f"📊 5D High: ${high_5d:.2f}, Low: ${low_5d:.2f}")
-
-        # Daily ATR filters
-        if not bars:
-            print("❌ No daily bars for ATR")
-            return None
-        atr = self._wilder_atr(bars, period=14)
-        ok_daily, daily_reason, atr_pct = self.passes_daily_atr_filters(atr, price)
-        print(f"📐 Daily ATR check: {daily_reason}")
+        ok_daily, atr, atr_pct = self._check_daily_gate(symbol, price, high_5d, low_5d, bars, contract)
         if not ok_daily:
-            print("❌ Fails daily ATR filters")
             return None
 
         # Intraday ATR gate
@@ -558,34 +287,52 @@ class CheapOptionsScanner:
             print("❌ Fails intraday ATR gate")
             return None
 
-        # Pullback/Recovery structure
-        pullback_ok, reason = self.is_pullback_recovery_candidate(price, high_5d, low_5d)
-        print(f"📋 Structure: {reason}")
-        if not pullback_ok:
-            print("❌ Not a recovery candidate")
+        if not self._check_structure(price, high_5d, low_5d):
+            return None
+
+        return self._options_stage(symbol, contract, price, high_5d, low_5d, atr, atr_pct, iatr, iatr_pct)
+
+    async def get_cheap_recovery_options_async(self, symbol):
+        """Async variant of get_cheap_recovery_options; same gates, same output"""
+        print(f"\n🎲 ANALYZING {symbol} FOR CHEAP OPTIONS")
+
+        price, high_5d, low_5d, bars, contract = await self.get_stock_data_async(symbol)
+        ok_daily, atr, atr_pct = self._check_daily_gate(symbol, price, high_5d, low_5d, bars, contract)
+        if not ok_daily:
+            return None
+
+        ok_intraday, intraday_msg, iatr, iatr_pct = await self.passes_intraday_atr_gate_async(contract, price)
+        print(f"⚡ {symbol}: {intraday_msg}")
+        if not ok_intraday:
+            print(f"❌ {symbol}: Fails intraday ATR gate")
+            return None
+
+        if not self._check_structure(price, high_5d, low_5d):
             return None
-        print("✅ Structure good; proceeding to options")
 
-        # Options selection
-        chains = self.ib.reqSecDefOptParams(symbol, '', 'STK', contract.conId)
+        return await self._options_stage_async(symbol, contract, price, high_5d, low_5d, atr, atr_pct, iatr, iatr_pct)
+
+    def _option_targets(self, symbol, chains, price):
         if not chains:
             print(f"❌ No option chains for {symbol}")
-            return None
+            return None, None
         chain = chains[0]
-        exp = self.find_target_expiration(chain.expirations)
+        if self.multi_expiration:
+            exp = self.find_target_expirations(chain.expirations)
+        else:
+            exp = self.find_target_expiration(chain.expirations)
         if not exp:
-            print("❌ No 7-14 day expirations")
-            return None
-        print(f"📅 Target expiration: {exp}")
+            print(f"❌ No {self.target_expiry_min_days}-{self.target_expiry_max_days} day expirations")
+            return None, None
+        print(f"📅 Target expiration: {exp if isinstance(exp, str) else ', '.join(exp)}")
 
         strikes = self.get_nearby_strikes(chain.strikes, price)
         if not strikes:
             print("❌ No suitable strikes")
-            return None
+            return exp, None
+        return exp, strikes
 
-        # Get options with probability calculations
-        df = self.get_option_prices_with_probability(symbol, exp, strikes, price, high_5d, low_5d)
-        
+    def _finalize_options(self, df, atr, atr_pct, iatr, iatr_pct):
         if df is not None and not df.empty:
             df['atr'] = atr
             df['atr_pct'] = atr_pct
@@ -604,11 +351,19 @@ class CheapOptionsScanner:
                 # Score the options
                 df = self.score_cheap_options(df)
                 # Sort by score
-                df = df.sort_values(['score', 'risk_reward', 'breakeven_move_pct'], 
-                                  ascending=[False, False, True])
+                df = df.sort_values(self.rank_by, ascending=self.rank_ascending)
 
         return df
 
+    @staticmethod
+    def _slack_line(symbol, best):
+        prob = best.get('prob_itm', 0) * 100
+        return (
+            f"• {symbol} ${best['strike']:.0f}C @ ${best['mid_price']:.2f} | "
+            f"Exp: {short_expiration(best['expiration'])} | {prob:.0f}% ITM | "
+            f"R/R: {best['risk_reward']:.1f}x | {best['tier']}"
+        )
+
     def show_cheap_options_results(self, df, symbol):
         if df is None or df.empty:
             return
@@ -641,8 +396,11 @@ class CheapOptionsScanner:
         print(f"   Probability: {prob_display:.0f}% | Risk/Reward: {best['risk_reward']:.1f}x")
         print(f"   If hits 5D high (${hi:.2f}): {best['profit_at_high_pct']:.0f}% gain")
         print(f"   10-bagger at ${best['ten_bagger_price']:.2f} ({best['ten_bagger_move_pct']:.1f}% move)")
+        if 'prob_touch_high' in best and pd.notna(best['prob_touch_high']):
+            print(f"   Odds before expiry: {best['prob_touch_high'] * 100:.0f}% touch 5D high | "
+                  f"{best['prob_ten_bagger'] * 100:.1f}% 10-bagger | expected return {best['expected_return_pct']:.0f}%")
 
-    def scan_watchlist(self, symbols):
+    def _print_scan_header(self, symbols):
         print("\n🎲 CHEAP CALLS SCANNER")
         print("=" * 70)
         print(f"🔊 Volatility: ATR ≥ {self.min_atr_pct}% | Intraday ≥ {self.intraday_min_atr_pct}%")
@@ -657,35 +415,121 @@ class CheapOptionsScanner:
             print(f"⏱️  Estimated time: {est_time/60:.1f} minutes")
         print("=" * 70)
 
+    def _collect_result(self, symbol, df, found):
+        if df is not None and not df.empty:
+            found[symbol] = df
+            self.show_cheap_options_results(df, symbol)
+            
+            # Flag symbols whose best option makes the consolidated output
+            if self._report_mask(df.head(1)).iloc[0]:
+                print(f"✅ {symbol} added to watchlist")
+                if self.stream_to_slack:
+                    self._send_to_slack("Cheap Calls Scanner (new)", {symbol: df})
+
+    def scan_watchlist(self, symbols):
+        self._print_scan_header(symbols)
+        return self._report_results(self._scan_serial(symbols))
+
+    def _scan_serial(self, symbols):
         found = {}
-        all_candidates = []
-        
-        for i, symbol in enumerate(symbols, 1):
-            try:
-                print(f"\n[{i}/{len(symbols)}]", end=" ")
-                df = self.get_cheap_recovery_options(symbol)
-                if df is not None and not df.empty:
-                    found[symbol] = df
-                    self.show_cheap_options_results(df, symbol)
-                    
-                    # Keep best option for consolidated output
-                    best = df.iloc[0]
-                    if best['score'] > 0.3:  # Minimum score threshold
-                        all_candidates.append(df.head(1))
-                        print(f"✅ {symbol} added to watchlist")
-                
-                # Rate limiting
-                if self.respect_rate_limits and i < len(symbols):
-                    time.sleep(self.delay_between_symbols)
-                    
-            except Exception as e:
-                print(f"❌ {symbol} error: {e}")
-                continue
+        symbols = self._schedule(symbols)
+
+        def analyze(i, symbol):
+            print(f"\n[{i}/{len(symbols)}]", end=" ")
+            return self.get_cheap_recovery_options(symbol)
+
+        # Rate limiting between symbols; resumes from the checkpoint if one is configured
+        delay = self.delay_between_symbols if self.respect_rate_limits else 0
+        for symbol, df in self._scan_resumable(symbols, analyze, delay=delay):
+            self._collect_result(symbol, df, found)
 
-        # Create consolidated output
-        if all_candidates:
-            consolidated_df = pd.concat(all_candidates, ignore_index=True)
-            consolidated_df = consolidated_df.sort_values(['score', 'risk_reward'], ascending=[False, False])
+        self._learn_schedule(found)
+        return found
+
+    def scan_watchlist_async(self, symbols, max_in_flight=8):
+        """
+        Concurrent scan: keeps up to max_in_flight symbols in flight at once, all
+        sharing the same historical-request budget. Results are collected back in
+        watchlist order, so found/CSV output matches scan_watchlist exactly.
+        delay_between_symbols is not applied here; the shared IBPacer paces the scan.
+        """
+        self._print_scan_header(symbols)
+        print(f"🚀 Async mode: {max_in_flight} symbols in flight")
+        return self._report_results(self._scan_concurrent(symbols, max_in_flight))
+
+    def _scan_concurrent(self, symbols, max_in_flight):
+        symbols = self._schedule(symbols)
+        total = len(symbols)
+
+        async def analyze(i, symbol):
+            print(f"\n[{i}/{total}] {symbol} started")
+            return await self.get_cheap_recovery_options_async(symbol)
+
+        results = self._scan_resumable_concurrent(symbols, analyze, max_in_flight)
+
+        found = {}
+        for symbol, df in zip(symbols, results):
+            self._collect_result(symbol, df, found)
+        self._learn_schedule(found)
+        return found
+
+    def scan_watchlist_staged(self, symbols, max_in_flight=1, timer=None):
+        """
+        Two-stage scan: a vectorized pre-screen over the whole universe (see prescreen.py),
+        then the option-chain stage for the survivors only. Prints per-stage timing
+        (pass a StageTimer to read it afterwards, as benchmarks/bench_scanners.py does).
+        """
+        self._print_scan_header(symbols)
+        timer = timer or StageTimer(self.metrics)
+        symbols = self._schedule(symbols)
+        screen = self._until_connected(lambda: run_prescreen(self, symbols, timer), 'Pre-screen')
+        survivors = screen[screen['passed']]
+
+        found = {}
+        with timer.stage('options', len(survivors)):
+            results = self._survivor_options(survivors, max_in_flight)
+        for symbol, df in zip(survivors.index, results):
+            self._collect_result(symbol, df, found)
+        self._learn_schedule(found, screen)
+
+        with timer.stage('report'):
+            found = self._report_results(found)
+        print(timer.report())
+        return found
+
+    def _options_for_survivor(self, symbol, row):
+        try:
+            print(f"\n🎲 {symbol} passed pre-screen ({row['pullback_pct']:.1f}% pullback, ATR {row['atr_pct']:.2f}%)")
+            return self._options_stage(symbol, row['contract'], row['price'], row['high_5d'], row['low_5d'],
+                                       row['atr'], row['atr_pct'], row['iatr'], row['iatr_pct'])
+        except Exception as e:
+            print(f"❌ {symbol} error: {e}")
+            return None
+
+    async def _options_for_survivor_async(self, symbol, row):
+        try:
+            return await self._options_stage_async(
+                symbol, row['contract'], row['price'], row['high_5d'], row['low_5d'],
+                row['atr'], row['atr_pct'], row['iatr'], row['iatr_pct'])
+        except Exception as e:
+            print(f"❌ {symbol} error: {e}")
+            return None
+
+    def scan_shard(self, symbols, max_in_flight=1):
+        """
+        Scan one shard of a sharded run (see shard_scan.py) without writing the CSV
+        or posting to Slack. Returns found for the coordinator to merge.
+        """
+        self._print_scan_header(symbols)
+        if max_in_flight > 1:
+            return self._scan_concurrent(symbols, max_in_flight)
+        return self._scan_serial(symbols)
+
+    def _report_results(self, found):
+        # Create consolidated output: one scoring pass and one sort over every symbol's candidates
+        universe, found = self.rank_universe(found)
+        consolidated_df = self.consolidated_picks(universe)
+        if not consolidated_df.empty:
             
             # Format expiration dates
             def format_expiration(exp_str):
@@ -711,53 +555,65 @@ class CheapOptionsScanner:
                 '$Vol': (consolidated_df['dollar_volume'] / 1000).round(1),  # in thousands
                 'Stock': consolidated_df['current_price'].round(2),
             })
+            if 'prob_touch_high' in consolidated_df:
+                output_df['Touch%'] = (consolidated_df['prob_touch_high'] * 100).round(0)
+                output_df['10x%'] = (consolidated_df['prob_ten_bagger'] * 100).round(1)
+                output_df['EV%'] = consolidated_df['expected_return_pct'].round(0)
             
             # Save consolidated results
             timestamp = datetime.now()
-            filename = f"cheap_calls_{timestamp.strftime('%Y%m%d_%H%M')}.csv"
+            self._store_picks(consolidated_df, timestamp)
+            filename = None
+            if self.write_csv:
+                filename = f"cheap_calls_{timestamp.strftime('%Y%m%d_%H%M')}.csv"
             
-            with open(filename, 'w') as f:
-                f.write("# CHEAP CALLS SCANNER\n")
-                f.write(f"# Scan Date: {timestamp.strftime('%Y-%m-%d')}\n")
-                f.write(f"# Scan Time: {timestamp.strftime('%H:%M:%S')}\n")
-                f.write("#\n")
-                f.write("# Settings:\n")
-                f.write(f"#   Price Range: ${self.min_option_price:.2f}-${self.max_option_price:.2f}\n")
-                f.write(f"#   Min Probability: {self.min_probability*100:.0f}%\n")
-                f.write(f"#   Min Risk/Reward: {self.min_risk_reward}x\n")
-                f.write(f"#   Min Dollar Volume: ${self.min_dollar_volume}\n")
-                f.write("#\n")
-                f.write("# Tier Classifications:\n")
-                f.write("#   HIGH_PROB_CHEAP: 25%+ prob, 5x+ R/R (best of both)\n")
-                f.write("#   BALANCED: 15%+ prob, 7x+ R/R (good balance)\n")
-                f.write("#   PURE_LOTTERY: 10%+ prob, 10x+ R/R (true lottery)\n")
-                f.write("#   SPECULATIVE: Below thresholds (high risk)\n")
-                f.write("#\n")
-                f.write("# Column Definitions:\n")
-                f.write("#   Symbol: Stock ticker\n")
-                f.write("#   Strike: Option strike price\n")
-                f.write("#   Exp: Expiration date\n")
-                f.write("#   Price: Option price (per contract)\n")
-                f.write("#   Prob%: Probability of finishing ITM\n")
-                f.write("#   R/R: Risk/Reward ratio\n")
-                f.write("#   BE: Breakeven price\n")
-                f.write("#   Move%: Required move to breakeven\n")
-                f.write("#   MaxGain%: Gain if hits 5D high\n")
-                f.write("#   Tier: Option classification\n")
-                f.write("#   Spread%: Bid-ask spread\n")
-                f.write("#   Vol: Option volume today\n")
-                f.write("#   $Vol: Dollar volume in thousands\n")
-                f.write("#   Stock: Current stock price\n")
-                f.write("#\n")
+                with open(filename, 'w') as f:
+                    f.write("# CHEAP CALLS SCANNER\n")
+                    f.write(f"# Scan Date: {timestamp.strftime('%Y-%m-%d')}\n")
+                    f.write(f"# Scan Time: {timestamp.strftime('%H:%M:%S')}\n")
+                    f.write("#\n")
+                    f.write("# Settings:\n")
+                    f.write(f"#   Price Range: ${self.min_option_price:.2f}-${self.max_option_price:.2f}\n")
+                    f.write(f"#   Min Probability: {self.min_probability*100:.0f}%\n")
+                    f.write(f"#   Min Risk/Reward: {self.min_risk_reward}x\n")
+                    f.write(f"#   Min Dollar Volume: ${self.min_dollar_volume}\n")
+                    f.write("#\n")
+                    f.write("# Tier Classifications:\n")
+                    f.write("#   HIGH_PROB_CHEAP: 25%+ prob, 5x+ R/R (best of both)\n")
+                    f.write("#   BALANCED: 15%+ prob, 7x+ R/R (good balance)\n")
+                    f.write("#   PURE_LOTTERY: 10%+ prob, 10x+ R/R (true lottery)\n")
+                    f.write("#   SPECULATIVE: Below thresholds (high risk)\n")
+                    f.write("#\n")
+                    f.write("# Column Definitions:\n")
+                    f.write("#   Symbol: Stock ticker\n")
+                    f.write("#   Strike: Option strike price\n")
+                    f.write("#   Exp: Expiration date\n")
+                    f.write("#   Price: Option price (per contract)\n")
+                    f.write("#   Prob%: Probability of finishing ITM\n")
+                    f.write("#   R/R: Risk/Reward ratio\n")
+                    f.write("#   BE: Breakeven price\n")
+                    f.write("#   Move%: Required move to breakeven\n")
+                    f.write("#   MaxGain%: Gain if hits 5D high\n")
+                    f.write("#   Tier: Option classification\n")
+                    f.write("#   Spread%: Bid-ask spread\n")
+                    f.write("#   Vol: Option volume today\n")
+                    f.write("#   $Vol: Dollar volume in thousands\n")
+                    f.write("#   Stock: Current stock price\n")
+                    if 'Touch%' in output_df:
+                        f.write("#   Touch%: Probability the stock touches the 5D high before expiry\n")
+                        f.write("#   10x%: Probability the stock reaches the 10-bagger price before expiry\n")
+                        f.write("#   EV%: Expected return selling at the 5D high if touched, else at expiry\n")
+                    f.write("#\n")
                 
-                output_df.to_csv(f, index=False)
+                    output_df.to_csv(f, index=False)
             
-            print(f"\n💾 CONSOLIDATED RESULTS SAVED: {filename}")
+            if filename:
+                print(f"\n💾 CONSOLIDATED RESULTS SAVED: {filename}")
             print(f"   Total opportunities: {len(output_df)}")
             print(f"   From {len(found)} symbols")
             
             # Send to Slack if webhook is configured
-            send_to_slack("Cheap Calls Scanner", found, filename)
+            self._send_to_slack("Cheap Calls Scanner", found, filename)
             
             # Show tier breakdown
             tier_counts = output_df['Tier'].value_counts()
@@ -778,15 +634,25 @@ class CheapOptionsScanner:
                       f"{best['profit_at_high_pct']:6.0f}% | {best['tier']}")
         else:
             print("\n❌ No cheap options found meeting criteria")
-            send_to_slack("Cheap Calls Scanner", {})
+            self._send_to_slack("Cheap Calls Scanner", {})
             
         print(f"\nTotal historical requests: {self.hist_request_count}")
+        print(f"⏱️  Pacing: {self.pacer.summary()}")
+        if self.data_mode.switches:
+            print(f"📶 Market data: {self.data_mode.summary()}")
+        if self.bar_cache is not None:
+            print(f"🗄️  Bar cache: {self.bar_cache.summary()}")
+        if self.chain_cache is not None:
+            print(f"🗄️  Chain cache: {self.chain_cache.summary()}")
+        print(f"📐 ATR state: {self.atr_store.summary()}")
+        if self.vol_index is not None:
+            print(f"📈 Vol index: {self.vol_index.summary()}")
+        if self.payoff is not None:
+            print(f"🎯 Payoff model: {self.payoff.summary()}")
+        self._flush_snapshots()
+        self._export_metrics()
         return found
 
-    def disconnect(self):
-        self.ib.disconnect()
-        print("\n👋 Disconnected from TWS")
-
 def main():
     scanner = None
     try:
@@ -814,6 +680,10 @@ def main():
             # Rate limiting
             respect_rate_limits=True,
             delay_between_symbols=2.0,
+            # Resume an interrupted scan instead of starting over
+            checkpoint_path='scan_checkpoint.sqlite',
+            # Likely candidates first, symbols that keep failing the gates last
+            schedule_symbols=True,
         )
 
         # Load watchlist from file
@@ -834,10 +704,13 @@ def main():
             ]
 
         print(f"🔍 Scanning {len(watchlist)} symbols for cheap options...")
-        results = scanner.scan_watchlist(watchlist)
+        # Vectorized pre-screen of the whole watchlist, then option chains for the survivors, 8 in flight
+        results = scanner.scan_watchlist_staged(watchlist, max_in_flight=8)
         print("\n🎉 SCAN COMPLETE!")
         print(f"Found cheap options in {len(results)} symbols")
         
+    except ConnectionError as e:
+        print(f"❌ {e}; finished symbols are checkpointed, rerun to resume")
     except Exception as e:
         print(f"❌ Error: {e}")
     finally:
@@ -0,0 +1,397 @@
+import asyncio
+import threading
+import time
+from bisect import insort
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from multiprocessing.managers import BaseManager
+
+
+class IBPacer:
+    """
+    Pacing governor shared by the options scanners.
+
+    Models the limits TWS actually enforces instead of sleeping on a fixed schedule:
+      • Historical data: at most 60 requests in any 10-minute window
+      • Identical historical requests: not repeated within 15 seconds
+      • Same contract/tick type: no 6+ historical requests within 2 seconds
+      • Market data lines: at most N simultaneous subscriptions (100 by default)
+      • API messages: at most 50 per second
+
+    Callers ask for a permit and are given the exact delay until their slot. The slot
+    is reserved immediately, so concurrent callers (async tasks or threads) each get a
+    distinct slot and the budget is used right up to the ceiling without violations.
+    """
+
+    def __init__(
+        self,
+        hist_requests_per_10min=60,
+        hist_window_secs=600.0,
+        identical_cooldown_secs=15.0,
+        same_contract_burst=5,
+        same_contract_window_secs=2.0,
+        max_market_data_lines=100,
+        messages_per_second=50,
+        safety_margin_secs=0.5,
+    ):
+        self.hist_requests_per_10min = int(hist_requests_per_10min)
+        self.hist_window_secs = float(hist_window_secs)
+        self.identical_cooldown_secs = float(identical_cooldown_secs)
+        self.same_contract_burst = int(same_contract_burst)
+        self.same_contract_window_secs = float(same_contract_window_secs)
+        self.max_market_data_lines = int(max_market_data_lines)
+        self.messages_per_second = float(messages_per_second)
+        self.safety_margin_secs = float(safety_margin_secs)
+
+        self._lock = threading.Lock()
+
+        # Historical bookkeeping (reservation timestamps, possibly in the future)
+        self._hist_times = []
+        self._hist_by_contract = defaultdict(deque)
+        self._hist_last_identical = {}
+
+        # Message rate: GCRA "theoretical arrival time"
+        self._msg_tat = 0.0
+
+        # Market data lines
+        self._lines_in_use = 0
+        self._lines_cond = None  # asyncio.Condition, created inside the running loop
+        self._line_waiters = 0  # callers in this process blocked on lines
+
+        # Stats
+        self.hist_permits = 0
+        self.message_permits = 0
+        self.waits = 0
+        self.total_wait_secs = 0.0
+        self.peak_lines = 0
+        self.waits_by_limit = Counter()
+        self.wait_secs_by_limit = Counter()
+
+    # ---------- Historical data ----------
+    def reserve_historical(self, request_key=None, contract_key=None):
+        """
+        Reserve the next legal historical-data slot. Returns the delay (seconds) the
+        caller must wait before sending the request.
+
+        request_key identifies an exact request (for the identical-request cooldown);
+        contract_key identifies contract + whatToShow (for the 2-second burst rule).
+        """
+        with self._lock:
+            now = time.time()
+            cutoff = now - self.hist_window_secs
+            while self._hist_times and self._hist_times[0] <= cutoff:
+                self._hist_times.pop(0)
+
+            slot = now
+            limit = self.hist_requests_per_10min
+            if limit > 0 and len(self._hist_times) >= limit:
+                slot = max(slot, self._hist_times[-limit] + self.hist_window_secs + self.safety_margin_secs)
+
+            if request_key is not None and request_key in self._hist_last_identical:
+                slot = max(slot, self._hist_last_identical[request_key] + self.identical_cooldown_secs)
+
+            if contract_key is not None:
+                recent = self._hist_by_contract[contract_key]
+                while recent and recent[0] <= now - self.same_contract_window_secs:
+                    recent.popleft()
+                if len(recent) >= self.same_contract_burst:
+                    slot = max(slot, recent[-self.same_contract_burst] + self.same_contract_window_secs)
+                recent.append(slot)
+
+            insort(self._hist_times, slot)
+            if request_key is not None:
+                self._hist_last_identical[request_key] = slot
+            self.hist_permits += 1
+            return self._record_wait(slot - now, 'historical')
+
+    def wait_historical(self, request_key=None, contract_key=None, sleep=time.sleep):
+        delay = self.reserve_historical(request_key, contract_key)
+        if delay > 0:
+            sleep(delay)
+        return delay
+
+    async def wait_historical_async(self, request_key=None, contract_key=None):
+        delay = self.reserve_historical(request_key, contract_key)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    def hist_requests_in_window(self):
+        with self._lock:
+            cutoff = time.time() - self.hist_window_secs
+            return sum(1 for t in self._hist_times if t > cutoff)
+
+    def hist_history(self):
+        """Historical request slots still inside the 10-minute window (wall-clock timestamps)"""
+        with self._lock:
+            cutoff = time.time() - self.hist_window_secs
+            return [t for t in self._hist_times if t > cutoff]
+
+    def restore_hist_history(self, times):
+        """Count requests made before a restart (see scan_checkpoint.py) against the window again"""
+        with self._lock:
+            cutoff = time.time() - self.hist_window_secs
+            known = set(self._hist_times)
+            for t in times:
+                if t > cutoff and t not in known:
+                    insort(self._hist_times, t)
+
+    # ---------- API messages ----------
+    def reserve_messages(self, n=1):
+        """Reserve n outgoing API messages under the messages-per-second cap."""
+        if self.messages_per_second <= 0:
+            return 0.0
+        with self._lock:
+            now = time.time()
+            interval = 1.0 / self.messages_per_second
+            burst_tolerance = 1.0 - interval  # allow up to one second's worth of burst
+            tat = max(self._msg_tat, now)
+            delay = max(0.0, tat - now - burst_tolerance)
+            self._msg_tat = tat + n * interval
+            self.message_permits += n
+            return self._record_wait(delay, 'messages')
+
+    def wait_messages(self, n=1, sleep=time.sleep):
+        delay = self.reserve_messages(n)
+        if delay > 0:
+            sleep(delay)
+        return delay
+
+    async def wait_messages_async(self, n=1):
+        delay = self.reserve_messages(n)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    # ---------- Market data lines ----------
+    def _check_line_request(self, n):
+        if n > self.max_market_data_lines:
+            raise ValueError(f"Requested {n} market data lines but only {self.max_market_data_lines} are allowed")
+
+    def try_acquire_lines(self, n=1):
+        self._check_line_request(n)
+        with self._lock:
+            if self._lines_in_use + n > self.max_market_data_lines:
+                return False
+            self._lines_in_use += n
+            self.peak_lines = max(self.peak_lines, self._lines_in_use)
+            return True
+
+    def try_acquire_lines_up_to(self, n):
+        """Take as many free lines as there are, at most n; returns how many were taken."""
+        with self._lock:
+            k = max(0, min(int(n), self.max_market_data_lines - self._lines_in_use))
+            self._lines_in_use += k
+            self.peak_lines = max(self.peak_lines, self._lines_in_use)
+            return k
+
+    def acquire_some_lines(self, n, sleep=time.sleep, poll_secs=0.05):
+        """Block until at least one line is free, then take up to n of them (see ScannerBase._stream_tickers)."""
+        start = time.time()
+        k = self.try_acquire_lines_up_to(n)
+        with self._waiting_for_lines(k):
+            while not k:
+                sleep(poll_secs)
+                k = self.try_acquire_lines_up_to(n)
+        self._record_wait(time.time() - start, 'lines')
+        return k
+
+    async def acquire_some_lines_async(self, n):
+        if self._lines_cond is None:
+            self._lines_cond = asyncio.Condition()
+        start = time.time()
+        taken = [self.try_acquire_lines_up_to(n)]
+        with self._waiting_for_lines(taken[-1]):
+            async with self._lines_cond:
+                await self._lines_cond.wait_for(lambda: taken[-1] or taken.append(self.try_acquire_lines_up_to(n)) or taken[-1])
+        self._record_wait(time.time() - start, 'lines')
+        return taken[-1]
+
+    def acquire_lines(self, n=1, sleep=time.sleep, poll_secs=0.05):
+        """Blocking acquire for the synchronous scan path (lines are freed by other threads)."""
+        start = time.time()
+        got = self.try_acquire_lines(n)
+        with self._waiting_for_lines(got):
+            while not got:
+                sleep(poll_secs)
+                got = self.try_acquire_lines(n)
+        self._record_wait(time.time() - start, 'lines')
+
+    async def acquire_lines_async(self, n=1):
+        """Wait until n lines are free; all n are taken at once so callers never deadlock."""
+        if self._lines_cond is None:
+            self._lines_cond = asyncio.Condition()
+        start = time.time()
+        got = self.try_acquire_lines(n)
+        with self._waiting_for_lines(got):
+            async with self._lines_cond:
+                await self._lines_cond.wait_for(lambda: got or self.try_acquire_lines(n))
+        self._record_wait(time.time() - start, 'lines')
+
+    @contextmanager
+    def _waiting_for_lines(self, satisfied):
+        if satisfied:
+            yield
+            return
+        self._line_waiters += 1
+        try:
+            yield
+        finally:
+            self._line_waiters -= 1
+
+    def lines_wanted(self):
+        """Whether a caller in this process is blocked waiting for lines (streams then hand over ready lines)."""
+        return self._line_waiters > 0
+
+    def release_lines(self, n=1):
+        with self._lock:
+            self._lines_in_use = max(0, self._lines_in_use - n)
+        if self._lines_cond is not None:
+            try:
+                asyncio.get_running_loop().create_task(self._notify_lines())
+            except RuntimeError:
+                pass  # no loop running: nobody can be waiting on the condition
+
+    async def _notify_lines(self):
+        async with self._lines_cond:
+            self._lines_cond.notify_all()
+
+    @property
+    def lines_in_use(self):
+        return self._lines_in_use
+
+    # ---------- Stats ----------
+    def _record_wait(self, delay, limit):
+        delay = max(0.0, delay)
+        if delay > 0:
+            self.waits += 1
+            self.total_wait_secs += delay
+            self._count_limit_wait(delay, limit)
+        return delay
+
+    def _count_limit_wait(self, delay, limit):
+        if delay > 0:
+            self.waits_by_limit[limit] += 1
+            self.wait_secs_by_limit[limit] += delay
+
+    def stats(self):
+        return {
+            'hist_permits': self.hist_permits,
+            'message_permits': self.message_permits,
+            'waits': self.waits,
+            'total_wait_secs': self.total_wait_secs,
+            'peak_lines': self.peak_lines,
+            'lines_in_use': self._lines_in_use,
+            'max_market_data_lines': self.max_market_data_lines,
+            'waits_by_limit': dict(self.waits_by_limit),
+            'wait_secs_by_limit': dict(self.wait_secs_by_limit),
+        }
+
+    def summary(self):
+        s = self.stats()
+        return (f"hist permits {s['hist_permits']} | msg permits {s['message_permits']} | "
+                f"waits {s['waits']} ({s['total_wait_secs']:.1f}s) | peak lines {s['peak_lines']}/{s['max_market_data_lines']}")
+
+
+# ---------- Cross-process sharing ----------
+_shared_pacer = None
+
+
+def _init_shared_pacer(pacer_kwargs):
+    global _shared_pacer
+    _shared_pacer = IBPacer(**pacer_kwargs)
+
+
+def _get_shared_pacer():
+    return _shared_pacer
+
+
+class PacerManager(BaseManager):
+    """Serves one IBPacer from a helper process so several scanner processes draw on a single budget."""
+
+
+PacerManager.register('get_pacer', callable=_get_shared_pacer)
+
+
+def start_pacer_server(**pacer_kwargs):
+    """Start the pacer process. Returns the running manager; pass manager.address to SharedPacer."""
+    manager = PacerManager()
+    manager.start(initializer=_init_shared_pacer, initargs=(pacer_kwargs,))
+    return manager
+
+
+class SharedPacer(IBPacer):
+    """
+    IBPacer whose historical-data and market-data-line budgets live in a PacerManager
+    process, so every worker (one TWS client ID each) respects the account-wide limits.
+
+    The message-rate cap stays local: TWS enforces it per client connection.
+    Waiting still happens in the calling process; only the reservations are remote.
+    """
+
+    def __init__(self, address, authkey=None, poll_secs=0.05, **pacer_kwargs):
+        super().__init__(**pacer_kwargs)
+        manager = PacerManager(address=address, authkey=authkey)
+        manager.connect()
+        self._remote = manager.get_pacer()
+        self.poll_secs = float(poll_secs)
+        self.max_market_data_lines = self._remote.stats()['max_market_data_lines']
+
+    def reserve_historical(self, request_key=None, contract_key=None):
+        self.hist_permits += 1
+        delay = self._remote.reserve_historical(request_key, contract_key)
+        self._count_limit_wait(delay, 'historical')  # per-process breakdown; the server counts it in 'waits'
+        return delay
+
+    def hist_requests_in_window(self):
+        return self._remote.hist_requests_in_window()
+
+    def hist_history(self):
+        return self._remote.hist_history()
+
+    def restore_hist_history(self, times):
+        self._remote.restore_hist_history(list(times))
+
+    def try_acquire_lines(self, n=1):
+        self._check_line_request(n)
+        return self._remote.try_acquire_lines(n)
+
+    async def acquire_lines_async(self, n=1):
+        # Lines are freed by other processes, which can't signal our event loop: poll instead
+        start = time.time()
+        got = self.try_acquire_lines(n)
+        with self._waiting_for_lines(got):
+            while not got:
+                await asyncio.sleep(self.poll_secs)
+                got = self.try_acquire_lines(n)
+        self._record_wait(time.time() - start, 'lines')
+
+    def try_acquire_lines_up_to(self, n):
+        return self._remote.try_acquire_lines_up_to(n)
+
+    async def acquire_some_lines_async(self, n):
+        start = time.time()
+        k = self.try_acquire_lines_up_to(n)
+        with self._waiting_for_lines(k):
+            while not k:
+                await asyncio.sleep(self.poll_secs)
+                k = self.try_acquire_lines_up_to(n)
+        self._record_wait(time.time() - start, 'lines')
+        return k
+
+    def release_lines(self, n=1):
+        self._remote.release_lines(n)
+
+    @property
+    def lines_in_use(self):
+        return self._remote.stats()['lines_in_use']
+
+    def stats(self):
+        """Account-wide historical/line figures from the server, message figures from this process."""
+        s = self._remote.stats()
+        s['message_permits'] = self.message_permits
+        s['waits'] += self.waits
+        s['total_wait_secs'] += self.total_wait_secs
+        s['waits_by_limit'] = dict(self.waits_by_limit)
+        s['wait_secs_by_limit'] = dict(self.wait_secs_by_limit)
+        return s
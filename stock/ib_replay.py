@@ -0,0 +1,473 @@
+import asyncio
+import gzip
+import heapq
+import json
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import ib_insync as ib
+
+from bar_cache import BarCache
+from chain_cache import ChainCache
+
+# Ticker fields the scanners read, captured when a market data line is cancelled
+TICKER_FIELDS = (
+    'bid', 'ask', 'last', 'close', 'open', 'high', 'low', 'volume',
+    'bidSize', 'askSize', 'lastSize', 'impliedVolatility',
+    'callOpenInterest', 'putOpenInterest', 'optOpenInterest',
+)
+# Ticker fields TWS only fills when their generic tick was requested
+GENERIC_TICK_FIELDS = {'101': ('callOpenInterest', 'putOpenInterest', 'optOpenInterest')}
+GREEKS_FIELDS = ('tickAttrib', 'impliedVol', 'delta', 'optPrice', 'pvDividend', 'gamma', 'vega', 'theta', 'undPrice')
+
+
+def _open(path, mode):
+    return gzip.open(path, mode + 't') if str(path).endswith('.gz') else open(path, mode)
+
+
+# ---------- Request keys (shared by recorder and replayer) ----------
+def _contract_id(c):
+    return str(c.conId) if c.conId else ChainCache.contract_key(c)
+
+
+def qualify_key(c):
+    return ChainCache.contract_key(c)
+
+
+def hist_key(contract, endDateTime, durationStr, barSizeSetting, whatToShow, useRTH):
+    end = endDateTime.isoformat() if hasattr(endDateTime, 'isoformat') else str(endDateTime or '')
+    return f"{_contract_id(contract)}|{end}|{durationStr}|{barSizeSetting}|{whatToShow}|{int(bool(useRTH))}"
+
+
+def hist_series_key(contract, barSizeSetting, whatToShow, useRTH):
+    return f"{_contract_id(contract)}|{barSizeSetting}|{whatToShow}|{int(bool(useRTH))}"
+
+
+def secdef_key(underlyingSymbol, futFopExchange, underlyingSecType, underlyingConId):
+    return f"{underlyingSymbol}|{futFopExchange}|{underlyingSecType}|{underlyingConId}"
+
+
+def mkt_key(contract, genericTickList=''):
+    return f"{_contract_id(contract)}|{genericTickList}"
+
+
+# ---------- Serialization ----------
+def bars_to_json(bars):
+    return [[BarCache._to_ts(b.date), b.open, b.high, b.low, b.close, b.volume, b.average, b.barCount]
+            for b in bars or []]
+
+
+def bars_from_json(rows):
+    bars = ib.BarDataList()
+    bars.extend(
+        ib.BarData(date=BarCache._from_ts(d), open=o, high=h, low=l, close=c, volume=v, average=a, barCount=n)
+        for d, o, h, l, c, v, a, n in rows
+    )
+    return bars
+
+
+def chains_to_json(chains):
+    return [{
+        'exchange': c.exchange,
+        'underlyingConId': c.underlyingConId,
+        'tradingClass': c.tradingClass,
+        'multiplier': c.multiplier,
+        'expirations': sorted(c.expirations),
+        'strikes': sorted(c.strikes),
+    } for c in chains or []]
+
+
+def ticker_to_json(t):
+    data = {f: getattr(t, f) for f in TICKER_FIELDS if hasattr(t, f)}
+    g = t.modelGreeks
+    data['modelGreeks'] = {f: getattr(g, f) for f in GREEKS_FIELDS} if g is not None else None
+    return data
+
+
+def _requested_fields(response, generic_ticks):
+    """A recorded ticker without the fields of generic ticks this request didn't ask for (fuzzy matches can carry them)"""
+    requested = set(generic_ticks.split(','))
+    dropped = {f for tick, fields in GENERIC_TICK_FIELDS.items() if tick not in requested for f in fields}
+    return {k: v for k, v in response.items() if k not in dropped} if dropped else response
+
+
+class RecordingIB(ib.IB):
+    """
+    Drop-in ib.IB that writes every qualifyContracts, reqHistoricalData,
+    reqSecDefOptParams and reqMktData response to a JSONL session file
+    (gzipped if the path ends in .gz), together with how long it took to arrive.
+
+    Pass it to a scanner as ib_client= during a live session; ReplayIB serves
+    the file back offline.
+    """
+
+    def __init__(self, path='ib_session.jsonl.gz'):
+        super().__init__()
+        self.path = path
+        self._file = _open(path, 'w')
+        self._live = {}  # mkt_key -> (contract, genericTickList, requested_at)
+        self.recorded = Counter()
+        self._write({'kind': 'session', 'recorded_at': datetime.now().isoformat()})
+
+    def _write(self, record):
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+
+    def _record(self, kind, key, latency, response, **extra):
+        self.recorded[kind] += 1
+        self._write(dict(kind=kind, key=key, latency=round(latency, 4), response=response, **extra))
+
+    # ib.IB's blocking methods run these coroutines, so recording them covers both APIs
+    async def qualifyContractsAsync(self, *contracts):
+        keys = [qualify_key(c) for c in contracts]
+        start = time.time()
+        qualified = await super().qualifyContractsAsync(*contracts)
+        latency = time.time() - start
+        for key, c in zip(keys, contracts):
+            self._record('qualify', key, latency, ib.util.dataclassNonDefaults(c) if c.conId else None)
+        return qualified
+
+    async def reqHistoricalDataAsync(self, contract, endDateTime, durationStr, barSizeSetting,
+                                     whatToShow, useRTH, formatDate=1, keepUpToDate=False,
+                                     chartOptions=[], timeout=60):
+        start = time.time()
+        bars = await super().reqHistoricalDataAsync(
+            contract, endDateTime, durationStr, barSizeSetting, whatToShow, useRTH,
+            formatDate, keepUpToDate, chartOptions, timeout)
+        self._record(
+            'hist', hist_key(contract, endDateTime, durationStr, barSizeSetting, whatToShow, useRTH),
+            time.time() - start, bars_to_json(bars),
+            series=hist_series_key(contract, barSizeSetting, whatToShow, useRTH),
+        )
+        return bars
+
+    async def reqSecDefOptParamsAsync(self, underlyingSymbol, futFopExchange, underlyingSecType, underlyingConId):
+        start = time.time()
+        chains = await super().reqSecDefOptParamsAsync(
+            underlyingSymbol, futFopExchange, underlyingSecType, underlyingConId)
+        self._record('secdef', secdef_key(underlyingSymbol, futFopExchange, underlyingSecType, underlyingConId),
+                     time.time() - start, chains_to_json(chains))
+        return chains
+
+    def reqMktData(self, contract, genericTickList='', snapshot=False, regulatorySnapshot=False, mktDataOptions=None):
+        self._live[mkt_key(contract, genericTickList)] = (contract, genericTickList, time.time())
+        return super().reqMktData(contract, genericTickList, snapshot, regulatorySnapshot, mktDataOptions or [])
+
+    def _record_ticker(self, key):
+        contract, generic_ticks, requested_at = self._live.pop(key)
+        t = self.ticker(contract)
+        if t is None:
+            return
+        # Latency = when the last update before cancel arrived, i.e. how long the data took to fill in
+        arrived = t.time.timestamp() if t.time else time.time()
+        self._record('mkt', key, max(0.0, arrived - requested_at), ticker_to_json(t),
+                     contract=_contract_id(contract))
+
+    def cancelMktData(self, contract):
+        for key in [k for k, (c, _, _) in self._live.items() if c is contract or _contract_id(c) == _contract_id(contract)]:
+            self._record_ticker(key)
+        return super().cancelMktData(contract)
+
+    def disconnect(self):
+        for key in list(self._live):
+            self._record_ticker(key)
+        super().disconnect()
+        if not self._file.closed:
+            self._file.close()
+            print(f"💾 Recorded session to {self.path}: " +
+                  ", ".join(f"{k} {n}" for k, n in sorted(self.recorded.items())))
+
+
+class ReplayIB:
+    """
+    Local stand-in for ib.IB that serves a session recorded by RecordingIB.
+
+    time_scale sets the timing: 1.0 replays the recorded latencies, 0.1 runs ten
+    times faster, 0 answers instantly. Requests that were recorded more than once
+    are served in recording order (the last answer repeats). Unknown requests get
+    what IB gives for an unknown contract (nothing), or raise KeyError with strict=True.
+
+    For deterministic runs scan with bar_cache_path=None and chain_cache_path=None
+    and wrap the scan in replay.clock() so expiry windows use the recording date.
+    """
+
+    def __init__(self, path='ib_session.jsonl.gz', time_scale=0.0, strict=False):
+        self.path = path
+        self.time_scale = float(time_scale)
+        self.strict = strict
+        self.recorded_at = None
+        self._records = defaultdict(list)  # (kind, key) -> [record, ...]
+        self._series = {}                  # hist series key -> last recorded bars
+        self._by_contract = {}             # contract id -> last recorded ticker
+        self._cursor = Counter()
+        self._pending = []                 # heap of (due, seq, ticker, data) for the blocking API
+        self._seq = 0
+        self._tickers = {}
+        self.served = Counter()
+        self.fuzzy = Counter()
+        self.misses = Counter()
+        self.updateEvent = ib.Event('updateEvent')
+        self.errorEvent = ib.Event('errorEvent')  # never fires; recorded errors are not replayed
+        self.connected = False
+        self._load()
+
+    def _load(self):
+        with _open(self.path, 'r') as f:
+            for line in f:
+                rec = json.loads(line)
+                if rec['kind'] == 'session':
+                    self.recorded_at = datetime.fromisoformat(rec['recorded_at'])
+                    continue
+                self._records[(rec['kind'], rec['key'])].append(rec)
+                if rec['kind'] == 'hist':
+                    self._series[rec['series']] = rec
+                elif rec['kind'] == 'mkt':
+                    self._by_contract[rec['contract']] = rec
+        n = sum(len(v) for v in self._records.values())
+        print(f"📼 Loaded {n} recorded responses from {self.path} (recorded {self.recorded_at:%Y-%m-%d %H:%M})")
+
+    def symbols(self):
+        """Underlying symbols qualified in the recording, i.e. the watchlist it was taken from."""
+        return list(dict.fromkeys(key.split('|')[1] for kind, key in self._records if kind == 'qualify' and key.startswith('STK|')))
+
+    def _next(self, kind, key, fallback=None):
+        recs = self._records.get((kind, key))
+        if recs:
+            i = min(self._cursor[(kind, key)], len(recs) - 1)
+            self._cursor[(kind, key)] += 1
+            self.served[kind] += 1
+            return recs[i]
+        if fallback is not None:
+            self.fuzzy[kind] += 1
+            return fallback
+        self.misses[kind] += 1
+        if self.strict:
+            raise KeyError(f"no recorded {kind} response for {key}")
+        return None
+
+    def _delay(self, rec):
+        return rec['latency'] * self.time_scale if rec else 0.0
+
+    # ---------- Session ----------
+    def connect(self, host='127.0.0.1', port=7496, clientId=1, **kwargs):
+        self.connected = True
+        return self
+
+    def isConnected(self):
+        return self.connected
+
+    def disconnect(self):
+        self.connected = False
+        print(f"📼 Replay: {self.summary()}")
+
+    def run(self, *awaitables, timeout=None):
+        return ib.util.run(*awaitables, timeout=timeout)
+
+    @contextmanager
+    def clock(self, modules=('cheap_calls_scanner', 'high_probability_calls_scanner', 'bs_pricing', 'snapshot_store')):
+        """Freeze datetime.now() in the given modules at the recording time."""
+        with frozen_clock(self.recorded_at, modules):
+            yield
+
+    # ---------- Contracts and chains ----------
+    def _qualify(self, contracts):
+        qualified, delay = [], 0.0
+        for c in contracts:
+            rec = self._next('qualify', qualify_key(c))
+            delay = max(delay, self._delay(rec))
+            if rec and rec['response']:
+                for field, value in rec['response'].items():
+                    setattr(c, field, value)
+                qualified.append(c)
+        return qualified, delay
+
+    def qualifyContracts(self, *contracts):
+        qualified, delay = self._qualify(contracts)
+        self.sleep(delay)
+        return qualified
+
+    async def qualifyContractsAsync(self, *contracts):
+        qualified, delay = self._qualify(contracts)
+        await asyncio.sleep(delay)
+        return qualified
+
+    def _secdef(self, *args):
+        rec = self._next('secdef', secdef_key(*args))
+        chains = [ib.OptionChain(**c) for c in rec['response']] if rec else []
+        return chains, self._delay(rec)
+
+    def reqSecDefOptParams(self, underlyingSymbol, futFopExchange, underlyingSecType, underlyingConId):
+        chains, delay = self._secdef(underlyingSymbol, futFopExchange, underlyingSecType, underlyingConId)
+        self.sleep(delay)
+        return chains
+
+    async def reqSecDefOptParamsAsync(self, underlyingSymbol, futFopExchange, underlyingSecType, underlyingConId):
+        chains, delay = self._secdef(underlyingSymbol, futFopExchange, underlyingSecType, underlyingConId)
+        await asyncio.sleep(delay)
+        return chains
+
+    # ---------- Historical bars ----------
+    def _hist(self, contract, endDateTime, durationStr, barSizeSetting, whatToShow, useRTH):
+        # A different duration for the same series (e.g. a bar cache top-up) falls back to the last recording
+        rec = self._next('hist', hist_key(contract, endDateTime, durationStr, barSizeSetting, whatToShow, useRTH),
+                         fallback=self._series.get(hist_series_key(contract, barSizeSetting, whatToShow, useRTH)))
+        bars = bars_from_json(rec['response']) if rec else ib.BarDataList()
+        bars.contract = contract
+        return bars, self._delay(rec)
+
+    def reqHistoricalData(self, contract, endDateTime, durationStr, barSizeSetting, whatToShow, useRTH,
+                          formatDate=1, keepUpToDate=False, chartOptions=[], timeout=60):
+        bars, delay = self._hist(contract, endDateTime, durationStr, barSizeSetting, whatToShow, useRTH)
+        self.sleep(delay)
+        return bars
+
+    async def reqHistoricalDataAsync(self, contract, endDateTime, durationStr, barSizeSetting, whatToShow, useRTH,
+                                     formatDate=1, keepUpToDate=False, chartOptions=[], timeout=60):
+        bars, delay = self._hist(contract, endDateTime, durationStr, barSizeSetting, whatToShow, useRTH)
+        await asyncio.sleep(delay)
+        return bars
+
+    def cancelHistoricalData(self, bars):
+        pass
+
+    # ---------- Market data ----------
+    def reqMarketDataType(self, marketDataType):
+        pass
+
+    def ticker(self, contract):
+        return self._tickers.get(_contract_id(contract))
+
+    def reqMktData(self, contract, genericTickList='', snapshot=False, regulatorySnapshot=False, mktDataOptions=None):
+        t = ib.Ticker(contract=contract)
+        self._tickers[_contract_id(contract)] = t
+        rec = self._next('mkt', mkt_key(contract, genericTickList),
+                         fallback=self._by_contract.get(_contract_id(contract)))
+        if rec is None:
+            return t
+        data = _requested_fields(rec['response'], genericTickList)
+        delay = self._delay(rec)
+        if delay <= 0:
+            self._deliver(t, data)
+            return t
+        try:
+            asyncio.get_running_loop().call_later(delay, self._deliver, t, data)
+        except RuntimeError:
+            # Blocking API: delivered from sleep()/waitOnUpdate()
+            self._seq += 1
+            heapq.heappush(self._pending, (time.time() + delay, self._seq, t, data))
+        return t
+
+    def cancelMktData(self, contract):
+        self._tickers.pop(_contract_id(contract), None)
+
+    def _deliver(self, t, data):
+        for field, value in data.items():
+            if field == 'modelGreeks':
+                value = ib.OptionComputation(**value) if value else None
+            setattr(t, field, value)
+        t.time = datetime.now(timezone.utc)
+        t.updateEvent.emit(t)
+        self.updateEvent.emit()
+
+    def _deliver_due(self):
+        now = time.time()
+        n = 0
+        while self._pending and self._pending[0][0] <= now:
+            _, _, t, data = heapq.heappop(self._pending)
+            self._deliver(t, data)
+            n += 1
+        return n
+
+    def sleep(self, *args):
+        secs = args[0] if args else 0.02
+        end = time.time() + secs
+        self._deliver_due()
+        while True:
+            remaining = end - time.time()
+            if remaining <= 0:
+                break
+            due = self._pending[0][0] - time.time() if self._pending else remaining
+            time.sleep(max(0.0, min(remaining, due)))
+            self._deliver_due()
+        return True
+
+    def waitOnUpdate(self, timeout=0):
+        """Deliver the next due ticker update; False when nothing arrives before the timeout."""
+        if self._deliver_due():
+            return True
+        if not self._pending:
+            # Nothing left to arrive: idle out the timeout like a quiet live connection
+            time.sleep(timeout)
+            return False
+        wait = self._pending[0][0] - time.time()
+        if timeout and wait > timeout:
+            time.sleep(timeout)
+            return bool(self._deliver_due())
+        time.sleep(max(0.0, wait))
+        return bool(self._deliver_due())
+
+    def summary(self):
+        kinds = sorted(set(self.served) | set(self.fuzzy) | set(self.misses))
+        return " | ".join(
+            f"{k} {self.served[k]} served" + (f" / {self.fuzzy[k]} fuzzy" if self.fuzzy[k] else "") +
+            (f" / {self.misses[k]} missing" if self.misses[k] else "")
+            for k in kinds
+        ) or "no requests"
+
+
+@contextmanager
+def frozen_clock(at, modules):
+    """Swap the datetime name in each loaded module for one whose now() returns `at`."""
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return at.astimezone(tz) if tz else at
+
+    patched = []
+    for name in modules:
+        module = sys.modules.get(name)
+        if module is not None and getattr(module, 'datetime', None) is datetime:
+            module.datetime = FrozenDatetime
+            patched.append(module)
+    try:
+        yield
+    finally:
+        for module in patched:
+            module.datetime = datetime
+
+
+def main():
+    from cheap_calls_scanner import CheapOptionsScanner
+    from shard_scan import load_watchlist
+
+    # 'record' runs a live scan through RecordingIB; 'replay' serves it back offline
+    mode = 'replay'
+    path = 'ib_session.jsonl.gz'
+    time_scale = 0.0  # replay timing: 1.0 = as recorded, 0.1 = 10x faster, 0 = instant
+
+    watchlist = load_watchlist('watchlist.txt')
+    if mode == 'record':
+        scanner = CheapOptionsScanner(port=7496, client_id=5, ib_client=RecordingIB(path))
+        try:
+            scanner.scan_watchlist_staged(watchlist)
+        finally:
+            scanner.disconnect()
+        return
+
+    replay = ReplayIB(path, time_scale=time_scale)
+    scanner = CheapOptionsScanner(
+        client_id=5, ib_client=replay, respect_rate_limits=False,
+        bar_cache_path=None, chain_cache_path=None,
+    )
+    start = time.time()
+    with replay.clock():
+        found = scanner.scan_shard(watchlist)  # no CSV / Slack for offline runs
+    print(f"\n🎉 REPLAY COMPLETE in {time.time() - start:.2f}s | {len(found)} symbols with candidates")
+    scanner.disconnect()
+
+
+if __name__ == "__main__":
+    main()
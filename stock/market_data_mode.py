@@ -0,0 +1,114 @@
+import time
+from collections import Counter
+
+# reqMarketDataType values
+LIVE, FROZEN, DELAYED, DELAYED_FROZEN = 1, 2, 3, 4
+MODE_NAMES = {LIVE: 'live', FROZEN: 'frozen', DELAYED: 'delayed', DELAYED_FROZEN: 'delayed_frozen'}
+
+# IB messages meaning the current market data type cannot serve a request
+NO_DATA_ERRORS = {
+    354: 'not_subscribed',
+    10089: 'needs_subscription',
+    10090: 'partly_subscribed',
+    10167: 'delayed_shown',
+    10168: 'delayed_not_enabled',
+    10186: 'not_subscribed_delayed_disabled',
+    10197: 'competing_session',
+}
+
+
+class MarketDataMode:
+    """
+    Market data type (live -> frozen -> delayed -> delayed frozen) for one TWS connection,
+    stepped down automatically when ticks stop arriving.
+
+    After each readiness wait the scanner reports the batch via fall_back(). The mode steps
+    down one level when too few tickers filled, or IB said the current type cannot serve
+    them (e.g. outside RTH live options quotes never arrive; frozen returns the last
+    values, delayed covers symbols without a subscription). The scanner then re-requests
+    the missing tickers once under the new type. Frozen and delayed still return live
+    data wherever it is available, so stepping down never loses data; retry_live_secs
+    after a step down the next request tries the preferred mode again.
+    """
+
+    def __init__(self, ib_client, modes=(LIVE, FROZEN, DELAYED, DELAYED_FROZEN), min_fill_ratio=0.5,
+                 min_batch=3, retry_live_secs=600.0):
+        self.ib = ib_client
+        self.modes = [int(m) for m in modes]
+        if any(m not in MODE_NAMES for m in self.modes):
+            raise ValueError(f"Unknown market data type in {modes}; use {sorted(MODE_NAMES)}")
+        self.min_fill_ratio = float(min_fill_ratio)
+        self.min_batch = int(min_batch)
+        self.retry_live_secs = float(retry_live_secs)
+        self.level = 0
+        self.applied = None  # type last sent to TWS
+        self.stepped_down_at = None
+        self._errors = Counter()  # NO_DATA_ERRORS since the last fall_back()
+        self._window = [0, 0]  # tickers filled / seen under the current mode, not yet judged
+        self.switches = Counter()  # (from, to) names -> count
+        self.refilled = 0
+        event = getattr(ib_client, 'errorEvent', None)
+        if event is not None:
+            event += self._on_error
+
+    @property
+    def mode(self):
+        return self.modes[self.level]
+
+    @property
+    def name(self):
+        return MODE_NAMES[self.mode]
+
+    def _on_error(self, reqId, errorCode, errorString, contract=None):
+        if errorCode in NO_DATA_ERRORS:
+            self._errors[NO_DATA_ERRORS[errorCode]] += 1
+
+    # ---------- Switching ----------
+    def apply(self):
+        """Send reqMarketDataType if the mode changed (or is due another try at the preferred one)"""
+        if self.level and self.stepped_down_at is not None and time.time() - self.stepped_down_at >= self.retry_live_secs:
+            self._switch(0, 'retry')
+        if self.applied != self.mode and self.ib.isConnected():
+            self.ib.reqMarketDataType(self.mode)
+            self.applied = self.mode
+
+    def _switch(self, level, reason):
+        before = self.name
+        self.level = level
+        self._window = [0, 0]
+        self.stepped_down_at = time.time() if level else None
+        self.switches[(before, self.name)] += 1
+        print(f"📶 Market data: {before} -> {self.name} ({reason})")
+
+    def fall_back(self, wait, requested_mode):
+        """
+        Judge a finished ticker wait for a batch requested under requested_mode. Steps down
+        one mode and returns True when the missing tickers should be re-requested under it;
+        False when the data is good enough or there is nothing left to fall back to.
+        Fill is judged over consecutive batches until min_batch tickers were seen, so
+        one-ticker requests (the serial scan path) can trigger a step down too.
+        """
+        errors, self._errors = self._errors, Counter()
+        ready, total = len(wait.ready), len(wait.ready) + len(wait.missing)
+        if total == 0:
+            return False
+        if requested_mode != self.mode:
+            # Another batch already stepped down while this one waited: just retry under the new mode
+            return bool(wait.missing) and self.modes.index(requested_mode) < self.level
+        self._window[0] += ready
+        self._window[1] += total
+        if not errors and self._window[1] < self.min_batch:
+            return False
+        filled, seen = self._window
+        self._window = [0, 0]
+        if not wait.missing or not (errors or filled / seen < self.min_fill_ratio):
+            return False
+        if self.level + 1 >= len(self.modes):
+            return False
+        reason = ', '.join(f"{k} x{n}" for k, n in errors.items()) or f"{filled}/{seen} tickers filled"
+        self._switch(self.level + 1, reason)
+        return True
+
+    def summary(self):
+        switched = ', '.join(f"{a}->{b} x{n}" for (a, b), n in self.switches.items()) or 'no switches'
+        return f"{self.name} | {switched} | {self.refilled} tickers re-requested"
@@ -0,0 +1,176 @@
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+import bs_pricing
+
+MODELS = ('closed_form', 'monte_carlo')
+
+
+class PayoffEngine:
+    """
+    Path-aware odds and payoff for every contract of a chain at once, under lognormal
+    (GBM) paths at each contract's IV with drift `drift` (the risk-free rate by default):
+
+      prob_touch_high   P(the stock trades at the 5-day high before expiry)
+      prob_ten_bagger   P(it trades at strike + 10 x premium, where the call is worth 10x)
+      expected_payoff   per share, undiscounted, for the scanners' own plan: sell at the
+                        5-day high if it is touched (intrinsic value there, as
+                        profit_at_high assumes), otherwise hold to expiry
+      expected_return_pct   (expected_payoff - premium) / premium
+
+    'closed_form' uses the reflection principle (continuous monitoring; see
+    bs_pricing.prob_touch). 'monte_carlo' simulates batches of paths sharing one set of
+    seeded draws across the chain, corrects each step for a touch in between with the
+    Brownian bridge, and optionally draws Student-t steps (tail_df) for fat tails, which
+    the closed form can't express. Batch k always uses the same seed, so a run is
+    reproducible; budget_secs caps the time per chain (at least one batch per
+    expiration), and the paths actually used are reported in mc_paths.
+    """
+
+    COLUMNS = ['prob_touch_high', 'prob_ten_bagger', 'expected_payoff', 'expected_return_pct']
+
+    def __init__(self, model='closed_form', drift=0.045, n_paths=20000, batch_paths=2000,
+                 steps_per_day=1, seed=7, budget_secs=0.1, tail_df=None):
+        if model not in MODELS:
+            raise ValueError(f"Unknown payoff model {model!r}; use one of {list(MODELS)}")
+        self.model = model
+        self.drift = float(drift)
+        self.n_paths = int(n_paths)
+        self.batch_paths = max(1, min(int(batch_paths), self.n_paths))
+        self.steps_per_day = max(1, int(steps_per_day))
+        self.seed = int(seed)
+        self.budget_secs = float(budget_secs) if budget_secs else None
+        self.tail_df = float(tail_df) if tail_df else None
+        if self.tail_df is not None and self.tail_df <= 2:
+            raise ValueError("tail_df must be > 2 (finite variance)")
+        self.chains = 0
+        self.paths = 0
+        self.over_budget = 0
+
+    # ---------- Public API ----------
+    def features(self, price, strikes, T_years, iv, premium, high_5d):
+        """The columns above (plus mc_paths for Monte Carlo) for one chain, aligned with strikes"""
+        K = np.asarray(strikes, dtype=float)
+        T = np.asarray(T_years, dtype=float)
+        sigma = np.asarray(iv, dtype=float)
+        premium = np.asarray(premium, dtype=float)
+        ten_bagger = K + 10.0 * premium
+        if self.model == 'monte_carlo':
+            touch_high, touch_ten, payoff, paths = self.monte_carlo(price, K, T, sigma, high_5d, ten_bagger)
+        else:
+            touch_high, touch_ten, payoff = self.closed_form(price, K, T, sigma, high_5d, ten_bagger)
+            paths = None
+        self.chains += 1
+        out = pd.DataFrame({
+            'prob_touch_high': touch_high,
+            'prob_ten_bagger': touch_ten,
+            'expected_payoff': payoff,
+            'expected_return_pct': (payoff - premium) / premium * 100.0,
+        }, index=getattr(strikes, 'index', None))
+        if paths is not None:
+            out['mc_paths'] = paths
+        return out
+
+    def closed_form(self, S, K, T, sigma, high, ten_bagger):
+        """(P(touch high), P(touch 10-bagger price), expected payoff) by the reflection principle"""
+        K, T, sigma, ten_bagger = np.broadcast_arrays(K, T, sigma, ten_bagger)
+        H = np.full(K.shape, float(high))
+        touch_high = bs_pricing.prob_touch(S, H, T, sigma, r=self.drift)
+        touch_ten = np.where(ten_bagger > S, bs_pricing.prob_touch(S, ten_bagger, T, sigma, r=self.drift), 1.0)
+        touch_high = np.where(H > S, touch_high, 1.0)
+        exit_value = np.maximum(H - K, 0.0)
+        payoff = touch_high * exit_value + self._no_touch_payoff(S, K, T, sigma, H)
+        valid = np.isfinite(sigma) & (sigma > 0) & (T > 0) & (S > 0)
+        return (np.where(valid, touch_high, np.nan), np.where(valid, touch_ten, np.nan),
+                np.where(valid, payoff, np.nan))
+
+    def _no_touch_payoff(self, S, K, T, sigma, H):
+        """E[(S_T - K)+ ; the path stays below H], from the reflected density of log(S_T / S)"""
+        valid = (S > 0) & (K > 0) & (H > 0) & (T > 0) & (sigma > 0)
+        # Placeholders keep the math finite; invalid cells are zeroed at the end
+        S, K, H = (np.where(valid, v, 1.0) for v in np.broadcast_arrays(S, K, H))
+        T, sigma = np.where(valid, T, 1.0), np.where(valid, sigma, 1.0)
+        nu = self.drift - 0.5 * sigma ** 2
+        s = sigma * np.sqrt(T)
+        b = np.log(H / S)
+        k = np.log(K / S)
+
+        def partial(m):
+            # E[(S e^x - K) ; k < x < b] for x ~ N(m, s^2)
+            stock = S * np.exp(m + 0.5 * s * s) * (bs_pricing.norm_cdf((b - m - s * s) / s) - bs_pricing.norm_cdf((k - m - s * s) / s))
+            cash = K * (bs_pricing.norm_cdf((b - m) / s) - bs_pricing.norm_cdf((k - m) / s))
+            return stock - cash
+
+        with np.errstate(over='ignore', invalid='ignore'):
+            value = partial(nu * T) - np.exp(2.0 * nu * b / sigma ** 2) * partial(2.0 * b + nu * T)
+        return np.where(valid & (k < b) & (b > 0), np.maximum(value, 0.0), 0.0)
+
+    def monte_carlo(self, S, K, T, sigma, high, ten_bagger):
+        """Seeded, batched simulation; returns the closed_form triple plus the paths used per contract"""
+        K, T, sigma, ten_bagger = (np.array(a, dtype=float) for a in np.broadcast_arrays(K, T, sigma, ten_bagger))
+        n = K.shape[0]
+        touch_high, touch_ten, payoff = (np.full(n, np.nan) for _ in range(3))
+        paths = np.zeros(n, dtype=int)
+        valid = np.isfinite(sigma) & (sigma > 0) & (T > 0) & (S > 0) & np.isfinite(K)
+        started = time.perf_counter()
+        for t in np.unique(T[valid]):
+            idx = np.nonzero(valid & (T == t))[0]
+            sums, used = self._simulate(S, K[idx], t, sigma[idx], float(high), ten_bagger[idx], started)
+            touch_high[idx], touch_ten[idx], payoff[idx] = sums / used
+            paths[idx] = used
+        self.paths += int(paths.sum())
+        return touch_high, touch_ten, payoff, paths
+
+    def summary(self):
+        line = f"{self.model}: {self.chains} chains"
+        if self.model == 'monte_carlo':
+            line += f" | {self.paths} contract paths | {self.over_budget} expirations cut short by the budget"
+        return line
+
+    # ---------- Simulation ----------
+    def _steps(self, rng, shape):
+        """Unit-variance increments: normal, or Student-t scaled to variance 1"""
+        if self.tail_df is None:
+            return rng.standard_normal(shape)
+        return rng.standard_t(self.tail_df, shape) * math.sqrt((self.tail_df - 2.0) / self.tail_df)
+
+    def _simulate(self, S, K, T, sigma, high, ten_bagger, started):
+        n_steps = max(1, math.ceil(T * bs_pricing.DAYS_PER_YEAR * self.steps_per_day))
+        dt = T / n_steps
+        times = dt * np.arange(1, n_steps + 1)
+        nu = (self.drift - 0.5 * sigma ** 2)[:, None, None]
+        vol = sigma[:, None, None]
+        var_dt = (sigma ** 2 * dt)[:, None, None]
+        b_high = np.full((K.shape[0], 1, 1), math.log(high / S))
+        b_ten = np.log(ten_bagger / S)[:, None, None]
+        exit_value = np.maximum(high - K, 0.0)[:, None]
+
+        sums = np.zeros((3, K.shape[0]))
+        used = batch = 0
+        while used < self.n_paths:
+            m = min(self.batch_paths, self.n_paths - used)
+            rng = np.random.default_rng([self.seed, batch])
+            W = np.cumsum(self._steps(rng, (m, n_steps)) * math.sqrt(dt), axis=1)
+            X = nu * times + vol * W[None]  # log(S_t / S), contracts x paths x steps
+            X_prev = np.concatenate([np.zeros(X.shape[:2] + (1,)), X[:, :, :-1]], axis=2)
+            p_high = self._touched(X, X_prev, b_high, var_dt)
+            p_ten = self._touched(X, X_prev, b_ten, var_dt)
+            hold = np.maximum(S * np.exp(X[:, :, -1]) - K[:, None], 0.0)
+            sums += [p_high.sum(axis=1), p_ten.sum(axis=1), (p_high * exit_value + (1.0 - p_high) * hold).sum(axis=1)]
+            used += m
+            batch += 1
+            if self.budget_secs is not None and used < self.n_paths and time.perf_counter() - started > self.budget_secs:
+                self.over_budget += 1
+                break
+        return sums, used
+
+    @staticmethod
+    def _touched(X, X_prev, barrier, var_dt):
+        """Per path, P(the barrier was touched): steps ending at or past it, else the Brownian bridge between steps"""
+        with np.errstate(over='ignore', under='ignore'):
+            cross = np.exp(-2.0 * np.maximum(barrier - X_prev, 0.0) * np.maximum(barrier - X, 0.0) / var_dt)
+        cross = np.where((X >= barrier) | (X_prev >= barrier), 1.0, cross)
+        return 1.0 - np.prod(1.0 - cross, axis=2)
@@ -0,0 +1,199 @@
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import ib_insync as ib
+import numpy as np
+import pandas as pd
+
+from atr_state import wilder_atr_batch
+from ticker_wait import describe_wait, stock_price_ready
+
+
+class StageTimer:
+    """Wall time and item counts per pipeline stage, in the order the stages ran (also fed to metrics if given)."""
+
+    def __init__(self, metrics=None):
+        self.stages = OrderedDict()
+        self.metrics = metrics
+
+    @contextmanager
+    def stage(self, name, items=None):
+        start = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - start
+            secs, n = self.stages.get(name, (0.0, 0))
+            self.stages[name] = (secs + elapsed, n + (items or 0))
+            if self.metrics is not None:
+                self.metrics.observe('stage_seconds', elapsed, stage=name)
+
+    def report(self):
+        total = sum(secs for secs, _ in self.stages.values()) or 1.0
+        lines = ["⏱️  Stage timing:"]
+        for name, (secs, n) in self.stages.items():
+            per = f" | {secs / n * 1000:.1f} ms/item" if n else ""
+            lines.append(f"   {name:<18} {secs:8.2f}s ({secs / total * 100:4.1f}%) | {n} items{per}")
+        return "\n".join(lines)
+
+
+# ---------- Columnar bar blocks ----------
+def bar_block(bars_by_symbol):
+    """
+    Stack per-symbol bar lists into right-aligned (symbols x bars) float arrays.
+    Shorter histories are NaN-padded on the left; 'length' holds each symbol's bar count.
+    """
+    symbols = list(bars_by_symbol)
+    lengths = np.array([len(bars_by_symbol[s] or []) for s in symbols], dtype=int)
+    width = int(lengths.max()) if len(lengths) else 0
+    block = {k: np.full((len(symbols), width), np.nan) for k in ('open', 'high', 'low', 'close')}
+    for i, s in enumerate(symbols):
+        bars = bars_by_symbol[s] or []
+        if not bars:
+            continue
+        for k in block:
+            block[k][i, width - len(bars):] = [getattr(b, k) for b in bars]
+    block['length'] = lengths
+    block['symbols'] = symbols
+    return block
+
+
+def block_atr(block, period):
+    """Last-bar Wilder ATR for every row; rows are batched by history length so no NaN enters the recursion."""
+    atr = np.full(len(block['length']), np.nan)
+    for n in np.unique(block['length']):
+        rows = block['length'] == n
+        if n < period + 1:
+            continue
+        atr[rows] = wilder_atr_batch(block['high'][rows, -n:], block['low'][rows, -n:], block['close'][rows, -n:], period)
+    return atr
+
+
+# ---------- Vectorized gates ----------
+def daily_gates(scanner, prices, block):
+    """
+    Daily ATR filters and pullback/recovery structure for the whole universe at once.
+    Same rules as passes_daily_atr_filters + is_pullback_recovery_candidate.
+    """
+    price = np.asarray(prices, dtype=float)
+    enough = block['length'] >= 15
+    atr = np.where(enough, block_atr(block, 14), np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        atr_pct = atr / price * 100.0
+        if block['high'].shape[1]:
+            # fmax/fmin skip the NaN padding without all-NaN warnings
+            high_5d = np.where(enough, np.fmax.reduce(block['high'][:, -5:], axis=1), np.nan)
+            low_5d = np.where(enough, np.fmin.reduce(block['low'][:, -5:], axis=1), np.nan)
+        else:
+            high_5d = low_5d = np.full(len(price), np.nan)
+        pullback = (high_5d - price) / high_5d * 100.0
+        recovery = (price - low_5d) / low_5d * 100.0
+
+    atr_ok = np.isfinite(atr) & (price > 0)
+    if scanner.min_atr_pct is not None:
+        atr_ok &= np.nan_to_num(atr_pct) >= scanner.min_atr_pct
+    if scanner.min_abs_atr is not None:
+        atr_ok &= atr >= scanner.min_abs_atr
+    atr_ok &= ~((price < scanner.low_price_threshold) & (atr < scanner.min_abs_atr_low_price))
+
+    structure_ok = (pullback >= 3) & (pullback <= 15) & (recovery >= 1)
+    return pd.DataFrame({
+        'price': price,
+        'bars': block['length'],
+        'high_5d': high_5d,
+        'low_5d': low_5d,
+        'atr': atr,
+        'atr_pct': atr_pct,
+        'pullback_pct': pullback,
+        'recovery_pct': recovery,
+        'pass_daily_atr': atr_ok,
+        'pass_structure': structure_ok,
+    }, index=pd.Index(block['symbols'], name='symbol'))
+
+
+def intraday_gate(scanner, prices, block):
+    """Intraday ATR gate for a block of intraday bars; too little history skips the gate like the scalar path."""
+    price = np.asarray(prices, dtype=float)
+    iatr = block_atr(block, scanner.intraday_period)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        iatr_pct = iatr / price * 100.0
+    skipped = block['length'] < scanner.intraday_period + 1
+    ok = skipped | (np.nan_to_num(iatr_pct) >= scanner.intraday_min_atr_pct)
+    return pd.DataFrame({
+        'iatr': np.where(skipped, np.nan, iatr),
+        'iatr_pct': np.where(skipped, np.nan, iatr_pct),
+        'pass_intraday_atr': ok,
+    }, index=pd.Index(block['symbols'], name='symbol'))
+
+
+# ---------- Universe loading ----------
+def load_prices(scanner, contracts):
+    """Underlying prices for many contracts, quoted in waves through the market data line pool."""
+    tickers, wait = scanner._stream_market_data(contracts, stock_price_ready, scanner.quote_timeout, 'underlying')
+    if wait.missing:
+        print(describe_wait(wait, 'underlyings'))
+    prices = {}
+    for c, t in zip(contracts, tickers):
+        price = t.marketPrice() or t.last
+        prices[c.symbol] = price if price and price == price and price > 0 else np.nan
+    return prices
+
+
+def run_prescreen(scanner, symbols, timer=None):
+    """
+    Pre-screen stage: qualify, price and load daily bars for the whole universe, apply
+    the daily ATR and structure gates in one vectorized pass, then load intraday bars
+    only for those survivors and apply the intraday ATR gate the same way.
+
+    Returns a DataFrame indexed by symbol with every gate input and a 'passed' column;
+    'contract' holds the qualified Stock for the option stage.
+    """
+    timer = timer or StageTimer()
+    with timer.stage('qualify', len(symbols)):
+        contracts = scanner._qualify(*[ib.Stock(s, 'SMART', 'USD') for s in symbols])
+        by_symbol = {c.symbol: c for c in contracts}
+        contracts = [by_symbol[s] for s in symbols if s in by_symbol]
+
+    with timer.stage('quotes', len(contracts)):
+        prices = load_prices(scanner, contracts)
+
+    priced = [c for c in contracts if np.isfinite(prices.get(c.symbol, np.nan))]
+    with timer.stage('daily bars', len(priced)):
+        daily = {}
+        for c in priced:
+            try:
+                daily[c.symbol] = list(scanner._fetch_daily_bars(c, days='60 D'))
+            except Exception as e:
+                print(f"❌ {c.symbol} data error: {e}")
+                daily[c.symbol] = []
+
+    with timer.stage('daily screen', len(daily)):
+        screen = daily_gates(scanner, [prices[s] for s in daily], bar_block(daily))
+        screen['contract'] = [by_symbol[s] for s in screen.index]
+        survivors = screen.index[screen['pass_daily_atr'] & screen['pass_structure']]
+
+    screen['iatr'] = np.nan
+    screen['iatr_pct'] = np.nan
+    screen['pass_intraday_atr'] = True
+    if scanner.use_intraday_atr and len(survivors):
+        with timer.stage('intraday bars', len(survivors)):
+            intraday = {}
+            for s in survivors:
+                try:
+                    intraday[s] = list(scanner._intraday_bars(by_symbol[s]))
+                except Exception as e:
+                    print(f"⚠️ {s}: intraday ATR gate skipped (error: {e})")
+                    intraday[s] = []
+        with timer.stage('intraday screen', len(intraday)):
+            gate = intraday_gate(scanner, screen.loc[list(intraday), 'price'], bar_block(intraday))
+            screen.loc[gate.index, ['iatr', 'iatr_pct', 'pass_intraday_atr']] = gate
+
+    screen['passed'] = screen['pass_daily_atr'] & screen['pass_structure'] & screen['pass_intraday_atr'].astype(bool)
+    missing = [s for s in symbols if s not in screen.index]
+    if missing:
+        print(f"⚠️ No price/contract for {len(missing)} symbols: {', '.join(missing[:10])}")
+    print(f"🧹 Pre-screen: {int(screen['passed'].sum())}/{len(symbols)} symbols pass "
+          f"(daily ATR {int(screen['pass_daily_atr'].sum())}, structure {int(screen['pass_structure'].sum())}, "
+          f"intraday {int((screen['pass_intraday_atr'].astype(bool) & screen['pass_daily_atr'] & screen['pass_structure']).sum())})")
+    return screen
@@ -0,0 +1,134 @@
+import time
+from datetime import date, datetime, timezone
+
+from bar_cache import BAR_SIZE_SECONDS, CachedBar
+
+
+def _epoch(d):
+    """Bar date -> UTC epoch seconds (naive datetimes are local time, as in the bar cache)"""
+    if isinstance(d, datetime):
+        return d.timestamp()
+    if isinstance(d, date):
+        return datetime(d.year, d.month, d.day, tzinfo=timezone.utc).timestamp()
+    return float(d)
+
+
+class IntradayBarAggregator:
+    """
+    Intraday OHLC bars of any size built locally from reqRealTimeBars 5-second streams
+    (or trade ticks fed through add_trade), so the intraday ATR gate stops spending a
+    historical request per symbol per scan.
+
+    Each contract is seeded once with historical bars (the gate's usual '2 D' fetch,
+    served through the bar cache); its stream is subscribed just before that fetch, so
+    stream and history overlap. bars() then returns the seed up to its last (still
+    forming when fetched) bar, that bar merged with what the stream saw in the same
+    interval, and every later interval from the stream alone. Intervals start at UTC
+    multiples of the bar size, which is how IB stamps RTH bars of up to 30 minutes.
+    A stream that started after the seed was fetched (e.g. re-subscribed after a reconnect)
+    has a gap: bars() returns None and the caller re-seeds with a fresh historical fetch.
+
+    Every stream holds a market data line and counts once against the historical
+    pacing limit when subscribed (IB applies both to real-time bars); the scanner
+    acquires those before subscribe() and gets the lines back from reset()/close().
+    """
+
+    def __init__(self, ib_client, bar_size='30 mins', max_streams=50, what_to_show='TRADES', use_rth=True, max_bars=200):
+        if bar_size not in BAR_SIZE_SECONDS:
+            raise ValueError(f"Unknown bar size {bar_size!r}; use one of {list(BAR_SIZE_SECONDS)}")
+        self.ib = ib_client
+        self.bar_size = bar_size
+        self.bar_secs = BAR_SIZE_SECONDS[bar_size]
+        self.max_streams = int(max_streams)
+        self.what_to_show = what_to_show
+        self.use_rth = use_rth
+        self.max_bars = int(max_bars)
+        self.streams = {}   # conId -> RealTimeBarList
+        self.started = {}   # conId -> epoch of the first streamed update
+        self.buckets = {}   # conId -> {interval start: [open, high, low, close, volume]}
+        self.seeds = {}     # conId -> (historical bars, epoch they were fetched at)
+        self.folded = 0
+        self.served = 0
+        self.gaps = 0
+
+    # ---------- Subscriptions ----------
+    def wants(self, con_id):
+        """True when con_id has no stream yet and there is room for one"""
+        return con_id not in self.streams and len(self.streams) < self.max_streams
+
+    def subscribe(self, contract):
+        bars = self.ib.reqRealTimeBars(contract, 5, self.what_to_show, self.use_rth)
+        bars.updateEvent += self._on_bars(contract.conId)
+        self.streams[contract.conId] = bars
+
+    def _on_bars(self, con_id):
+        def handler(bars, has_new_bar):
+            if has_new_bar and bars:
+                b = bars[-1]
+                self._fold(con_id, _epoch(b.time), b.open_, b.high, b.low, b.close, b.volume)
+        return handler
+
+    def reset(self):
+        """Cancel every stream (e.g. after a reconnect, when TWS dropped them); returns the lines freed"""
+        n = len(self.streams)
+        for bars in self.streams.values():
+            try:
+                self.ib.cancelRealTimeBars(bars)
+            except Exception:
+                pass  # the connection they lived on may be gone
+        self.streams.clear()
+        self.started.clear()
+        self.buckets.clear()
+        return n
+
+    close = reset
+
+    # ---------- Folding ----------
+    def _fold(self, con_id, ts, open_, high, low, close, volume=0.0):
+        start = int(ts // self.bar_secs * self.bar_secs)
+        buckets = self.buckets.setdefault(con_id, {})
+        self.started.setdefault(con_id, ts)
+        bar = buckets.get(start)
+        if bar is None:
+            buckets[start] = [open_, high, low, close, max(volume, 0.0)]
+            if len(buckets) > self.max_bars:
+                del buckets[min(buckets)]
+        else:
+            bar[1] = max(bar[1], high)
+            bar[2] = min(bar[2], low)
+            bar[3] = close
+            bar[4] += max(volume, 0.0)
+        self.folded += 1
+
+    def add_trade(self, con_id, time, price, size=0.0):
+        """Fold one trade tick (e.g. from a streaming ticker) into con_id's bars"""
+        self._fold(con_id, _epoch(time), price, price, price, price, size)
+
+    def seed(self, con_id, bars, fetched_at=None):
+        """Historical bars for con_id, fetched after its stream was subscribed"""
+        self.seeds[con_id] = (list(bars)[-self.max_bars:], fetched_at or time.time())
+
+    # ---------- Reading ----------
+    def bars(self, con_id):
+        """Seed + streamed bars, oldest first; None while the contract can't be served without a historical request"""
+        seed, fetched_at = self.seeds.get(con_id, (None, None))
+        buckets = self.buckets.get(con_id)
+        if not seed or not buckets:
+            return None
+        if self.started[con_id] > fetched_at:
+            self.gaps += 1
+            return None
+        last_seeded = int(_epoch(seed[-1].date))
+        out = list(seed)
+        overlap = buckets.get(last_seeded)
+        if overlap is not None:
+            s = seed[-1]
+            out[-1] = CachedBar(s.date, s.open, max(s.high, overlap[1]), min(s.low, overlap[2]), overlap[3], max(s.volume, overlap[4]))
+        for start in sorted(b for b in buckets if b > last_seeded):
+            out.append(CachedBar(datetime.fromtimestamp(start, timezone.utc), *buckets[start]))
+        self.served += 1
+        return out[-len(seed):]  # the same span the seeding request covered
+
+    def summary(self):
+        return (f"{len(self.streams)} streams | {self.folded} updates folded | "
+                f"{self.served} gates served locally | {self.gaps} re-seeded after gaps")
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import pickle
+import sqlite3
+import time
+
+
+class ScanCheckpoint:
+    """
+    Progress of one scan persisted to SQLite, so a scan cut short by a TWS disconnect or a
+    crash resumes at the next unscanned symbol instead of starting over.
+
+    A run is identified by scanner, stage ('scan' for a full per-symbol scan, 'options' for
+    the option stage of a staged scan) and the set of symbols, so a rescheduled order still
+    resumes. Every finished symbol is written as it completes: its result (the ranked option
+    frame, pickled, or None), the historical requests spent so far and the pacer's 10-minute
+    request window, so a restarted process neither repeats those requests nor bursts past
+    the budget TWS is still counting.
+    Opening the same run within max_age_secs restores all of it; a finished run is deleted.
+    """
+
+    def __init__(self, path, scanner, stage, symbols, max_age_secs=2 * 3600):
+        self.path = path
+        self.max_age_secs = float(max_age_secs)
+        key = '\n'.join([scanner, stage] + sorted(symbols))
+        self.run_id = hashlib.sha1(key.encode()).hexdigest()[:16]
+        self.label = f"{scanner}/{stage}"
+        self.done = {}  # symbol -> result
+        self.hist_requests = 0
+        self.hist_times = []
+        self.conn = sqlite3.connect(path, timeout=30.0)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS scan_runs (
+                run_id TEXT PRIMARY KEY,
+                scanner TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                symbols INTEGER NOT NULL,
+                started_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                hist_requests INTEGER NOT NULL,
+                hist_times TEXT NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS scan_results (
+                run_id TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                result BLOB,
+                done_at REAL NOT NULL,
+                PRIMARY KEY (run_id, symbol)
+            )
+        """)
+        self._expire()
+        self._load(scanner, stage, len(symbols))
+
+    def _expire(self):
+        cutoff = time.time() - self.max_age_secs
+        stale = [r for (r,) in self.conn.execute("SELECT run_id FROM scan_runs WHERE updated_at < ?", (cutoff,))]
+        for run_id in stale:
+            self._delete(run_id)
+        self.conn.commit()
+
+    def _delete(self, run_id):
+        self.conn.execute("DELETE FROM scan_results WHERE run_id=?", (run_id,))
+        self.conn.execute("DELETE FROM scan_runs WHERE run_id=?", (run_id,))
+
+    def _load(self, scanner, stage, n_symbols):
+        row = self.conn.execute(
+            "SELECT hist_requests, hist_times FROM scan_runs WHERE run_id=?", (self.run_id,)
+        ).fetchone()
+        if row is None:
+            now = time.time()
+            self.conn.execute(
+                "INSERT INTO scan_runs (run_id, scanner, stage, symbols, started_at, updated_at, hist_requests, hist_times) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0, '[]')", (self.run_id, scanner, stage, n_symbols, now, now)
+            )
+            self.conn.commit()
+            return
+        self.hist_requests, self.hist_times = row[0], json.loads(row[1])
+        for symbol, blob in self.conn.execute(
+            "SELECT symbol, result FROM scan_results WHERE run_id=? ORDER BY position", (self.run_id,)
+        ):
+            self.done[symbol] = pickle.loads(blob) if blob is not None else None
+
+    @property
+    def resumed(self):
+        return bool(self.done)
+
+    def record(self, symbol, position, result, hist_requests=0, hist_times=()):
+        """Persist one finished symbol together with the request budget spent so far"""
+        blob = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL) if result is not None else None
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO scan_results (run_id, symbol, position, result, done_at) VALUES (?, ?, ?, ?, ?)",
+            (self.run_id, symbol, int(position), blob, now)
+        )
+        self.conn.execute(
+            "UPDATE scan_runs SET updated_at=?, hist_requests=?, hist_times=? WHERE run_id=?",
+            (now, int(hist_requests), json.dumps(list(hist_times)), self.run_id)
+        )
+        self.conn.commit()
+        self.done[symbol] = result
+
+    def finish(self):
+        """The run completed: drop it so the next scan of the same list starts fresh"""
+        self._delete(self.run_id)
+        self.conn.commit()
+
+    def summary(self):
+        return f"{self.label}: {len(self.done)} symbols done | {self.hist_requests} historical requests spent"
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,355 @@
+import json
+import time
+from collections import namedtuple
+from datetime import date, datetime
+
+import ib_insync as ib
+
+from bar_cache import CachedBar
+from cheap_calls_scanner import CheapOptionsScanner
+
+# kind is 'added' or 'dropped'; rows is the DataFrame of affected contracts
+Delta = namedtuple('Delta', ['kind', 'symbol', 'rows', 'reason', 'timestamp'])
+
+GateState = namedtuple('GateState', [
+    'passed', 'reason', 'price', 'high_5d', 'low_5d', 'atr', 'atr_pct', 'iatr', 'iatr_pct',
+])
+
+
+class FetchFailed(Exception):
+    """Option data for a symbol couldn't be fetched; its candidates are kept as they were."""
+
+
+DELTA_COLUMNS = ['symbol', 'strike', 'expiration', 'mid_price', 'prob_itm', 'risk_reward', 'tier', 'score']
+
+
+class _SymbolState:
+    __slots__ = ('symbol', 'contract', 'ticker', 'daily', 'daily_fetched_at', 'intraday',
+                 'dirty', 'last_price', 'gate', 'candidates', 'options_at')
+
+    def __init__(self, symbol, contract):
+        self.symbol = symbol
+        self.contract = contract
+        self.ticker = None
+        self.daily = []
+        self.daily_fetched_at = 0.0
+        self.intraday = None          # live BarDataList (keepUpToDate) when the intraday gate is on
+        self.dirty = True
+        self.last_price = None
+        self.gate = None
+        self.candidates = None        # DataFrame of qualifying contracts while the symbol passes
+        self.options_at = 0.0
+
+
+class ScannerDaemon:
+    """
+    Long-running version of CheapOptionsScanner.scan_watchlist.
+
+    Connects and qualifies once, keeps a streaming quote on every underlying and a
+    keepUpToDate intraday bar subscription for the intraday ATR gate, and re-evaluates
+    the daily ATR / intraday ATR / pullback gates only for symbols whose data moved.
+    Option chains are pulled only for symbols that newly pass (and refreshed every
+    option_refresh_secs while they keep passing). Output is a stream of deltas:
+    contracts that became candidates and contracts that stopped being candidates.
+    """
+
+    def __init__(
+        self,
+        scanner,
+        eval_interval_secs=5.0,       # how often changed symbols are re-evaluated
+        option_refresh_secs=300.0,    # re-price chains of symbols that keep passing
+        daily_refresh_secs=1800.0,    # min gap between daily bar top-ups while today's bar is missing
+        option_line_reserve=30,       # market data lines kept free for option chains
+        min_score=0.3,                # same cut as the consolidated batch output
+        deltas_path='scanner_deltas.jsonl',  # append every delta as JSON (None to disable)
+        notify_slack=False,           # post newly added candidates to Slack
+        on_delta=None,                # extra callback(Delta)
+    ):
+        self.scanner = scanner
+        self.ib = scanner.ib
+        self.eval_interval_secs = float(eval_interval_secs)
+        self.option_refresh_secs = float(option_refresh_secs)
+        self.daily_refresh_secs = float(daily_refresh_secs)
+        self.option_line_reserve = int(option_line_reserve)
+        self.min_score = float(min_score)
+        self.deltas_path = deltas_path
+        self.notify_slack = notify_slack
+        self.on_delta = on_delta
+
+        self.states = {}
+        self.running = False
+        self.evaluations = 0
+        self.option_fetches = 0
+        self.deltas_emitted = 0
+
+    # ---------- Subscriptions ----------
+    def start(self, symbols):
+        sc = self.scanner
+        max_streams = max(0, sc.pacer.max_market_data_lines - self.option_line_reserve)
+        lines_per_symbol = 2 if sc.use_intraday_atr else 1  # quote + keepUpToDate bars
+        if len(symbols) * lines_per_symbol > max_streams:
+            print(f"⚠️ Only {max_streams // lines_per_symbol} of {len(symbols)} symbols can be streamed "
+                  f"({sc.pacer.max_market_data_lines} lines, {self.option_line_reserve} reserved for options)")
+            symbols = symbols[:max_streams // lines_per_symbol]
+
+        contracts = [ib.Stock(s, 'SMART', 'USD') for s in symbols]
+        qualified = {c.symbol: c for c in sc._qualify(*contracts)}
+        for symbol in symbols:
+            contract = qualified.get(symbol)
+            if contract is None:
+                print(f"❌ {symbol}: could not qualify")
+                continue
+            st = _SymbolState(symbol, contract)
+            st.ticker = sc._req_mkt_data([contract])[0]
+            self._refresh_daily(st)
+            if sc.use_intraday_atr:
+                st.intraday = self._subscribe_intraday(contract)
+                st.intraday.updateEvent += self._on_bar_update(st)
+            self.states[symbol] = st
+        print(f"📡 Streaming {len(self.states)} underlyings")
+
+    def _subscribe_intraday(self, contract):
+        """keepUpToDate intraday bars, holding one market data line until stop()"""
+        sc = self.scanner
+        sc.pacer.acquire_lines(1, sleep=self.ib.sleep)
+        try:
+            sc._check_hist_rate_limit(contract, '2 D', sc.intraday_bar)
+            return self.ib.reqHistoricalData(
+                contract, endDateTime='', durationStr='2 D', barSizeSetting=sc.intraday_bar,
+                whatToShow='TRADES', useRTH=True, formatDate=2, keepUpToDate=True
+            )
+        except Exception:
+            sc.pacer.release_lines(1)
+            raise
+
+    def _on_bar_update(self, st):
+        def handler(bars, has_new_bar):
+            if has_new_bar:
+                st.dirty = True
+        return handler
+
+    def _refresh_daily(self, st):
+        # Through the bar cache when configured: only the missing tail is requested
+        st.daily = list(self.scanner._fetch_daily_bars(st.contract, days='60 D'))
+        st.daily_fetched_at = time.time()
+        st.dirty = True
+
+    def _daily_stale(self, st, now):
+        """
+        Today's bar is stretched to the live quote (see _with_live_session), so daily bars
+        are re-read only while it's missing: before the session's first bar and after a
+        day rollover (which also settles yesterday's close). At most every daily_refresh_secs.
+        """
+        if now - st.daily_fetched_at <= self.daily_refresh_secs:
+            return False
+        if not st.daily:
+            return True
+        last = st.daily[-1].date
+        return (last.date() if isinstance(last, datetime) else last) != date.today()
+
+    def stop(self):
+        self.running = False
+        for st in self.states.values():
+            try:
+                self.scanner._cancel_mkt_data(st.contract)
+            except Exception:
+                pass
+            if st.intraday is not None:
+                try:
+                    self.ib.cancelHistoricalData(st.intraday)
+                except Exception:
+                    pass
+                finally:
+                    self.scanner.pacer.release_lines(1)
+                st.intraday = None
+        print(f"🛑 Daemon stopped | evaluations {self.evaluations} | option fetches {self.option_fetches} | "
+              f"deltas {self.deltas_emitted}")
+
+    # ---------- Gate evaluation ----------
+    @staticmethod
+    def _live_price(t):
+        price = t.marketPrice()
+        if price and price == price and price > 0:
+            return price
+        return t.last if t.last and t.last == t.last and t.last > 0 else None
+
+    @staticmethod
+    def _with_live_session(daily, t, price):
+        """Daily bars with today's bar stretched to the live price (and the ticker's day high/low)."""
+        last = daily[-1]
+        last_day = last.date.date() if isinstance(last.date, datetime) else last.date
+        if last_day != date.today():
+            return daily
+        highs = [last.high, price] + [v for v in (t.high,) if v and v == v]
+        lows = [last.low, price] + [v for v in (t.low,) if v and v == v and v > 0]
+        return daily[:-1] + [CachedBar(last.date, last.open, max(highs), min(lows), price, last.volume)]
+
+    def evaluate_gates(self, st):
+        """Quiet version of the scanner's daily ATR, intraday ATR and structure gates."""
+        sc = self.scanner
+        price = self._live_price(st.ticker)
+        if price is None or len(st.daily) < 15:
+            return GateState(False, "No data", price, None, None, None, None, None, None)
+
+        daily = self._with_live_session(st.daily, st.ticker, price)
+        high_5d = max(b.high for b in daily[-5:])
+        low_5d = min(b.low for b in daily[-5:])
+        atr = sc._atr(st.contract, daily, '1 day', 14)  # O(new bars): closed bars fold into the stored state
+        ok, reason, atr_pct = sc.passes_daily_atr_filters(atr, price)
+        if not ok:
+            return GateState(False, reason, price, high_5d, low_5d, atr, atr_pct, None, None)
+
+        iatr = iatr_pct = None
+        if st.intraday is not None:
+            ok, reason, iatr, iatr_pct = sc._evaluate_intraday_bars(st.intraday, price, st.contract)
+            if not ok:
+                return GateState(False, reason, price, high_5d, low_5d, atr, atr_pct, iatr, iatr_pct)
+
+        ok, reason = sc.is_pullback_recovery_candidate(price, high_5d, low_5d)
+        return GateState(ok, reason, price, high_5d, low_5d, atr, atr_pct, iatr, iatr_pct)
+
+    # ---------- Options ----------
+    def _fetch_candidates(self, st):
+        """
+        Qualifying contracts, or None when the chain was priced and nothing passes.
+        Raises FetchFailed when there was nothing to price (no chain targets, no two-sided quotes).
+        """
+        sc = self.scanner
+        g = st.gate
+        self.option_fetches += 1
+        st.options_at = time.time()
+        chains = sc._option_chains(st.symbol, st.contract)
+        exp, strikes = sc._option_targets(st.symbol, chains, g.price)
+        if not exp or not strikes:
+            raise FetchFailed("no option chain targets")
+        quotes = sc._fetch_option_quotes(st.symbol, exp, strikes)
+        if not ((quotes['bid'] > 0) & (quotes['ask'] > 0)).any():
+            raise FetchFailed("no two-sided option quotes")
+        df = sc._option_rows(st.symbol, quotes, g.price, g.high_5d, g.low_5d)
+        df = sc._finalize_options(df, g.atr, g.atr_pct, g.iatr, g.iatr_pct)
+        if df is None or df.empty:
+            return None
+        df = df[df['score'] > self.min_score]
+        return df if not df.empty else None
+
+    @staticmethod
+    def _keys(df):
+        if df is None:
+            return set()
+        return set(zip(df['expiration'], df['strike']))
+
+    def _diff(self, st, new, reason):
+        old = st.candidates
+        old_keys, new_keys = self._keys(old), self._keys(new)
+        added = new_keys - old_keys
+        dropped = old_keys - new_keys
+        if added:
+            rows = new[[k in added for k in zip(new['expiration'], new['strike'])]]
+            self._emit(Delta('added', st.symbol, rows, reason, datetime.now()))
+        if dropped:
+            rows = old[[k in dropped for k in zip(old['expiration'], old['strike'])]]
+            self._emit(Delta('dropped', st.symbol, rows, reason, datetime.now()))
+        st.candidates = new
+
+    # ---------- Deltas ----------
+    def _emit(self, delta):
+        self.deltas_emitted += 1
+        icon = "🟢" if delta.kind == 'added' else "🔴"
+        for _, r in delta.rows.iterrows():
+            print(f"{icon} {delta.kind.upper():7} {delta.symbol} ${r['strike']:.1f}C {r['expiration']} "
+                  f"@ ${r['mid_price']:.2f} | score {r['score']:.2f} | {delta.reason}")
+        if self.deltas_path:
+            with open(self.deltas_path, 'a') as f:
+                for rec in delta.rows[[c for c in DELTA_COLUMNS if c in delta.rows]].to_dict('records'):
+                    f.write(json.dumps({'ts': delta.timestamp.isoformat(), 'kind': delta.kind,
+                                        'reason': delta.reason, **rec}, default=str) + "\n")
+        if self.notify_slack and delta.kind == 'added':
+            self.scanner._send_to_slack("Cheap Calls Scanner (live)", {delta.symbol: delta.rows})
+        if self.on_delta is not None:
+            self.on_delta(delta)
+
+    # ---------- Main loop ----------
+    def evaluate(self):
+        """One pass over the symbols whose quotes or bars changed since the last pass."""
+        now = time.time()
+        for st in self.states.values():
+            if self._daily_stale(st, now):
+                self._refresh_daily(st)
+            price = self._live_price(st.ticker)
+            if price != st.last_price:
+                st.dirty = True
+            was_passing = st.gate is not None and st.gate.passed
+            refresh_options = was_passing and now - st.options_at > self.option_refresh_secs
+            if not st.dirty and not refresh_options:
+                continue
+
+            st.dirty = False
+            st.last_price = price
+            st.gate = self.evaluate_gates(st)
+            self.evaluations += 1
+
+            try:
+                if st.gate.passed and (not was_passing or refresh_options):
+                    print(f"\n✅ {st.symbol} passes gates ({st.gate.reason}); pricing options")
+                    self._diff(st, self._fetch_candidates(st), st.gate.reason)
+                elif not st.gate.passed and was_passing:
+                    self._diff(st, None, st.gate.reason)
+            except FetchFailed as e:
+                print(f"⚠️ {st.symbol}: {e}; keeping its {len(self._keys(st.candidates))} candidates")
+            except Exception as e:
+                print(f"❌ {st.symbol} error: {e}")
+
+    def run(self, symbols, duration_secs=None):
+        """Stream until duration_secs elapses (forever if None) or stop() is called."""
+        self.start(symbols)
+        self.running = True
+        started = time.time()
+        try:
+            while self.running:
+                self.evaluate()
+                if duration_secs is not None and time.time() - started >= duration_secs:
+                    break
+                self.ib.sleep(self.eval_interval_secs)  # network updates are processed while sleeping
+        except KeyboardInterrupt:
+            print("\n⌨️ Interrupted")
+        finally:
+            self.stop()
+
+    def candidates(self):
+        """Current candidate contracts per symbol."""
+        return {s: st.candidates for s, st in self.states.items() if st.candidates is not None}
+
+
+def main():
+    scanner = None
+    try:
+        scanner = CheapOptionsScanner(
+            port=7496,
+            client_id=6,
+            respect_rate_limits=True,
+            delay_between_symbols=0,
+        )
+        try:
+            with open('watchlist.txt', 'r') as f:
+                watchlist = [
+                    line.strip().upper()
+                    for line in f
+                    if line.strip() and not line.strip().startswith('#')
+                ]
+            print(f"📋 Loaded {len(watchlist)} symbols from watchlist.txt")
+        except FileNotFoundError:
+            print("⚠️ watchlist.txt not found, using default symbols")
+            watchlist = ['SPY', 'QQQ', 'AAPL', 'NVDA', 'TSLA', 'AMD', 'META', 'MSFT']
+
+        daemon = ScannerDaemon(scanner, eval_interval_secs=5.0, option_refresh_secs=300.0)
+        scanner.metrics.serve_prometheus(port=9464)
+        daemon.run(watchlist)
+    except Exception as e:
+        print(f"❌ Error: {e}")
+    finally:
+        if scanner:
+            scanner.disconnect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import ib_insync as ib
+
+from cheap_calls_scanner import CheapOptionsScanner
+from high_probability_calls_scanner import PullbackRecoveryScannerV2
+from prescreen import StageTimer, run_prescreen
+from scanner_base import ScannerBase
+from ticker_wait import READY
+
+# Quote fields (see ScannerBase._collect_option_quotes) that only arrive with a generic tick,
+# and what a strategy quoting alone sees without it (model greeks come without any)
+GENERIC_TICK_FIELDS = {'101': {'open_interest': 0.0}}
+
+
+class ScanEngine(ScannerBase):
+    """
+    Several option strategies in one pass over one TWS connection.
+
+    Every symbol is qualified, priced, barred and gated once (the engine's gate settings
+    apply; the strategies' own gate settings are ignored). Each survivor gets one chain
+    request and one batch of option quotes covering the union of the contracts the
+    strategies want; every strategy then builds, filters and scores its own slice of
+    that batch and writes its own CSV/Slack report. Running the cheap and the
+    high-probability scanners this way costs one set of stock/bar/chain requests
+    instead of two, and the overlapping option contracts are quoted once.
+
+    A strategy is any ScannerBase subclass (see the hooks listed there); pass instances
+    built with auto_connect=False, they are attached to the engine's connection, pacer,
+    caches, snapshot store and metrics.
+    """
+
+    name = 'engine'
+
+    def __init__(self, strategies=None, client_id=85, **kwargs):
+        super().__init__(client_id=client_id, **kwargs)
+        if strategies is None:
+            strategies = self._default_strategies()
+        self.strategies = list(strategies)
+        for strategy in self.strategies:
+            strategy.attach(self)
+        self.labels = self._strategy_labels()
+
+    def _default_strategies(self):
+        shared = dict(
+            auto_connect=False, ib_client=self.ib, pacer=self.pacer, metrics=self.metrics,
+            bar_cache_path=None, chain_cache_path=None, snapshot_path=None, write_csv=self.write_csv,
+            risk_free_rate=self.risk_free_rate,
+            score_normalization=self.score_normalization, universe_top_n=self.universe_top_n,
+        )
+        return [CheapOptionsScanner(**shared), PullbackRecoveryScannerV2(**shared)]
+
+    def _strategy_labels(self):
+        labels = []
+        for strategy in self.strategies:
+            label = strategy.name
+            n = 2
+            while label in labels:
+                label = f"{strategy.name}_{n}"
+                n += 1
+            labels.append(label)
+        return labels
+
+    # ---------- Shared option data ----------
+    def _option_data_request(self):
+        """Union of the strategies' generic ticks; wait for greeks/volume if any strategy wants them"""
+        needs = {predicate: key for key, predicate in READY.items()}
+        ticks, greeks, volume = set(), False, False
+        for strategy in self.strategies:
+            generic, predicate = strategy._option_data_request()
+            ticks.update(t for t in generic.split(',') if t)
+            wants_greeks, wants_volume = needs[predicate]
+            greeks, volume = greeks or wants_greeks, volume or wants_volume
+        return ','.join(sorted(ticks, key=int)), READY[greeks, volume]
+
+    # The option hooks belong to the strategies (see _options_for_survivor); the engine has none of its own
+    def _option_targets(self, symbol, chains, price):
+        raise TypeError("ScanEngine quotes its strategies' option targets; call them on a strategy")
+
+    _option_rows = _finalize_options = _score_contracts = _option_targets
+
+    def _union_contracts(self, symbol, targets):
+        """Calls covering every strategy's (expirations, strikes), nearest expirations first (quoted in waves through the line pool)"""
+        wanted = {}
+        for exp, strikes in targets:
+            if not exp or not strikes:
+                continue
+            for e in ([exp] if isinstance(exp, str) else exp):
+                wanted.setdefault(e, set()).update(strikes)
+        return [ib.Option(symbol, e, k, 'C', 'SMART') for e in sorted(wanted) for k in sorted(wanted[e])]
+
+    def _score_slices(self, symbol, row, targets, quotes):
+        """Each strategy's rows, filters and scores over its own slice of the shared quotes"""
+        results = []
+        for strategy, (exp, strikes) in zip(self.strategies, targets):
+            if not exp or not strikes:
+                results.append(None)
+                continue
+            expirations = [exp] if isinstance(exp, str) else list(exp)
+            mine = quotes[quotes['expiration'].isin(expirations) & quotes['strike'].isin(strikes)].reset_index(drop=True)
+            mine = self._strategy_fields(strategy, mine)
+            try:
+                df = strategy._option_rows(symbol, mine, row['price'], row['high_5d'], row['low_5d'])
+                results.append(strategy._finalize_options(df, row['atr'], row['atr_pct'], row['iatr'], row['iatr_pct']))
+            except Exception as e:
+                print(f"❌ {symbol} {strategy.name} error: {e}")
+                results.append(None)
+        return results
+
+    @staticmethod
+    def _strategy_fields(strategy, quotes):
+        """Blank the fields of generic ticks the strategy didn't ask for, so it scores as it would alone"""
+        generic = set(strategy._option_data_request()[0].split(','))
+        for tick, fields in GENERIC_TICK_FIELDS.items():
+            if tick not in generic:
+                quotes = quotes.assign(**fields)
+        return quotes
+
+    def _options_for_survivor(self, symbol, row):
+        """One chain request and one quote batch for a symbol, fanned out to every strategy"""
+        try:
+            print(f"\n🧭 {symbol} passed pre-screen ({row['pullback_pct']:.1f}% pullback, ATR {row['atr_pct']:.2f}%)")
+            chains = self._option_chains(symbol, row['contract'])
+            targets = [strategy._option_targets(symbol, chains, row['price']) for strategy in self.strategies]
+            contracts = self._union_contracts(symbol, targets)
+            if not contracts:
+                return [None] * len(self.strategies)
+            quotes = self._request_option_quotes(contracts, *self._option_data_request())
+            return self._score_slices(symbol, row, targets, quotes)
+        except Exception as e:
+            print(f"❌ {symbol} error: {e}")
+            return [None] * len(self.strategies)
+
+    async def _options_for_survivor_async(self, symbol, row):
+        try:
+            chains = await self._option_chains_async(symbol, row['contract'])
+            targets = [strategy._option_targets(symbol, chains, row['price']) for strategy in self.strategies]
+            contracts = self._union_contracts(symbol, targets)
+            if not contracts:
+                return [None] * len(self.strategies)
+            quotes = await self._request_option_quotes_async(symbol, contracts, *self._option_data_request())
+            return self._score_slices(symbol, row, targets, quotes)
+        except Exception as e:
+            print(f"❌ {symbol} error: {e}")
+            return [None] * len(self.strategies)
+
+    # ---------- Scans ----------
+    def _print_scan_header(self, symbols):
+        print("\n🧭 COMBINED OPTIONS SCAN")
+        print("=" * 70)
+        print(f"🧩 Strategies: {', '.join(self.labels)}")
+        print(f"🔊 Volatility: ATR ≥ {self.min_atr_pct}% | Intraday ≥ {self.intraday_min_atr_pct}%")
+        print("📉 Setup: Pullback 3-15% | Recovery ≥ 1%")
+        print(f"📋 {len(symbols)} symbols, gated once for every strategy")
+        print("=" * 70)
+
+    def scan_shard(self, symbols, max_in_flight=1, timer=None):
+        """
+        Pre-screen and option stage without writing any report.
+        Returns {label: found}.
+        """
+        self._print_scan_header(symbols)
+        timer = timer or StageTimer(self.metrics)
+        symbols = self._schedule(symbols)
+        screen = self._until_connected(lambda: run_prescreen(self, symbols, timer), 'Pre-screen')
+        survivors = screen[screen['passed']]
+
+        found = {label: {} for label in self.labels}
+        with timer.stage('options', len(survivors)):
+            results = self._survivor_options(survivors, max_in_flight)
+        for symbol, per_strategy in zip(survivors.index, results):
+            for strategy, label, df in zip(self.strategies, self.labels, per_strategy):
+                strategy._collect_result(symbol, df, found[label])
+        self._learn_schedule({symbol for per_label in found.values() for symbol in per_label}, screen)
+        return found
+
+    def scan_watchlist_staged(self, symbols, max_in_flight=1, timer=None):
+        """
+        Staged scan for every strategy at once (see prescreen.py for the pre-screen);
+        each strategy writes its own report. Returns {label: found}.
+        """
+        timer = timer or StageTimer(self.metrics)
+        found = self.scan_shard(symbols, max_in_flight, timer)
+        with timer.stage('report'):
+            found = self._report_results(found)
+        print(timer.report())
+        return found
+
+    def _report_results(self, found):
+        reports = {}
+        for strategy, label in zip(self.strategies, self.labels):
+            strategy.hist_request_count = self.hist_request_count
+            reports[label] = strategy._report_results(found[label])
+        self._flush_snapshots()
+        self._export_metrics()
+        return reports
+
+
+def main():
+    engine = None
+    try:
+        engine = ScanEngine(
+            port=7496,
+            client_id=85,
+            min_atr_pct=2.0,
+            use_intraday_atr=True,
+            intraday_bar='30 mins',
+            intraday_min_atr_pct=0.8,
+            respect_rate_limits=True,
+            checkpoint_path='scan_checkpoint.sqlite',
+            schedule_symbols=True,
+        )
+        try:
+            with open('watchlist.txt', 'r') as f:
+                watchlist = [
+                    line.strip().upper()
+                    for line in f
+                    if line.strip() and not line.strip().startswith('#')
+                ]
+            print(f"📋 Loaded {len(watchlist)} symbols from watchlist.txt")
+        except FileNotFoundError:
+            print("⚠️ watchlist.txt not found, using default symbols")
+            watchlist = ['SPY', 'QQQ', 'AAPL', 'NVDA', 'TSLA', 'AMD', 'META', 'MSFT']
+
+        results = engine.scan_watchlist_staged(watchlist, max_in_flight=8)
+        print("\n🎉 SCAN COMPLETE!")
+        for label, found in results.items():
+            print(f"   {label}: candidates in {len(found)} symbols")
+    except ConnectionError as e:
+        print(f"❌ {e}; finished symbols are checkpointed, rerun to resume")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+    finally:
+        if engine:
+            engine.disconnect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from opentelemetry import metrics as otel_metrics
+except ImportError:
+    otel_metrics = None
+
+# Seconds; covers a cached lookup up to a paced historical request
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+HELP = {
+    'op_seconds': 'Latency of one scanner operation (qualify, bars, chains, scoring, ...)',
+    'stage_seconds': 'Wall time of one pipeline stage of a staged scan',
+    'ticker_wait_seconds': 'Time spent waiting for market data to become ready',
+    'tickers_missing_total': 'Tickers still incomplete when their readiness wait timed out',
+    'ib_requests_total': 'Requests sent to IB, by limit class',
+    'ib_errors_total': 'IB error messages, by reason (pacing violations, line limit, ...)',
+    'pacing_waits_total': 'Times the pacer made a request wait, by limit',
+    'pacing_wait_seconds_total': 'Total time requests waited for the pacer, by limit',
+    'market_data_lines_peak': 'Most market data lines held at once',
+    'tickers_refilled_total': 'Tickers re-requested after the market data type stepped down, by new type',
+    'reconnects_total': 'Successful reconnects after the TWS connection dropped mid-scan',
+    'intraday_bars_streamed_total': 'Intraday ATR gates served from real-time bar streams instead of a historical request',
+}
+
+# IB error codes that mean a request was rejected for pacing or capacity
+IB_REJECTIONS = {100: 'message_rate', 101: 'line_limit', 162: 'historical', 420: 'realtime', 10090: 'subscription'}
+
+
+def timed_op(op):
+    """Method decorator: time every call into the instance's ScanMetrics as op_seconds{op=...}."""
+    def decorate(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(self, *args, **kwargs):
+                with self.metrics.timed(op):
+                    return await fn(self, *args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(self, *args, **kwargs):
+                with self.metrics.timed(op):
+                    return fn(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class Histogram:
+    """Fixed-bucket histogram (Prometheus semantics: cumulative buckets, sum, count)."""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Bucket upper bound containing the q-quantile (the largest finite bound for the +Inf bucket)."""
+        if not self.count:
+            return float('nan')
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    body = ','.join(f'{k}="{str(v)}"'.replace('\n', ' ') for k, v in pairs)
+    return '{' + body + '}'
+
+
+class ScanMetrics:
+    """
+    In-process latency histograms and counters for the scanners.
+
+    Every timed operation lands in a histogram keyed by (family, labels); counters
+    cover IB requests, pacing waits and IB rejections. Pacer figures are pulled when
+    exported, so nothing in the hot path talks to the pacer. Export as Prometheus text
+    (to a file for the node_exporter textfile collector, or over HTTP), or mirror every
+    observation into OpenTelemetry instruments when opentelemetry is installed.
+    """
+
+    def __init__(self, prefix='scanner', const_labels=None, otel=False):
+        self.prefix = prefix
+        self.const_labels = dict(const_labels or {})
+        self.histograms = {}  # (family, label key) -> Histogram
+        self.counters = Counter()  # (family, label key) -> value
+        self.gauges = {}  # (family, label key) -> value, pulled from pacers at export
+        self._merged_gauges = {}  # same, from other processes' snapshots
+        self._pacers = []
+        self._ib_clients = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._otel = None
+        if otel:
+            if otel_metrics is None:
+                print("⚠️ opentelemetry not installed; OpenTelemetry export disabled")
+            else:
+                self._otel = {'meter': otel_metrics.get_meter(prefix), 'instruments': {}}
+
+    # ---------- Recording ----------
+    def observe(self, family, value, **labels):
+        labels = {**self.const_labels, **labels}
+        key = (family, _label_key(labels))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram()
+            hist.observe(value)
+        if self._otel is not None:
+            self._otel_instrument(family, 'histogram').record(value, attributes=labels)
+
+    def inc(self, family, n=1, **labels):
+        labels = {**self.const_labels, **labels}
+        with self._lock:
+            self.counters[(family, _label_key(labels))] += n
+        if self._otel is not None:
+            self._otel_instrument(family, 'counter').add(n, attributes=labels)
+
+    @contextmanager
+    def timed(self, op, **labels):
+        """Time the block into op_seconds{op=...}; exceptions are counted with outcome="error"."""
+        start = time.perf_counter()
+        outcome = 'ok'
+        try:
+            yield
+        except BaseException:
+            outcome = 'error'
+            raise
+        finally:
+            self.observe('op_seconds', time.perf_counter() - start, op=op, outcome=outcome)
+
+    def observe_wait(self, result, kind):
+        """Record a ticker_wait.WaitResult: wait time plus how many tickers never became ready."""
+        self.observe('ticker_wait_seconds', result.elapsed, kind=kind)
+        if result.missing:
+            self.inc('tickers_missing_total', len(result.missing), kind=kind)
+
+    def _otel_instrument(self, family, kind):
+        instruments = self._otel['instruments']
+        if family not in instruments:
+            meter = self._otel['meter']
+            name = f"{self.prefix}.{family}"
+            if kind == 'histogram':
+                instruments[family] = meter.create_histogram(name, unit='s', description=HELP.get(family, ''))
+            else:
+                instruments[family] = meter.create_counter(name, description=HELP.get(family, ''))
+        return instruments[family]
+
+    # ---------- Sources ----------
+    def watch_pacer(self, pacer):
+        """Export this pacer's waits per limit and peak lines (read at export time)."""
+        if all(p is not pacer for p in self._pacers):
+            self._pacers.append(pacer)
+
+    def watch_ib(self, ib_client):
+        """Count IB error messages, classifying pacing and capacity rejections."""
+        event = getattr(ib_client, 'errorEvent', None)
+        if event is not None and all(c is not ib_client for c in self._ib_clients):
+            self._ib_clients.append(ib_client)
+            event += self._on_ib_error
+
+    def _on_ib_error(self, reqId, errorCode, errorString, contract=None):
+        reason = IB_REJECTIONS.get(errorCode, 'other')
+        if errorCode == 162 and 'pacing' not in errorString.lower():
+            reason = 'historical_other'
+        self.inc('ib_errors_total', code=errorCode, reason=reason)
+
+    @staticmethod
+    def _combine(gauges, key, value):
+        gauges[key] = max(gauges.get(key, 0), value) if key[0].endswith('_peak') else gauges.get(key, 0) + value
+
+    def _collect(self):
+        """Rebuild the pacer gauges from absolute pacer figures, so repeated exports never double count."""
+        gauges = dict(self._merged_gauges)
+        for pacer in self._pacers:
+            try:
+                s = pacer.stats()
+            except Exception:
+                continue
+            for limit, n in s.get('waits_by_limit', {}).items():
+                self._combine(gauges, ('pacing_waits_total', _label_key({**self.const_labels, 'limit': limit})), n)
+            for limit, secs in s.get('wait_secs_by_limit', {}).items():
+                self._combine(gauges, ('pacing_wait_seconds_total', _label_key({**self.const_labels, 'limit': limit})), secs)
+            self._combine(gauges, ('market_data_lines_peak', _label_key(self.const_labels)), s.get('peak_lines', 0))
+        with self._lock:
+            self.gauges = gauges
+
+    # ---------- Cross-process ----------
+    def snapshot(self):
+        """Plain-data copy (picklable) for merging shard metrics in the coordinator."""
+        self._collect()
+        with self._lock:
+            return {
+                'histograms': {k: (h.buckets, list(h.counts), h.sum, h.count) for k, h in self.histograms.items()},
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+            }
+
+    def merge(self, snapshot):
+        with self._lock:
+            for key, (buckets, counts, total, count) in snapshot['histograms'].items():
+                other = Histogram(buckets)
+                other.counts, other.sum, other.count = counts, total, count
+                if key in self.histograms:
+                    self.histograms[key].merge(other)
+                else:
+                    self.histograms[key] = other
+            self.counters.update(snapshot['counters'])
+            for key, value in snapshot['gauges'].items():
+                self._combine(self._merged_gauges, key, value)
+
+    # ---------- Export ----------
+    def to_prometheus(self):
+        self._collect()
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(list(self.counters.items()) + list(self.gauges.items()))
+        lines = []
+        seen = set()
+
+        def header(family, kind):
+            if family not in seen:
+                seen.add(family)
+                name = f"{self.prefix}_{family}"
+                lines.append(f"# HELP {name} {HELP.get(family, family)}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (family, key), h in histograms:
+            header(family, 'histogram')
+            name = f"{self.prefix}_{family}"
+            cumulative = 0
+            for bound, n in zip(list(h.buckets) + ['+Inf'], h.counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_fmt_labels(key, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_fmt_labels(key)} {h.sum:.6f}")
+            lines.append(f"{name}_count{_fmt_labels(key)} {h.count}")
+        for (family, key), value in counters:
+            header(family, 'gauge' if family.endswith('_peak') else 'counter')
+            lines.append(f"{self.prefix}_{family}{_fmt_labels(key)} {value:g}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """Atomically write the Prometheus text exposition (node_exporter textfile collector format)."""
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp, path)
+
+    def serve_prometheus(self, port=9464, host='127.0.0.1'):
+        """Serve /metrics on a background thread until the process exits."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"📡 Metrics on http://{host}:{port}/metrics")
+        return self._server
+
+    def summary(self):
+        """p50/p95 and totals per operation, slowest total first."""
+        with self._lock:
+            rows = [
+                (dict(key).get('op') or dict(key).get('stage') or dict(key).get('kind'), family, h)
+                for (family, key), h in self.histograms.items() if h.count
+            ]
+            errors = sum(v for (family, _), v in self.counters.items() if family == 'ib_errors_total')
+        lines = ["📏 Latency (p50 / p95 bucket, total):"]
+        for label, family, h in sorted(rows, key=lambda r: -r[2].sum):
+            lines.append(f"   {family[:-8]:<12} {label:<16} n={h.count:<6} p50 ≤ {h.quantile(0.5):g}s | "
+                         f"p95 ≤ {h.quantile(0.95):g}s | total {h.sum:.1f}s")
+        if errors:
+            lines.append(f"   IB errors: {errors}")
+        return '\n'.join(lines)
@@ -0,0 +1,1206 @@
+import abc
+import asyncio
+import time
+
+import ib_insync as ib
+import numpy as np
+import pandas as pd
+
+import bs_pricing
+import slack_notify
+from atr_state import ATRStore
+from bar_cache import BarCache
+from chain_cache import ChainCache
+from ib_pacing import IBPacer
+from market_data_mode import DELAYED, DELAYED_FROZEN, FROZEN, LIVE, MarketDataMode
+from realtime_bars import IntradayBarAggregator
+from scan_checkpoint import ScanCheckpoint
+from scan_metrics import ScanMetrics, timed_op
+from snapshot_store import OptionSnapshotStore
+from symbol_scheduler import SymbolScheduler
+from universe_scoring import check_normalization
+from ticker_wait import READY, TickerWaves, WaitResult, describe_wait, stock_price_ready
+
+
+# IB system messages: connectivity between TWS and IB lost / restored (1101: data lost, 1102: maintained)
+CONNECTIVITY_LOST = {1100}
+CONNECTIVITY_RESTORED = {1101, 1102}
+
+
+class ReconnectFailed(ConnectionError):
+    """TWS could not be reached again within reconnect_attempts"""
+
+
+class ScannerBase(abc.ABC):
+    """
+    TWS plumbing and symbol gates shared by every scanner: connection, pacing, cached
+    bars/chains/contracts, market data lines, Wilder ATR and the daily/intraday/structure
+    gates, plus the generic option stage (chain -> targets -> quotes -> rows -> ranking).
+
+    A strategy (CheapOptionsScanner, PullbackRecoveryScannerV2, ...) subclasses this and
+    implements the option hooks below; scan_engine.ScanEngine runs several strategies
+    over one connection, fetching and gating each symbol once.
+
+      name                   strategy/metrics label
+      _option_data_request   (generic ticks, readiness predicate) for its option quotes
+      filters_on_volume      wait for each quote's volume too (its filters drop rows without one)
+      _option_targets        (expiration(s), strikes) to quote for a symbol, or (None, None)
+      _option_rows           candidate rows from a quote frame (see _collect_option_quotes); no IB calls
+      _finalize_options      quality filters, scoring and ranking; returns the ranked frame or None
+      _score_contracts       vectorized scoring of a frame of one or many symbols' candidates
+      rank_by / rank_ascending, _report_mask   ranking keys and the consolidated report's thresholds
+      _collect_result / _report_results   per-symbol display and the consolidated CSV/Slack report
+      _slack_line, slack_emoji / slack_found_text / slack_empty_text   its Slack result lines and wording
+    """
+
+    name = 'scanner'
+    slack_emoji = '🎲'
+    slack_found_text = 'opportunities'
+    slack_empty_text = 'No opportunities found in current market conditions'
+    filters_on_volume = True
+    rank_by = ['score']
+    rank_ascending = [False]
+
+    def __init__(
+        self,
+        host='127.0.0.1',
+        port=7496,
+        client_id=4,
+        # Daily ATR filters
+        min_atr_pct=2.0,
+        min_abs_atr=None,
+        low_price_threshold=10.0,
+        min_abs_atr_low_price=0.25,
+        # Intraday ATR gate
+        use_intraday_atr=True,
+        intraday_bar='30 mins',
+        intraday_period=20,
+        intraday_min_atr_pct=0.8,
+        realtime_intraday_streams=0,  # >0: intraday bars from up to N real-time bar streams after warm-up (see realtime_bars.py)
+        option_line_reserve=30,  # market data lines the streams never take, kept for option quotes
+        risk_free_rate=0.045,  # For Black-Scholes
+        # Rate limiting
+        respect_rate_limits=True,
+        hist_requests_per_10min=60,
+        delay_between_symbols=1.0,  # seconds between each symbol on the serial path
+        max_market_data_lines=100,  # simultaneous market data lines allowed by the account
+        messages_per_second=50,  # TWS API message cap
+        pacer=None,  # share one IBPacer between scanners on the same TWS session
+        # Local bar store (set bar_cache_path=None to always fetch from IB)
+        bar_cache_path='bar_cache.sqlite',
+        bar_cache_max_age=300,  # seconds before a cached series is topped up again
+        # Option chain / qualified contract cache (set chain_cache_path=None to disable)
+        chain_cache_path='chain_cache.sqlite',
+        chain_cache_ttl=6 * 3600,  # seconds a cached chain definition stays valid
+        # Option chain snapshots (see snapshot_store.py); the CSV is just a view of the stored picks
+        snapshot_path=None,  # e.g. 'option_snapshots'; a partitioned Parquet dataset that grows with every scan
+        write_csv=True,  # False keeps the consolidated report in the snapshot store only (needs snapshot_path)
+        stream_to_slack=False,  # also post each candidate to Slack as soon as it is found
+        # Consolidated ranking over every symbol's candidates (see universe_scoring.py)
+        score_normalization='symbol',  # 'symbol', 'global' or 'percentile'
+        universe_top_n=None,  # cap the consolidated report at the N best symbols
+        # Market data readiness deadlines (returns early once the data is in)
+        quote_timeout=2.0,  # underlying price
+        option_timeout=3.0,  # option bid/ask + model greeks
+        # Greeks source: False requests plain quotes only and solves IV/delta locally
+        use_model_greeks=True,
+        # Live -> frozen -> delayed -> delayed frozen when ticks don't arrive (see market_data_mode.py)
+        market_data_modes=(LIVE, FROZEN, DELAYED, DELAYED_FROZEN),
+        retry_live_secs=600.0,  # seconds before a stepped-down connection tries live data again
+        snapshot_quotes=False,  # snapshot requests instead of streams where no generic ticks are needed
+        # Surviving TWS disconnects: reconnect with backoff, resume from the checkpoint (see scan_checkpoint.py)
+        checkpoint_path=None,  # e.g. 'scan_checkpoint.sqlite'; a rerun of an interrupted scan picks up where it stopped
+        checkpoint_max_age=2 * 3600,  # seconds an unfinished run stays resumable
+        reconnect_attempts=10,
+        reconnect_backoff_secs=2.0,  # doubled per failed attempt up to max_reconnect_backoff_secs
+        max_reconnect_backoff_secs=60.0,
+        schedule_symbols=False,  # scan the symbols most likely to pass first (see symbol_scheduler.py)
+        auto_connect=True,  # False for a report-only instance (see shard_scan.py)
+        ib_client=None,  # stand-in for ib.IB(), e.g. ib_replay.RecordingIB / ReplayIB
+        # Instrumentation (see scan_metrics.py)
+        metrics=None,  # ScanMetrics to record into; share one to aggregate several scanners
+        metrics_path=None,  # Prometheus text file rewritten after every scan report
+    ):
+        self.ib = ib_client if ib_client is not None else ib.IB()
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+
+        # ATR filters
+        self.min_atr_pct = float(min_atr_pct) if min_atr_pct is not None else None
+        self.min_abs_atr = float(min_abs_atr) if min_abs_atr is not None else None
+        self.low_price_threshold = float(low_price_threshold)
+        self.min_abs_atr_low_price = float(min_abs_atr_low_price)
+
+        self.use_intraday_atr = use_intraday_atr
+        self.intraday_bar = intraday_bar
+        self.intraday_period = int(intraday_period)
+        self.intraday_min_atr_pct = float(intraday_min_atr_pct)
+        self.risk_free_rate = float(risk_free_rate)
+
+        # Rate limiting
+        self.respect_rate_limits = respect_rate_limits
+        self.hist_requests_per_10min = hist_requests_per_10min
+        self.delay_between_symbols = delay_between_symbols
+        self.quote_timeout = float(quote_timeout)
+        self.option_timeout = float(option_timeout)
+        self.use_model_greeks = use_model_greeks
+        self.snapshot_quotes = snapshot_quotes
+        self.data_mode = MarketDataMode(self.ib, market_data_modes, retry_live_secs=retry_live_secs)
+        self.pacer = pacer or IBPacer(
+            hist_requests_per_10min=hist_requests_per_10min,
+            max_market_data_lines=max_market_data_lines,
+            messages_per_second=messages_per_second,
+        )
+
+        self.bar_cache = BarCache(bar_cache_path, max_age_secs=bar_cache_max_age) if bar_cache_path else None
+        self.chain_cache = ChainCache(chain_cache_path, chain_ttl_secs=chain_cache_ttl) if chain_cache_path else None
+        # Incremental ATR state, persisted next to the bar cache (in memory only without one)
+        self.atr_store = ATRStore(bar_cache_path)
+        self.intraday_streams = None
+        if realtime_intraday_streams and use_intraday_atr:
+            # Streams hold their lines until disconnect; option waves need some left or they wait forever
+            max_streams = min(int(realtime_intraday_streams), max(0, self.pacer.max_market_data_lines - int(option_line_reserve)))
+            if max_streams < realtime_intraday_streams:
+                print(f"⚠️ Only {max_streams} real-time intraday streams ({self.pacer.max_market_data_lines} lines, "
+                      f"{option_line_reserve} reserved for options)")
+            if max_streams:
+                self.intraday_streams = IntradayBarAggregator(self.ib, intraday_bar, max_streams=max_streams)
+        self.snapshots = self._open_snapshot_store(snapshot_path)
+        self.write_csv = write_csv
+        self.stream_to_slack = bool(stream_to_slack)
+        self.score_normalization = check_normalization(score_normalization)
+        self.universe_top_n = int(universe_top_n) if universe_top_n else None
+        self.checkpoint_path = checkpoint_path
+        self.scheduler = SymbolScheduler(bar_cache_path) if schedule_symbols else None
+        self._gates_passed = set()  # symbols that reached the option stage this scan (for the scheduler)
+        self.checkpoint_max_age = float(checkpoint_max_age)
+
+        # Connection recovery
+        self.reconnect_attempts = int(reconnect_attempts)
+        self.reconnect_backoff_secs = float(reconnect_backoff_secs)
+        self.max_reconnect_backoff_secs = float(max_reconnect_backoff_secs)
+        self.interruptions = 0  # socket drops and IB connectivity losses seen so far
+        self.reconnects = 0
+        self._connectivity_lost = False
+        self._watch_connection()
+
+        # Track historical data requests
+        self.hist_request_count = 0
+
+        # Latency histograms, request/pacing counters, IB rejections
+        self.metrics = metrics or ScanMetrics(const_labels={'scanner': self.name})
+        self.metrics.watch_pacer(self.pacer)
+        self.metrics.watch_ib(self.ib)
+        self.metrics_path = metrics_path
+        self.engine = None  # set by attach(); the engine then exports the shared metrics once
+
+        if auto_connect:
+            self.connect()
+
+    @staticmethod
+    def _open_snapshot_store(path):
+        if not path:
+            return None
+        try:
+            return OptionSnapshotStore(path)
+        except ImportError as e:
+            print(f"⚠️ Option snapshots disabled: {e}")
+            return None
+
+    def connect(self):
+        print("🔌 Connecting to TWS...")
+        self.ib.connect(self.host, self.port, clientId=self.client_id)
+        print("✅ Connected to TWS")
+        self.data_mode.applied = None  # a new session starts out live
+        self.data_mode.apply()
+
+    # ---------- Connection recovery ----------
+    def _watch_connection(self):
+        event = getattr(self.ib, 'disconnectedEvent', None)
+        if event is not None:
+            event += self._on_disconnected
+        event = getattr(self.ib, 'errorEvent', None)
+        if event is not None:
+            event += self._on_connectivity
+
+    def _on_disconnected(self):
+        self.interruptions += 1
+
+    def _on_connectivity(self, reqId, errorCode, errorString, contract=None):
+        if errorCode in CONNECTIVITY_LOST:
+            if not self._connectivity_lost:
+                self.interruptions += 1
+            self._connectivity_lost = True
+        elif errorCode in CONNECTIVITY_RESTORED:
+            self._connectivity_lost = False
+            self.data_mode.applied = None  # subscriptions are gone after 1101; resend the data type too
+
+    def _connection_ok(self):
+        return self.ib.isConnected() and not self._connectivity_lost
+
+    def _connection_state(self):
+        return self.interruptions, self._connection_ok()
+
+    def _interrupted_since(self, state):
+        """A drop was seen since state (a client that was never connected, e.g. a replay, is not interrupted)"""
+        interruptions, was_ok = state
+        return self.interruptions != interruptions or (was_ok and not self._connection_ok())
+
+    def reconnect(self):
+        """
+        Bring the TWS session back after a drop: reconnect with exponential backoff (or, while
+        the socket is up but TWS lost its IB servers, wait for it to restore connectivity).
+        Raises ReconnectFailed (a ConnectionError) once reconnect_attempts are used up.
+        """
+        delay = self.reconnect_backoff_secs
+        for attempt in range(1, self.reconnect_attempts + 1):
+            print(f"🔌 TWS connection lost; retry {attempt}/{self.reconnect_attempts} in {delay:.0f}s")
+            self.ib.sleep(delay)
+            if not self.ib.isConnected():
+                try:
+                    self.connect()
+                except Exception as e:
+                    print(f"⚠️ Reconnect failed: {e}")
+            if self._connection_ok():
+                self._reset_intraday_streams()
+                self.reconnects += 1
+                self.metrics.inc('reconnects_total')
+                return
+            delay = min(self.max_reconnect_backoff_secs, delay * 2)
+        raise ReconnectFailed(f"TWS still unreachable after {self.reconnect_attempts} attempts")
+
+    def _until_connected(self, fn, what):
+        """fn(), run again after reconnecting whenever the connection dropped while it ran"""
+        while True:
+            state = self._connection_state()
+            try:
+                result, error = fn(), None
+            except Exception as e:
+                result, error = None, e
+            if not self._interrupted_since(state):
+                if error is not None:
+                    raise error
+                return result
+            print(f"\n🔌 {what} interrupted by a TWS disconnect; redoing it after reconnecting")
+            self.reconnect()
+
+    # ---------- Symbol scheduling ----------
+    def _schedule(self, symbols):
+        """The watchlist in scan order: by pass likelihood with a scheduler, as given without one"""
+        if self.scheduler is None:
+            return list(symbols)
+        ordered = self.scheduler.order(symbols, self.min_atr_pct)
+        print(f"🗓️  Scheduler: {self.scheduler.summary(ordered)}")
+        return ordered
+
+    def _observe_gates(self, symbol, price=None, high_5d=None, low_5d=None, atr_pct=None):
+        if self.scheduler is not None:
+            self.scheduler.observe(symbol, price, high_5d, low_5d, atr_pct)
+
+    def _learn_schedule(self, found, screen=None):
+        """Fold this scan's gate outcomes (a pre-screen frame, or what the serial gates observed) into the history"""
+        if self.scheduler is None:
+            return
+        if screen is not None:
+            self.scheduler.record_screen(screen, found)
+        else:
+            self.scheduler.record_scan(self._gates_passed, found)
+        self._gates_passed.clear()
+
+    # ---------- Resumable scans ----------
+    def _open_checkpoint(self, stage, symbols):
+        if not self.checkpoint_path:
+            return None
+        checkpoint = ScanCheckpoint(self.checkpoint_path, self.name, stage, symbols, self.checkpoint_max_age)
+        if checkpoint.resumed:
+            self.hist_request_count = max(self.hist_request_count, checkpoint.hist_requests)
+            self.pacer.restore_hist_history(checkpoint.hist_times)
+            print(f"♻️  Resuming from checkpoint: {checkpoint.summary()}")
+        return checkpoint
+
+    def _record_checkpoint(self, checkpoint, symbol, position, result):
+        if checkpoint is not None:
+            checkpoint.record(symbol, position, result, self.hist_request_count, self.pacer.hist_history())
+
+    def _scan_resumable(self, symbols, analyze, stage='scan', delay=0.0):
+        """
+        Serial scan loop yielding (symbol, analyze(i, symbol)) in list order. A symbol
+        interrupted by a TWS disconnect is redone after reconnecting (its market data is
+        requested afresh); errors are reported and yield None. With a checkpoint_path every
+        finished symbol is persisted, and rerunning the same scan skips straight to the
+        next unscanned symbol (earlier results are yielded from the checkpoint).
+        delay seconds are slept between scanned symbols.
+        """
+        checkpoint = self._open_checkpoint(stage, symbols)
+        try:
+            for i, symbol in enumerate(symbols, 1):
+                if checkpoint is not None and symbol in checkpoint.done:
+                    yield symbol, checkpoint.done[symbol]
+                    continue
+                try:
+                    result = self._until_connected(lambda: analyze(i, symbol), symbol)
+                except ReconnectFailed:
+                    raise  # progress so far is in the checkpoint
+                except Exception as e:
+                    print(f"❌ {symbol} error: {e}")
+                    result = None
+                self._record_checkpoint(checkpoint, symbol, i, result)
+                yield symbol, result
+                if delay and i < len(symbols):
+                    time.sleep(delay)
+            if checkpoint is not None:
+                checkpoint.finish()
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+
+    def _scan_resumable_concurrent(self, symbols, analyze_async, max_in_flight, stage='scan'):
+        """
+        Concurrent counterpart of _scan_resumable: up to max_in_flight analyze_async(i, symbol)
+        at once. Symbols cut off by a disconnect (and those not started yet) are rerun after
+        reconnecting. Returns the results in list order.
+        """
+        checkpoint = self._open_checkpoint(stage, symbols)
+        try:
+            results = dict(checkpoint.done) if checkpoint is not None else {}
+            while True:
+                pending = [(i, s) for i, s in enumerate(symbols, 1) if s not in results]
+                if not pending:
+                    break
+                if not self.ib.run(self._scan_batch_async(pending, analyze_async, max_in_flight, results, checkpoint)):
+                    break
+                self.reconnect()
+            if checkpoint is not None:
+                checkpoint.finish()
+            return [results.get(s) for s in symbols]
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+
+    def _survivor_options(self, survivors, max_in_flight=1):
+        """
+        Option stage of a staged scan over the pre-screen survivors, resumable like a full
+        scan (checkpoint stage 'options'). Uses the subclass's _options_for_survivor(_async);
+        returns the results in survivor order.
+        """
+        rows = dict(survivors.iterrows())
+        symbols = list(survivors.index)
+        if max_in_flight > 1:
+            return self._scan_resumable_concurrent(
+                symbols, lambda i, symbol: self._options_for_survivor_async(symbol, rows[symbol]), max_in_flight, 'options')
+        return [df for _, df in self._scan_resumable(
+            symbols, lambda i, symbol: self._options_for_survivor(symbol, rows[symbol]), 'options')]
+
+    async def _scan_batch_async(self, pending, analyze_async, max_in_flight, results, checkpoint):
+        """Fills results; returns True when some symbols were interrupted by a disconnect"""
+        in_flight = asyncio.Semaphore(max(1, int(max_in_flight)))
+        interrupted = []
+        batch = self._connection_state()
+
+        async def one(i, symbol):
+            async with in_flight:
+                seen = self._connection_state()
+                if self._interrupted_since(batch):
+                    interrupted.append(symbol)  # don't start new symbols on a dead connection
+                    return
+                try:
+                    result = await analyze_async(i, symbol)
+                except Exception as e:
+                    print(f"❌ {symbol} error: {e}")
+                    result = None
+                if self._interrupted_since(seen):
+                    interrupted.append(symbol)
+                    return
+                results[symbol] = result
+                self._record_checkpoint(checkpoint, symbol, i, result)
+
+        await asyncio.gather(*(one(i, s) for i, s in pending))
+        if interrupted:
+            print(f"\n🔌 {len(interrupted)} symbols interrupted by a TWS disconnect; redoing them after reconnecting")
+        return bool(interrupted)
+
+    def attach(self, engine):
+        """Share another scanner's connection, pacer, stores and metrics (see scan_engine.py)."""
+        self.ib = engine.ib
+        self.pacer = engine.pacer
+        self.bar_cache = engine.bar_cache
+        self.chain_cache = engine.chain_cache
+        self.atr_store = engine.atr_store
+        self.intraday_streams = engine.intraday_streams
+        self.snapshots = engine.snapshots
+        self.metrics = engine.metrics
+        self.data_mode = engine.data_mode
+        self.use_model_greeks = engine.use_model_greeks
+        self.engine = engine
+
+    # ---------- Pacing ----------
+    @staticmethod
+    def _hist_keys(contract, duration, bar):
+        return (contract.conId, duration, bar, 'TRADES'), (contract.conId, 'TRADES')
+
+    def _check_hist_rate_limit(self, contract=None, duration='', bar=''):
+        """Wait for a historical-data permit from the shared pacer"""
+        self.hist_request_count += 1
+        self.metrics.inc('ib_requests_total', limit='historical')
+        if not self.respect_rate_limits:
+            return
+        request_key, contract_key = self._hist_keys(contract, duration, bar) if contract else (None, None)
+        wait_time = self.pacer.wait_historical(request_key, contract_key, sleep=self.ib.sleep)
+        if wait_time > 1:
+            print(f"⏸️  Rate limit reached: waited {wait_time:.1f}s")
+
+    async def _check_hist_rate_limit_async(self, contract=None, duration='', bar=''):
+        """Async variant: the permit is reserved before awaiting, so concurrent callers never collide"""
+        self.hist_request_count += 1
+        self.metrics.inc('ib_requests_total', limit='historical')
+        if not self.respect_rate_limits:
+            return
+        request_key, contract_key = self._hist_keys(contract, duration, bar) if contract else (None, None)
+        wait_time = await self.pacer.wait_historical_async(request_key, contract_key)
+        if wait_time > 1:
+            print(f"⏸️  Rate limit reached: waited {wait_time:.1f}s")
+
+    def _count_requests(self, limit, n=1):
+        self.metrics.inc('ib_requests_total', n, limit=limit)
+
+    def _pace_messages(self, n=1):
+        if self.respect_rate_limits:
+            self.pacer.wait_messages(n, sleep=self.ib.sleep)
+
+    async def _pace_messages_async(self, n=1):
+        if self.respect_rate_limits:
+            await self.pacer.wait_messages_async(n)
+
+    @timed_op('qualify')
+    def _qualify(self, *contracts):
+        """qualifyContracts, skipping contracts the chain cache already knows"""
+        if self.chain_cache is None:
+            self._count_requests('contract_details', len(contracts))
+            self._pace_messages(len(contracts))
+            return self.ib.qualifyContracts(*contracts)
+        keys, misses = self.chain_cache.fill_contracts(contracts)
+        if misses:
+            self._count_requests('contract_details', len(misses))
+            self._pace_messages(len(misses))
+            self.ib.qualifyContracts(*misses)
+            self.chain_cache.store_contracts(keys, contracts)
+        return [c for c in contracts if c.conId]
+
+    @timed_op('qualify')
+    async def _qualify_async(self, *contracts):
+        if self.chain_cache is None:
+            self._count_requests('contract_details', len(contracts))
+            await self._pace_messages_async(len(contracts))
+            return await self.ib.qualifyContractsAsync(*contracts)
+        keys, misses = self.chain_cache.fill_contracts(contracts)
+        if misses:
+            self._count_requests('contract_details', len(misses))
+            await self._pace_messages_async(len(misses))
+            await self.ib.qualifyContractsAsync(*misses)
+            self.chain_cache.store_contracts(keys, contracts)
+        return [c for c in contracts if c.conId]
+
+    @timed_op('option_chain')
+    def _option_chains(self, symbol, contract):
+        chains = self.chain_cache.get_chains(contract.conId) if self.chain_cache is not None else None
+        if chains is None:
+            self._count_requests('sec_def')
+            self._pace_messages()
+            chains = self.ib.reqSecDefOptParams(symbol, '', 'STK', contract.conId)
+            if self.chain_cache is not None:
+                self.chain_cache.store_chains(contract.conId, chains)
+        return chains
+
+    @timed_op('option_chain')
+    async def _option_chains_async(self, symbol, contract):
+        chains = self.chain_cache.get_chains(contract.conId) if self.chain_cache is not None else None
+        if chains is None:
+            self._count_requests('sec_def')
+            await self._pace_messages_async()
+            chains = await self.ib.reqSecDefOptParamsAsync(symbol, '', 'STK', contract.conId)
+            if self.chain_cache is not None:
+                self.chain_cache.store_chains(contract.conId, chains)
+        return chains
+
+    def _send_mkt_data(self, contracts, generic_ticks='', snapshot=False):
+        """reqMktData for contracts whose lines are already held"""
+        self.data_mode.apply()
+        self._count_requests('market_data', len(contracts))
+        self._pace_messages(len(contracts))
+        return [self.ib.reqMktData(c, genericTickList=generic_ticks, snapshot=snapshot, regulatorySnapshot=False) for c in contracts]
+
+    async def _send_mkt_data_async(self, contracts, generic_ticks='', snapshot=False):
+        self.data_mode.apply()
+        self._count_requests('market_data', len(contracts))
+        await self._pace_messages_async(len(contracts))
+        return [self.ib.reqMktData(c, genericTickList=generic_ticks, snapshot=snapshot, regulatorySnapshot=False) for c in contracts]
+
+    def _req_mkt_data(self, contracts, generic_ticks=''):
+        """Subscribe to market data for all contracts, holding one line per contract"""
+        self.pacer.acquire_lines(len(contracts), sleep=self.ib.sleep)
+        try:
+            return self._send_mkt_data(contracts, generic_ticks)
+        except Exception:
+            self.pacer.release_lines(len(contracts))
+            raise
+
+    async def _req_mkt_data_async(self, contracts, generic_ticks=''):
+        await self.pacer.acquire_lines_async(len(contracts))
+        try:
+            return await self._send_mkt_data_async(contracts, generic_ticks)
+        except Exception:
+            self.pacer.release_lines(len(contracts))
+            raise
+
+    def _cancel_mkt_data(self, contract):
+        try:
+            self.ib.cancelMktData(contract)
+        finally:
+            self.pacer.release_lines(1)
+
+    # ---------- Market data waves ----------
+    def _use_snapshots(self, generic_ticks):
+        # IB rejects generic tick lists on snapshot requests
+        return self.snapshot_quotes and not generic_ticks
+
+    def _start_wave(self, waves, n, generic_ticks, snapshot):
+        positions = waves.take(n)
+        if len(positions) < n:
+            self.pacer.release_lines(n - len(positions))
+        try:
+            tickers = self._send_mkt_data([waves.contracts[i] for i in positions], generic_ticks, snapshot)
+        except Exception:
+            self.pacer.release_lines(len(positions))
+            raise
+        waves.started(positions, tickers)
+
+    async def _start_wave_async(self, waves, n, generic_ticks, snapshot):
+        positions = waves.take(n)
+        if len(positions) < n:
+            self.pacer.release_lines(n - len(positions))
+        try:
+            tickers = await self._send_mkt_data_async([waves.contracts[i] for i in positions], generic_ticks, snapshot)
+        except Exception:
+            self.pacer.release_lines(len(positions))
+            raise
+        waves.started(positions, tickers)
+
+    def _release_tickers(self, tickers, snapshot=False, completed=False):
+        """Hand ticker lines back to the pool (a completed snapshot has ended by itself)"""
+        for t in tickers:
+            if snapshot and completed:
+                self.pacer.release_lines(1)
+                continue
+            try:
+                self._cancel_mkt_data(t.contract)
+            except Exception:
+                pass
+
+    def _lines_for_wave(self, waves, snapshot):
+        """Free lines for the pending contracts, recycling this batch's ready tickers first"""
+        wanted = len(waves.pending)
+        n = self.pacer.try_acquire_lines_up_to(wanted)
+        if n < wanted and waves.lingering:
+            self._release_tickers(waves.release_lingering(wanted - n), snapshot)
+            n += self.pacer.try_acquire_lines_up_to(wanted - n)
+        return n
+
+    def _settle_wave(self, waves, snapshot):
+        self._release_tickers(waves.settle(), snapshot)
+        if snapshot:
+            self._release_tickers(waves.release_lingering(), snapshot, completed=True)
+        elif waves.lingering and self.pacer.lines_wanted():
+            self._release_tickers(waves.release_lingering(), snapshot)
+
+    def _stream_tickers(self, contracts, ready, timeout, generic_ticks=''):
+        """
+        Quote any number of contracts through the bounded line pool. Contracts go out in waves
+        as lines free up (here or in other scans sharing the pacer); an expired ticker returns
+        its line at once and a ready one as soon as a waiting contract needs it, so the pool
+        stays busy and is never exceeded.
+        Returns (tickers in contract order, WaitResult); all lines are released on return.
+        """
+        snapshot = self._use_snapshots(generic_ticks)
+        waves = TickerWaves(contracts, ready, timeout)
+        try:
+            while waves.pending or waves.active:
+                if waves.pending:
+                    n = self._lines_for_wave(waves, snapshot)
+                    if not n and not waves.active:
+                        n = self.pacer.acquire_some_lines(len(waves.pending), sleep=self.ib.sleep)
+                    if n:
+                        self._start_wave(waves, n, generic_ticks, snapshot)
+                self._settle_wave(waves, snapshot)
+                if waves.active:
+                    self.ib.waitOnUpdate(timeout=waves.wake_in())
+        finally:
+            self._release_tickers(waves.release_lingering(), snapshot, completed=True)
+            self._release_tickers([t for t, _ in waves.active.values()])
+        return waves.result()
+
+    async def _stream_tickers_async(self, contracts, ready, timeout, generic_ticks=''):
+        snapshot = self._use_snapshots(generic_ticks)
+        waves = TickerWaves(contracts, ready, timeout)
+        try:
+            while waves.pending or waves.active:
+                if waves.pending:
+                    n = self._lines_for_wave(waves, snapshot)
+                    if not n and not waves.active:
+                        n = await self.pacer.acquire_some_lines_async(len(waves.pending))
+                    if n:
+                        await self._start_wave_async(waves, n, generic_ticks, snapshot)
+                self._settle_wave(waves, snapshot)
+                if waves.active:
+                    try:
+                        await asyncio.wait_for(self.ib.updateEvent, waves.wake_in())
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            self._release_tickers(waves.release_lingering(), snapshot, completed=True)
+            self._release_tickers([t for t, _ in waves.active.values()])
+        return waves.result()
+
+    def _refill_positions(self, tickers, wait):
+        missing = {id(t) for t in wait.missing}
+        slots = [i for i, t in enumerate(tickers) if id(t) in missing]
+        self.data_mode.refilled += len(slots)
+        self.metrics.inc('tickers_refilled_total', len(slots), mode=self.data_mode.name)
+        return slots
+
+    @staticmethod
+    def _merge_refill(tickers, wait, slots, refilled, retry):
+        tickers = list(tickers)
+        for i, t in zip(slots, refilled):
+            tickers[i] = t
+        return tickers, WaitResult(wait.ready + retry.ready, retry.missing, wait.elapsed + retry.elapsed)
+
+    def _stream_market_data(self, contracts, ready, timeout, kind, generic_ticks=''):
+        """
+        _stream_tickers plus the data mode fallback: if the market data type steps down
+        (see market_data_mode.py) the missing contracts are quoted once more under the new type.
+        Returns (tickers in contract order, WaitResult).
+        """
+        self.data_mode.apply()
+        requested_mode = self.data_mode.mode
+        tickers, wait = self._stream_tickers(contracts, ready, timeout, generic_ticks)
+        self.metrics.observe_wait(wait, kind)
+        if not self.data_mode.fall_back(wait, requested_mode):
+            return tickers, wait
+        slots = self._refill_positions(tickers, wait)
+        refilled, retry = self._stream_tickers([tickers[i].contract for i in slots], ready, timeout, generic_ticks)
+        self.metrics.observe_wait(retry, kind)
+        return self._merge_refill(tickers, wait, slots, refilled, retry)
+
+    async def _stream_market_data_async(self, contracts, ready, timeout, kind, generic_ticks=''):
+        self.data_mode.apply()
+        requested_mode = self.data_mode.mode
+        tickers, wait = await self._stream_tickers_async(contracts, ready, timeout, generic_ticks)
+        self.metrics.observe_wait(wait, kind)
+        if not self.data_mode.fall_back(wait, requested_mode):
+            return tickers, wait
+        slots = self._refill_positions(tickers, wait)
+        refilled, retry = await self._stream_tickers_async([tickers[i].contract for i in slots], ready, timeout, generic_ticks)
+        self.metrics.observe_wait(retry, kind)
+        return self._merge_refill(tickers, wait, slots, refilled, retry)
+
+    # ---------- Data helpers ----------
+    def _fetch_bars(self, contract, duration, bar):
+        """Historical TRADES bars, served from the bar cache with only the missing tail requested"""
+        # formatDate=2 stamps intraday bars in UTC (tz-aware); the default 1 gives naive TWS-local times
+        if self.bar_cache is None:
+            self._check_hist_rate_limit(contract, duration, bar)
+            return self.ib.reqHistoricalData(
+                contract, endDateTime='', durationStr=duration,
+                barSizeSetting=bar, whatToShow='TRADES', useRTH=True, formatDate=2
+            )
+
+        request_duration = self.bar_cache.refresh_duration(contract.conId, bar, duration)
+        if request_duration is None:
+            return self.bar_cache.load(contract.conId, bar)
+        self._check_hist_rate_limit(contract, request_duration, bar)
+        bars = self.ib.reqHistoricalData(
+            contract, endDateTime='', durationStr=request_duration,
+            barSizeSetting=bar, whatToShow='TRADES', useRTH=True, formatDate=2
+        )
+        return self.bar_cache.update(contract.conId, bar, bars, full_fetch=(request_duration == duration))
+
+    async def _fetch_bars_async(self, contract, duration, bar):
+        if self.bar_cache is None:
+            await self._check_hist_rate_limit_async(contract, duration, bar)
+            return await self.ib.reqHistoricalDataAsync(
+                contract, endDateTime='', durationStr=duration,
+                barSizeSetting=bar, whatToShow='TRADES', useRTH=True, formatDate=2
+            )
+
+        request_duration = self.bar_cache.refresh_duration(contract.conId, bar, duration)
+        if request_duration is None:
+            return self.bar_cache.load(contract.conId, bar)
+        await self._check_hist_rate_limit_async(contract, request_duration, bar)
+        bars = await self.ib.reqHistoricalDataAsync(
+            contract, endDateTime='', durationStr=request_duration,
+            barSizeSetting=bar, whatToShow='TRADES', useRTH=True, formatDate=2
+        )
+        return self.bar_cache.update(contract.conId, bar, bars, full_fetch=(request_duration == duration))
+
+    @timed_op('daily_bars')
+    def _fetch_daily_bars(self, contract, days='60 D'):
+        return self._fetch_bars(contract, days, '1 day')
+
+    @timed_op('intraday_bars')
+    def _fetch_intraday_bars(self, contract, duration='2 D', bar='30 mins'):
+        return self._fetch_bars(contract, duration, bar)
+
+    @timed_op('daily_bars')
+    async def _fetch_daily_bars_async(self, contract, days='60 D'):
+        return await self._fetch_bars_async(contract, days, '1 day')
+
+    @timed_op('intraday_bars')
+    async def _fetch_intraday_bars_async(self, contract, duration='2 D', bar='30 mins'):
+        return await self._fetch_bars_async(contract, duration, bar)
+
+    # ---------- Intraday bars from real-time streams ----------
+    def _streamed_intraday_bars(self, contract):
+        """Warm stream bars for the intraday gate, or None; True as second value when a stream should be subscribed"""
+        streams = self.intraday_streams
+        if streams is None:
+            return None, False
+        bars = streams.bars(contract.conId)
+        if bars is not None:
+            self.metrics.inc('intraday_bars_streamed_total')
+            return bars, False
+        # Subscribe before the seeding fetch so the stream overlaps the history it extends
+        return None, streams.wants(contract.conId) and self.pacer.try_acquire_lines(1)
+
+    def _intraday_bars(self, contract):
+        """
+        Intraday bars for the ATR gate: from the contract's real-time bar stream once it is
+        warm (no historical request), else the '2 D' historical fetch, which seeds the stream.
+        """
+        bars, subscribe = self._streamed_intraday_bars(contract)
+        if bars is not None:
+            return bars
+        if subscribe:
+            self._check_hist_rate_limit(contract, 'realtime', '5 secs')
+            self._subscribe_intraday_stream(contract)
+        bars = self._fetch_intraday_bars(contract, duration='2 D', bar=self.intraday_bar)
+        self._seed_intraday_stream(contract, bars)
+        return bars
+
+    async def _intraday_bars_async(self, contract):
+        bars, subscribe = self._streamed_intraday_bars(contract)
+        if bars is not None:
+            return bars
+        if subscribe:
+            await self._check_hist_rate_limit_async(contract, 'realtime', '5 secs')
+            self._subscribe_intraday_stream(contract)
+        bars = await self._fetch_intraday_bars_async(contract, duration='2 D', bar=self.intraday_bar)
+        self._seed_intraday_stream(contract, bars)
+        return bars
+
+    def _seed_intraday_stream(self, contract, bars):
+        if self.intraday_streams is None or not bars:
+            return
+        # A cache hit is as old as the request that filled it; a stream newer than that leaves a gap
+        fetched_at = self.bar_cache.fetched_at(contract.conId, self.intraday_bar) if self.bar_cache is not None else None
+        self.intraday_streams.seed(contract.conId, bars, fetched_at)
+
+    def _subscribe_intraday_stream(self, contract):
+        try:
+            self.intraday_streams.subscribe(contract)
+        except Exception as e:
+            # Raised before anything reached TWS (e.g. a client without real-time bars): don't retry per symbol
+            self.pacer.release_lines(1)
+            self.intraday_streams = None
+            print(f"⚠️ Real-time bars unavailable ({e}); intraday ATR stays on historical bars")
+
+    def _reset_intraday_streams(self):
+        if self.intraday_streams is not None and self.engine is None:
+            self.pacer.release_lines(self.intraday_streams.reset())
+
+    @staticmethod
+    def _wilder_atr(bars, period=14):
+        if len(bars) < period + 1:
+            return None
+        trs = []
+        for i in range(1, len(bars)):
+            high = bars[i].high
+            low = bars[i].low
+            prev_close = bars[i-1].close
+            tr = max(high - low, abs(high - prev_close), abs(low - prev_close))
+            trs.append(tr)
+        if len(trs) < period:
+            return None
+        atr = sum(trs[:period]) / period
+        for tr in trs[period:]:
+            atr = (atr * (period - 1) + tr) / period
+        return atr
+
+    def _atr(self, contract, bars, bar_size, period):
+        """Wilder ATR via the per-symbol incremental state; only bars newer than the state are folded in"""
+        if contract is None or not contract.conId:
+            return self._wilder_atr(bars, period=period)
+        return self.atr_store.atr(contract.conId, bar_size, bars, period)
+
+    @staticmethod
+    def _atr_pct(atr, price):
+        return (atr / price) * 100.0 if atr and price else None
+
+    @timed_op('stock_data')
+    def get_stock_data(self, symbol):
+        """Current price, 5D hi/lo, daily bars (for ATR)."""
+        try:
+            contract = ib.Stock(symbol, 'SMART', 'USD')
+            self._qualify(contract)
+
+            # Live price
+            (t,), _ = self._stream_market_data([contract], stock_price_ready, self.quote_timeout, 'underlying')
+            price = t.marketPrice() or t.last
+            if not price or price <= 0:
+                return None, None, None, None, None
+
+            # Daily bars for ATR + 5D hi/lo
+            bars = self._fetch_daily_bars(contract, days='60 D')
+            return self._summarize_daily_bars(price, bars, contract)
+        except Exception as e:
+            print(f"❌ {symbol} data error: {e}")
+            return None, None, None, None, None
+
+    @timed_op('stock_data')
+    async def get_stock_data_async(self, symbol):
+        """Async variant of get_stock_data built on the ib_insync *Async API."""
+        try:
+            contract = ib.Stock(symbol, 'SMART', 'USD')
+            await self._qualify_async(contract)
+
+            (t,), _ = await self._stream_market_data_async([contract], stock_price_ready, self.quote_timeout, 'underlying')
+            price = t.marketPrice() or t.last
+            if not price or price <= 0:
+                return None, None, None, None, None
+
+            bars = await self._fetch_daily_bars_async(contract, days='60 D')
+            return self._summarize_daily_bars(price, bars, contract)
+        except Exception as e:
+            print(f"❌ {symbol} data error: {e}")
+            return None, None, None, None, None
+
+    @staticmethod
+    def _summarize_daily_bars(price, bars, contract):
+        if len(bars) < 15:
+            return price, None, None, None, contract
+
+        last5 = bars[-5:]
+        high_5d = max(b.high for b in last5)
+        low_5d = min(b.low for b in last5)
+
+        return price, high_5d, low_5d, bars, contract
+
+    # ---------- Filters ----------
+    def passes_daily_atr_filters(self, atr, price):
+        if atr is None or price is None or price <= 0:
+            return False, "No ATR", None
+        reasons = []
+        ok = True
+
+        atr_pct = self._atr_pct(atr, price)
+        if self.min_atr_pct is not None:
+            if (atr_pct or 0) < self.min_atr_pct:
+                ok = False
+                reasons.append(f"ATR% {atr_pct:.2f}% < {self.min_atr_pct:.2f}%")
+            else:
+                reasons.append(f"ATR% {atr_pct:.2f}% ≥ {self.min_atr_pct:.2f}%")
+
+        if self.min_abs_atr is not None:
+            if atr < self.min_abs_atr:
+                ok = False
+                reasons.append(f"ATR ${atr:.2f} < ${self.min_abs_atr:.2f}")
+
+        if price < self.low_price_threshold:
+            if atr < self.min_abs_atr_low_price:
+                ok = False
+                reasons.append(f"Low-price floor: ATR ${atr:.2f} < ${self.min_abs_atr_low_price:.2f}")
+
+        return ok, "; ".join(reasons), atr_pct
+
+    def passes_intraday_atr_gate(self, contract, price):
+        if not self.use_intraday_atr:
+            return True, "Intraday gate disabled", None, None
+        try:
+            intrabars = self._intraday_bars(contract)
+            return self._evaluate_intraday_bars(intrabars, price, contract)
+        except Exception as e:
+            return True, f"Intraday ATR gate skipped (error: {e})", None, None
+
+    async def passes_intraday_atr_gate_async(self, contract, price):
+        if not self.use_intraday_atr:
+            return True, "Intraday gate disabled", None, None
+        try:
+            intrabars = await self._intraday_bars_async(contract)
+            return self._evaluate_intraday_bars(intrabars, price, contract)
+        except Exception as e:
+            return True, f"Intraday ATR gate skipped (error: {e})", None, None
+
+    def _evaluate_intraday_bars(self, intrabars, price, contract=None):
+        if len(intrabars) < self.intraday_period + 1:
+            return True, "Not enough intraday bars; skipping gate", None, None
+        iatr = self._atr(contract, intrabars, self.intraday_bar, self.intraday_period)
+        iatr_pct = self._atr_pct(iatr, price)
+        if iatr_pct is None or iatr_pct < self.intraday_min_atr_pct:
+            return False, f"Intraday ATR% {0 if iatr_pct is None else iatr_pct:.2f}% < {self.intraday_min_atr_pct:.2f}%", iatr, iatr_pct
+        return True, f"Intraday ATR: ${iatr:.2f} ({iatr_pct:.2f}%) ≥ {self.intraday_min_atr_pct:.2f}%", iatr, iatr_pct
+
+    def is_pullback_recovery_candidate(self, price, high_5d, low_5d):
+        if not all([price, high_5d, low_5d]):
+            return False, "No data"
+        pullback = ((high_5d - price) / high_5d) * 100
+        recovery = ((price - low_5d) / low_5d) * 100
+        if 3 <= pullback <= 15 and recovery >= 1:
+            return True, f"Pullback {pullback:.1f}%, Recovery {recovery:.1f}%"
+        return False, f"Pullback {pullback:.1f}%, Recovery {recovery:.1f}%"
+
+    def _check_daily_gate(self, symbol, price, high_5d, low_5d, bars, contract=None):
+        """Price sanity + daily ATR filters. Returns (ok, atr, atr_pct)."""
+        if not price:
+            print(f"❌ Could not get price data for {symbol}")
+            self._observe_gates(symbol)
+            return False, None, None
+        print(f"📈 {symbol} Current: ${price:.2f}")
+        if high_5d and low_5d:
+            print(f"📊 5D High: ${high_5d:.2f}, Low: ${low_5d:.2f}")
+
+        # Daily ATR filters
+        if not bars:
+            print("❌ No daily bars for ATR")
+            self._observe_gates(symbol, price, high_5d, low_5d)
+            return False, None, None
+        atr = self._atr(contract, bars, '1 day', 14)
+        ok_daily, daily_reason, atr_pct = self.passes_daily_atr_filters(atr, price)
+        self._observe_gates(symbol, price, high_5d, low_5d, atr_pct)
+        print(f"📐 Daily ATR check: {daily_reason}")
+        if not ok_daily:
+            print("❌ Fails daily ATR filters")
+            return False, atr, atr_pct
+        return True, atr, atr_pct
+
+    def _check_structure(self, price, high_5d, low_5d):
+        # Pullback/Recovery structure
+        pullback_ok, reason = self.is_pullback_recovery_candidate(price, high_5d, low_5d)
+        print(f"📋 Structure: {reason}")
+        if not pullback_ok:
+            print("❌ Not a recovery candidate")
+            return False
+        print("✅ Structure good; proceeding to options")
+        return True
+
+    # ---------- Option quotes ----------
+    def _option_data_request(self):
+        """(generic ticks, readiness predicate) for option quotes under the current greeks source"""
+        ready = READY[self.use_model_greeks, self.filters_on_volume]
+        return ('106' if self.use_model_greeks else ''), ready
+
+    def _option_contracts(self, symbol, expiration, strikes):
+        """
+        Call contracts for one expiration or a list of them, as one batch; batches wider
+        than the market data lines are quoted in waves (see _stream_tickers).
+        """
+        expirations = [expiration] if isinstance(expiration, str) else list(expiration)
+        return [ib.Option(symbol, exp, k, 'C', 'SMART') for exp in expirations for k in strikes]
+
+    def _fetch_option_quotes(self, symbol, expiration, strikes):
+        generic_ticks, ready = self._option_data_request()
+        return self._request_option_quotes(self._option_contracts(symbol, expiration, strikes), generic_ticks, ready)
+
+    async def _fetch_option_quotes_async(self, symbol, expiration, strikes):
+        generic_ticks, ready = self._option_data_request()
+        return await self._request_option_quotes_async(
+            symbol, self._option_contracts(symbol, expiration, strikes), generic_ticks, ready)
+
+    def _request_option_quotes(self, contracts, generic_ticks, ready):
+        """Qualify and quote a batch of option contracts through the line pool; returns their quote frame"""
+        qualified = self._qualify(*contracts)
+        tickers, wait = self._stream_market_data(qualified, ready, self.option_timeout, 'option', generic_ticks)
+        print(describe_wait(wait, 'option tickers'))
+        quotes = self._collect_option_quotes(tickers)
+        if contracts:
+            self._record_quotes(contracts[0].symbol, quotes)
+        return quotes
+
+    async def _request_option_quotes_async(self, symbol, contracts, generic_ticks, ready):
+        qualified = await self._qualify_async(*contracts)
+        tickers, wait = await self._stream_market_data_async(qualified, ready, self.option_timeout, 'option', generic_ticks)
+        if wait.missing:
+            print(f"{symbol}: {describe_wait(wait, 'option tickers')}")
+        quotes = self._collect_option_quotes(tickers)
+        self._record_quotes(symbol, quotes)
+        return quotes
+
+    def _record_quotes(self, symbol, quotes):
+        """Append a fetched chain snapshot to the Parquet store"""
+        if self.snapshots is None:
+            return
+        try:
+            self.snapshots.append_quotes(symbol, quotes)
+        except Exception as e:
+            print(f"⚠️ {symbol}: snapshot not stored ({e})")
+
+    def _collect_option_quotes(self, tickers):
+        """Raw quote fields off the quoted tickers (their lines are already released); all math happens column-wise later"""
+        quotes = {'con_id': [], 'strike': [], 'expiration': [], 'bid': [], 'ask': [], 'last': [],
+                  'bid_size': [], 'ask_size': [], 'volume': [], 'open_interest': [], 'delta': [], 'iv': [],
+                  'gamma': [], 'vega': [], 'theta': [], 'und_price': []}
+        for t in tickers:
+            try:
+                c = t.contract
+                mg = t.modelGreeks
+                quotes['con_id'].append(c.conId or 0)
+                quotes['strike'].append(c.strike)
+                quotes['expiration'].append(c.lastTradeDateOrContractMonth)
+                quotes['bid'].append(t.bid if t.bid and t.bid > 0 else 0)
+                quotes['ask'].append(t.ask if t.ask and t.ask > 0 else 0)
+                quotes['last'].append(t.last if t.last and t.last > 0 else 0)
+                quotes['bid_size'].append(t.bidSize if t.bidSize == t.bidSize else np.nan)
+                quotes['ask_size'].append(t.askSize if t.askSize == t.askSize else np.nan)
+                quotes['volume'].append(t.volume or 0)
+                oi = getattr(t, 'optOpenInterest', None)
+                quotes['open_interest'].append(oi if oi and oi == oi else 0.0)  # unset (NaN) without tick 101, often 0 intraday; keep soft
+                quotes['delta'].append(abs(mg.delta) if (mg and mg.delta is not None) else np.nan)
+                quotes['iv'].append(mg.impliedVol if (mg and mg.impliedVol and mg.impliedVol > 0) else np.nan)
+                # Kept for the snapshot store only
+                quotes['gamma'].append(mg.gamma if (mg and mg.gamma is not None) else np.nan)
+                quotes['vega'].append(mg.vega if (mg and mg.vega is not None) else np.nan)
+                quotes['theta'].append(mg.theta if (mg and mg.theta is not None) else np.nan)
+                quotes['und_price'].append(mg.undPrice if (mg and mg.undPrice is not None) else np.nan)
+            except Exception:
+                # keep columns aligned if a ticker is malformed halfway through
+                n = min(len(v) for v in quotes.values())
+                for v in quotes.values():
+                    del v[n:]
+        return pd.DataFrame(quotes)
+
+    def _fill_missing_greeks(self, q, mid, price, T_years):
+        """Local IV solve (and BS delta) for rows without model greeks; returns (iv, delta) arrays"""
+        iv = q['iv'].to_numpy(dtype=float)
+        delta = q['delta'].to_numpy(dtype=float)
+        missing = np.isnan(iv)
+        if missing.any():
+            strikes = q['strike'].to_numpy(dtype=float)
+            solved = bs_pricing.implied_vol(mid.to_numpy()[missing], price, strikes[missing], T_years[missing], r=self.risk_free_rate)
+            iv = iv.copy()
+            iv[missing] = solved
+            print(f"🧮 Solved IV locally for {int((~np.isnan(solved)).sum())}/{int(missing.sum())} options without model greeks")
+        no_delta = np.isnan(delta) & ~np.isnan(iv)
+        if no_delta.any():
+            delta = delta.copy()
+            delta[no_delta] = bs_pricing.black_scholes(
+                price, q['strike'].to_numpy(dtype=float)[no_delta], T_years[no_delta], iv[no_delta], r=self.risk_free_rate
+            )['delta']
+        return iv, delta
+
+    # ---------- Option stage ----------
+    def _options_stage(self, symbol, contract, price, high_5d, low_5d, atr, atr_pct, iatr, iatr_pct):
+        """Everything after the gates: chain, strikes, quotes and scoring for one symbol"""
+        self._gates_passed.add(symbol)
+        chains = self._option_chains(symbol, contract)
+        exp, strikes = self._option_targets(symbol, chains, price)
+        if not exp or not strikes:
+            return None
+        quotes = self._fetch_option_quotes(symbol, exp, strikes)
+        df = self._option_rows(symbol, quotes, price, high_5d, low_5d)
+        return self._finalize_options(df, atr, atr_pct, iatr, iatr_pct)
+
+    async def _options_stage_async(self, symbol, contract, price, high_5d, low_5d, atr, atr_pct, iatr, iatr_pct):
+        self._gates_passed.add(symbol)
+        chains = await self._option_chains_async(symbol, contract)
+        exp, strikes = self._option_targets(symbol, chains, price)
+        if not exp or not strikes:
+            return None
+        quotes = await self._fetch_option_quotes_async(symbol, exp, strikes)
+        df = self._option_rows(symbol, quotes, price, high_5d, low_5d)
+        return self._finalize_options(df, atr, atr_pct, iatr, iatr_pct)
+
+    @abc.abstractmethod
+    def _option_targets(self, symbol, chains, price):
+        """(expiration or list of them, strikes) to quote from the symbol's chains, or (None, None)"""
+
+    @abc.abstractmethod
+    def _option_rows(self, symbol, quotes, price, high_5d, low_5d):
+        """Candidate frame (one row per contract) from a _collect_option_quotes frame, or None; no IB calls"""
+
+    @abc.abstractmethod
+    def _finalize_options(self, df, atr, atr_pct, iatr, iatr_pct):
+        """_option_rows' frame with the gate values added, filtered, scored and ranked best first; or None"""
+
+    @abc.abstractmethod
+    def _score_contracts(self, df, normalization='symbol'):
+        """df (one or many symbols' candidates) with its score column set, scaled per universe_scoring.NORMALIZATIONS"""
+
+    def _report_mask(self, df):
+        """Rows good enough for the consolidated report"""
+        return pd.Series(True, index=df.index)
+
+    # ---------- Universe ranking ----------
+    def rank_universe(self, found):
+        """
+        Every candidate of a scan ({symbol: ranked frame}) rescored as one frame with
+        score_normalization and sorted once. Returns (universe, found): the universe frame,
+        best first, and found with each symbol's frame taken from it so both agree.
+        With 'symbol' normalization the scores and per-symbol order are unchanged.
+        """
+        frames = [df for df in found.values() if df is not None and not df.empty]
+        if not frames:
+            return pd.DataFrame(), found
+        universe = self._score_contracts(pd.concat(frames), self.score_normalization)
+        # Stable, so ties keep each symbol's own ranking and the watchlist order
+        universe = universe.sort_values(self.rank_by, ascending=self.rank_ascending, kind='mergesort')
+        by_symbol = dict(tuple(universe.groupby('symbol', sort=False)))
+        return universe, {symbol: by_symbol[symbol] for symbol in found if symbol in by_symbol}
+
+    def consolidated_picks(self, universe):
+        """Best contract per symbol that meets the report thresholds, in universe order (universe_top_n caps it)"""
+        if universe.empty:
+            return universe
+        best = universe.drop_duplicates('symbol')
+        best = best[self._report_mask(best)]
+        if self.universe_top_n:
+            best = best.head(self.universe_top_n)
+        return best.reset_index(drop=True)
+
+    # ---------- Reporting ----------
+    @staticmethod
+    def _slack_line(symbol, best):
+        """One Slack result line for a symbol's best row"""
+        return (f"• {symbol} ${best['strike']:.0f}C @ ${best['mid_price']:.2f} | "
+                f"Exp: {slack_notify.short_expiration(best['expiration'])}")
+
+    def _send_to_slack(self, title, found, filename=None):
+        """Queue results for Slack if a webhook is configured (see slack_notify.send_to_slack)"""
+        slack_notify.send_to_slack(title, found, self._slack_line, filename, emoji=self.slack_emoji,
+                                   found_text=self.slack_found_text, empty_text=self.slack_empty_text)
+
+    def _store_picks(self, picks, taken_at=None):
+        """Append the consolidated report rows to the snapshot store"""
+        if self.snapshots is not None:
+            self.snapshots.append_picks(self.name, picks, taken_at)
+
+    def _flush_snapshots(self):
+        if self.snapshots is None or self.engine is not None:
+            return
+        try:
+            if self.snapshots.flush():
+                print(f"🗄️  Option snapshots: {self.snapshots.summary()}")
+        except Exception as e:
+            print(f"⚠️ Option snapshots not written: {e}")
+
+    def _export_metrics(self):
+        if self.engine is not None:
+            return
+        print(self.metrics.summary())
+        if self.metrics_path:
+            self.metrics.write_prometheus(self.metrics_path)
+            print(f"📏 Metrics written to {self.metrics_path}")
+
+    def disconnect(self):
+        self._flush_snapshots()
+        self._reset_intraday_streams()
+        self.ib.disconnect()
+        print("\n👋 Disconnected from TWS")
@@ -0,0 +1,134 @@
+import importlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import current_process
+
+from ib_pacing import SharedPacer, start_pacer_server
+
+# name -> (module, class, first client id); shard k connects with first client id + k
+SCANNERS = {
+    'cheap': ('cheap_calls_scanner', 'CheapOptionsScanner', 5),
+    'high_probability': ('high_probability_calls_scanner', 'PullbackRecoveryScannerV2', 45),
+}
+
+
+def load_watchlist(path='watchlist.txt'):
+    with open(path, 'r') as f:
+        return [
+            line.strip().upper()
+            for line in f
+            if line.strip() and not line.strip().startswith('#')
+        ]
+
+
+def shard_symbols(symbols, n_shards):
+    """Round-robin split so every shard gets a similar mix of the watchlist."""
+    n_shards = max(1, min(int(n_shards), len(symbols)))
+    return [symbols[k::n_shards] for k in range(n_shards)]
+
+
+def _scanner_class(name):
+    module, cls, _ = SCANNERS[name]
+    return getattr(importlib.import_module(module), cls)
+
+
+def _scan_shard(name, scanner_kwargs, client_id, symbols, pacer_address, pacer_authkey, pacer_kwargs, max_in_flight):
+    """Worker process: own TWS connection, shared pacing budget, no CSV/Slack of its own."""
+    pacer = SharedPacer(pacer_address, authkey=pacer_authkey, **pacer_kwargs)
+    scanner = _scanner_class(name)(client_id=client_id, pacer=pacer, **scanner_kwargs)
+    try:
+        if max_in_flight > 1 and hasattr(scanner, 'scan_watchlist_async'):
+            found = scanner.scan_shard(symbols, max_in_flight=max_in_flight)
+        else:
+            found = scanner.scan_shard(symbols)
+        stats = {
+            'hist_requests': scanner.hist_request_count,
+            'message_permits': pacer.message_permits,
+            'waits': pacer.waits,
+            'total_wait_secs': pacer.total_wait_secs,
+            'metrics': scanner.metrics.snapshot(),
+        }
+        return found, stats
+    finally:
+        scanner.disconnect()
+
+
+def run_sharded_scan(name, symbols, n_shards=4, scanner_kwargs=None, pacer_kwargs=None, max_in_flight=1):
+    """
+    Split the watchlist into shards, scan each one in its own process on its own
+    client ID, and write a single consolidated CSV (and Slack post) for the whole run.
+
+    All workers draw historical requests and market data lines from one shared
+    IBPacer, so the account-wide IB limits hold no matter how many shards run.
+    """
+    scanner_kwargs = dict(scanner_kwargs or {})
+    pacer_kwargs = dict(pacer_kwargs or {})
+    first_client_id = scanner_kwargs.pop('client_id', SCANNERS[name][2])
+    shards = shard_symbols(symbols, n_shards)
+
+    manager = start_pacer_server(**pacer_kwargs)
+    authkey = bytes(current_process().authkey)
+    try:
+        print(f"🧩 {len(symbols)} symbols -> {len(shards)} shards "
+              f"(client IDs {first_client_id}-{first_client_id + len(shards) - 1})")
+        with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+            futures = [
+                pool.submit(_scan_shard, name, scanner_kwargs, first_client_id + k, shard,
+                            manager.address, authkey, pacer_kwargs, max_in_flight)
+                for k, shard in enumerate(shards)
+            ]
+            results = []
+            for k, fut in enumerate(futures):
+                try:
+                    results.append(fut.result())
+                except Exception as e:
+                    print(f"❌ Shard {k} (client {first_client_id + k}) failed: {e}")
+
+        # Merge back in watchlist order so the report matches a single-process scan
+        found_by_symbol = {}
+        for found, _ in results:
+            found_by_symbol.update(found)
+        found = {s: found_by_symbol[s] for s in symbols if s in found_by_symbol}
+
+        # Report-only instance: same settings, no TWS connection, no caches
+        report_kwargs = dict(scanner_kwargs, bar_cache_path=None, chain_cache_path=None)
+        reporter = _scanner_class(name)(
+            client_id=first_client_id, auto_connect=False,
+            pacer=SharedPacer(manager.address, authkey=authkey, **pacer_kwargs), **report_kwargs,
+        )
+        for _, stats in results:
+            reporter.hist_request_count += stats['hist_requests']
+            reporter.pacer.message_permits += stats['message_permits']
+            reporter.pacer.waits += stats['waits']
+            reporter.pacer.total_wait_secs += stats['total_wait_secs']
+            reporter.metrics.merge(stats['metrics'])
+        found = reporter._report_results(found)
+        print(f"⏱️  Pacing (all shards): {reporter.pacer.summary()}")
+        return found
+    finally:
+        manager.shutdown()
+
+
+def main():
+    # Scanner to run and how many worker processes / client IDs to spread it over
+    name = 'cheap'
+    n_shards = min(4, os.cpu_count() or 1)
+    max_in_flight = 4  # per shard, for scanners with an async path
+
+    try:
+        watchlist = load_watchlist('watchlist.txt')
+        print(f"📋 Loaded {len(watchlist)} symbols from watchlist.txt")
+    except FileNotFoundError:
+        print("❌ watchlist.txt not found")
+        return
+
+    results = run_sharded_scan(
+        name, watchlist, n_shards=n_shards, max_in_flight=max_in_flight,
+        scanner_kwargs=dict(port=7496, respect_rate_limits=True, delay_between_symbols=2.0),
+    )
+    print("\n🎉 SHARDED SCAN COMPLETE!")
+    print(f"Found candidates in {len(results)} symbols")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import asyncio
+import atexit
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+    import requests
+
+try:
+    from config import SLACK_WEBHOOK_URL
+except ImportError:
+    print("⚠️ Warning: config.py not found. Slack notifications disabled.")
+    SLACK_WEBHOOK_URL = None
+
+# Slack limits: 50 blocks per message, 3000 characters per section text
+MAX_BLOCKS = 50
+MAX_SECTION_CHARS = 3000
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def chunk_lines(lines, max_chars=MAX_SECTION_CHARS):
+    """Group lines into texts of at most max_chars (a longer single line is cut)"""
+    chunks, current, size = [], [], 0
+    for line in lines:
+        line = line[:max_chars]
+        if current and size + len(line) + 1 > max_chars:
+            chunks.append('\n'.join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
+
+
+def results_messages(title, lines, footer=None, max_blocks=MAX_BLOCKS, max_chars=MAX_SECTION_CHARS):
+    """
+    Block Kit payloads carrying every line: a header, as many sections as fit, and a
+    context footer per message; results that don't fit go into follow-up messages.
+    """
+    sections = chunk_lines(lines, max_chars) or ['_No results_']
+    per_message = max(1, max_blocks - 2)
+    parts = [sections[i:i + per_message] for i in range(0, len(sections), per_message)]
+    footer = footer or datetime.now().strftime('%Y-%m-%d %H:%M ET')
+    messages = []
+    for n, part in enumerate(parts, 1):
+        heading = title if len(parts) == 1 else f"{title} ({n}/{len(parts)})"
+        blocks = [{'type': 'header', 'text': {'type': 'plain_text', 'text': heading[:150], 'emoji': True}}]
+        blocks += [{'type': 'section', 'text': {'type': 'mrkdwn', 'text': text}} for text in part]
+        blocks.append({'type': 'context', 'elements': [{'type': 'mrkdwn', 'text': footer}]})
+        messages.append({'text': heading, 'blocks': blocks})
+    return messages
+
+
+class SlackNotifier:
+    """
+    Non-blocking Slack webhook delivery for the scanners.
+
+    Messages are queued from any thread and posted by a background event loop over one
+    reusable HTTP session (aiohttp, or a requests.Session in a worker thread without it).
+    429s wait for Retry-After (exponential backoff with jitter otherwise) and 5xx responses
+    are retried the same way; other errors are reported and dropped. Delivery is in order.
+    flush() waits for the queue to drain; it also runs at interpreter exit.
+    """
+
+    def __init__(self, webhook_url, max_retries=5, backoff_secs=1.0, max_backoff_secs=30.0, timeout=10.0):
+        self.webhook_url = webhook_url
+        self.max_retries = int(max_retries)
+        self.backoff_secs = float(backoff_secs)
+        self.max_backoff_secs = float(max_backoff_secs)
+        self.timeout = float(timeout)
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self._loop = None
+        self._queue = None
+        self._session = None
+        self._thread = None
+        self._worker_task = None
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._start_lock = threading.Lock()
+
+    # ---------- Public API ----------
+    def post(self, payload):
+        """Queue one webhook payload; returns immediately"""
+        self._start()
+        with self._idle:
+            self._pending += 1
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, payload)
+
+    def send_results(self, title, lines, footer=None):
+        """Queue every result line, chunked into as many Block Kit messages as needed"""
+        messages = results_messages(title, lines, footer)
+        for message in messages:
+            self.post(message)
+        return len(messages)
+
+    def send_text(self, text):
+        self.post({'text': text})
+
+    def flush(self, timeout=30.0):
+        """Wait until everything queued so far was delivered (or gave up); returns False on timeout"""
+        deadline = time.time() + timeout
+        with self._idle:
+            while self._pending:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def close(self, timeout=30.0):
+        self.flush(timeout)
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout=5)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._loop.close()
+            self._loop = None
+
+    def summary(self):
+        return f"sent {self.sent} | failed {self.failed} | retries {self.retries}"
+
+    # ---------- Background loop ----------
+    def _start(self):
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            ready = threading.Event()
+
+            def run():
+                self._loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(self._loop)
+                self._queue = asyncio.Queue()
+                self._worker_task = self._loop.create_task(self._worker())
+                ready.set()
+                self._loop.run_forever()
+
+            self._thread = threading.Thread(target=run, name='slack-notifier', daemon=True)
+            self._thread.start()
+            ready.wait()
+            atexit.register(self.flush)
+
+    async def _worker(self):
+        while True:
+            payload = await self._queue.get()
+            try:
+                if await self._deliver(payload):
+                    self.sent += 1
+                else:
+                    self.failed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"⚠️ Could not send to Slack: {e}")
+            finally:
+                with self._idle:
+                    self._pending -= 1
+                    self._idle.notify_all()
+
+    async def _deliver(self, payload):
+        for attempt in range(self.max_retries + 1):
+            status, retry_after = await self._post(payload)
+            if status == 200:
+                return True
+            if status not in RETRY_STATUSES or attempt == self.max_retries:
+                print(f"⚠️ Slack notification failed: {status}")
+                return False
+            self.retries += 1
+            delay = retry_after if retry_after is not None else min(
+                self.max_backoff_secs, self.backoff_secs * 2 ** attempt) * (0.5 + random.random() / 2)
+            await asyncio.sleep(delay)
+        return False
+
+    async def _post(self, payload):
+        """(status, Retry-After seconds or None) for one POST"""
+        if aiohttp is not None:
+            if self._session is None:
+                self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+            async with self._session.post(self.webhook_url, json=payload) as response:
+                await response.read()
+                return response.status, _retry_after(response.headers)
+        if self._session is None:
+            self._session = requests.Session()
+        response = await asyncio.to_thread(self._session.post, self.webhook_url, json=payload, timeout=self.timeout)
+        return response.status_code, _retry_after(response.headers)
+
+    async def _shutdown(self):
+        self._worker_task.cancel()
+        if self._session is not None:
+            closing = self._session.close()
+            if asyncio.iscoroutine(closing):
+                await closing
+            self._session = None
+
+
+def _retry_after(headers):
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+_notifiers = {}
+
+
+def notifier_for(webhook_url):
+    """One shared notifier (queue, session) per webhook URL"""
+    if webhook_url not in _notifiers:
+        _notifiers[webhook_url] = SlackNotifier(webhook_url)
+    return _notifiers[webhook_url]
+
+
+def short_expiration(exp):
+    """'YYYYMMDD' -> 'MM/DD' for result lines; anything else as is"""
+    exp = str(exp)
+    return f"{exp[4:6]}/{exp[6:]}" if len(exp) == 8 else exp
+
+
+def send_to_slack(scanner_name, found_dict, format_line, filename=None, emoji='🎲', found_text='opportunities',
+                  empty_text='No opportunities found in current market conditions', webhook_url=None):
+    """
+    Queue scanner results for Slack: format_line(symbol, best row) for every symbol, chunked
+    over as many messages as needed. No-op without a webhook (config.SLACK_WEBHOOK_URL by default).
+    """
+    webhook_url = webhook_url or SLACK_WEBHOOK_URL
+    if not webhook_url:
+        return
+
+    notifier = notifier_for(webhook_url)
+    if not found_dict:
+        notifier.send_results(f"{emoji} {scanner_name}", [empty_text])
+        return
+
+    lines = [format_line(symbol, df.iloc[0]) for symbol, df in found_dict.items()]
+    footer = f"File: {filename}" if filename else None
+    n = notifier.send_results(f"{emoji} {scanner_name} - Found {len(found_dict)} {found_text}", lines, footer)
+    print(f"📨 {len(lines)} results queued for Slack ({n} message{'s' if n > 1 else ''})")
+
+
+class SlackStub:
+    """
+    Local stand-in for a Slack incoming webhook, for tests and offline runs.
+
+    Records every JSON payload in .payloads; the first rate_limited requests get a 429
+    with Retry-After: retry_after, to exercise the backoff.
+    """
+
+    def __init__(self, port=0, rate_limited=0, retry_after=0.1, host='127.0.0.1'):
+        self.payloads = []
+        self.requests = 0
+        self.rate_limited = int(rate_limited)
+        self.retry_after = retry_after
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                stub.requests += 1
+                if stub.requests <= stub.rate_limited:
+                    self.send_response(429)
+                    self.send_header('Retry-After', str(stub.retry_after))
+                    self.end_headers()
+                    return
+                stub.payloads.append(json.loads(body))
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain')
+                self.end_headers()
+                self.wfile.write(b'ok')
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self.url = f"http://{host}:{self._server.server_address[1]}/webhook"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,170 @@
+import os
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = ds = None
+
+# Raw quote columns as collected by ScannerBase._collect_option_quotes
+QUOTE_FIELDS = [
+    ('con_id', 'int64'),
+    ('strike', 'float64'),
+    ('bid', 'float64'),
+    ('ask', 'float64'),
+    ('last', 'float64'),
+    ('bid_size', 'float64'),
+    ('ask_size', 'float64'),
+    ('volume', 'float64'),
+    ('open_interest', 'float64'),
+    ('iv', 'float64'),
+    ('delta', 'float64'),
+    ('gamma', 'float64'),
+    ('vega', 'float64'),
+    ('theta', 'float64'),
+    ('und_price', 'float64'),
+]
+QUOTE_PARTITIONS = ['date', 'underlying', 'expiry']
+PICK_PARTITIONS = ['date', 'scanner']
+
+
+def _schema(fields, partitions):
+    return pa.schema(
+        [('snapshot_ts', pa.timestamp('us'))]
+        + [(name, pa.type_for_alias(kind)) for name, kind in fields]
+        + [(name, pa.string()) for name in partitions]
+    )
+
+
+class OptionSnapshotStore:
+    """
+    Append-only Parquet dataset of every option chain snapshot a scan fetches.
+
+    Two tables under path, both hive-partitioned so a backtest can prune by directory:
+      quotes/date=YYYY-MM-DD/underlying=XYZ/expiry=YYYYMMDD/*.parquet
+          every quoted contract with bid/ask/last, sizes, volume, OI, IV and greeks
+      picks/date=YYYY-MM-DD/scanner=NAME/*.parquet
+          the scored rows that went into the consolidated report (the CSV is a view of these)
+
+    Quote frames are turned into Arrow record batches column by column and buffered;
+    flush() (called on report, or once flush_rows are buffered) writes them as new files,
+    so sharded workers can append to the same dataset without coordination.
+    """
+
+    def __init__(self, path='option_snapshots', flush_rows=50_000):
+        if pa is None:
+            raise ImportError("pyarrow is required for the option snapshot store (pip install pyarrow)")
+        self.path = path
+        self.flush_rows = int(flush_rows)
+        self.quote_schema = _schema(QUOTE_FIELDS, QUOTE_PARTITIONS)
+        self._quotes = []
+        self._picks = []
+        self._buffered = 0
+        self.rows_written = 0
+        self.writes = 0
+
+    # ---------- Appending ----------
+    def append_quotes(self, symbol, quotes, taken_at=None):
+        """Buffer one quote frame (see _collect_option_quotes) for an underlying"""
+        n = len(quotes)
+        if not n:
+            return
+        taken_at = taken_at or datetime.now()
+        columns = [pa.array(np.full(n, np.datetime64(taken_at, 'us')))]
+        for name, kind in QUOTE_FIELDS:
+            values = quotes[name].to_numpy(dtype=kind) if name in quotes else np.full(n, np.nan if kind == 'float64' else 0, dtype=kind)
+            columns.append(pa.array(values, type=pa.type_for_alias(kind)))
+        columns.append(pa.array(np.full(n, taken_at.strftime('%Y-%m-%d'), dtype=object), type=pa.string()))
+        columns.append(pa.array(np.full(n, symbol, dtype=object), type=pa.string()))
+        columns.append(pa.array(quotes['expiration'].astype(str).to_numpy(dtype=object), type=pa.string()))
+        self._quotes.append(pa.RecordBatch.from_arrays(columns, schema=self.quote_schema))
+        self._buffered += n
+        if self._buffered >= self.flush_rows:
+            self.flush()
+
+    def append_picks(self, scanner, picks, taken_at=None):
+        """Buffer the consolidated (scored) rows of one scanner report"""
+        if picks is None or picks.empty:
+            return
+        taken_at = taken_at or datetime.now()
+        table = pa.Table.from_pandas(picks.reset_index(drop=True), preserve_index=False)
+        n = table.num_rows
+        table = table.add_column(0, 'snapshot_ts', pa.array(np.full(n, np.datetime64(taken_at, 'us'))))
+        table = table.append_column('date', pa.array(np.full(n, taken_at.strftime('%Y-%m-%d'), dtype=object), type=pa.string()))
+        table = table.append_column('scanner', pa.array(np.full(n, scanner, dtype=object), type=pa.string()))
+        self._picks.append(table)
+
+    # ---------- Writing ----------
+    def _write(self, table, subdir, partitions):
+        ds.write_dataset(
+            table, os.path.join(self.path, subdir), format='parquet',
+            partitioning=partitions, partitioning_flavor='hive',
+            basename_template=f"{datetime.now():%H%M%S}-{uuid.uuid4().hex[:12]}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore',
+        )
+        self.writes += 1
+
+    def flush(self):
+        """Write everything buffered as new Parquet files; returns the number of quote rows written"""
+        written = 0
+        if self._quotes:
+            table = pa.Table.from_batches(self._quotes, schema=self.quote_schema)
+            self._write(table, 'quotes', QUOTE_PARTITIONS)
+            written = table.num_rows
+            self.rows_written += written
+            self._quotes, self._buffered = [], 0
+        for table in self._picks:  # one write per report: each scanner has its own columns
+            self._write(table, 'picks', PICK_PARTITIONS)
+        self._picks = []
+        return written
+
+    def summary(self):
+        return f"{self.rows_written} quote rows in {self.writes} writes under {self.path}/"
+
+
+# ---------- Reading ----------
+def _read(path, partitions, columns=None, schema=None, **equals):
+    """
+    Filtered read of a hive-partitioned table; equals maps partition columns to a value or a
+    list of values. Without a schema the matching files' schemas are unified (picks differ per scanner).
+    """
+    # Partition values stay strings (expiry=20250905 would otherwise be inferred as an integer)
+    partitioning = ds.partitioning(pa.schema([(name, pa.string()) for name in partitions]), flavor='hive')
+    expr = None
+    for name, value in equals.items():
+        if value is None:
+            continue
+        values = [value] if isinstance(value, str) else list(value)
+        term = ds.field(name).isin(values)
+        expr = term if expr is None else expr & term
+    dataset = ds.dataset(path, format='parquet', partitioning=partitioning, schema=schema)
+    if schema is None:
+        fragments = [f.physical_schema for f in dataset.get_fragments(filter=expr)]
+        if fragments:
+            unified = pa.unify_schemas(fragments + [partitioning.schema], promote_options='permissive')
+            dataset = ds.dataset(path, format='parquet', partitioning=partitioning, schema=unified)
+    return dataset.to_table(columns=columns, filter=expr).to_pandas()
+
+
+def read_quotes(path='option_snapshots', date=None, underlying=None, expiry=None, columns=None):
+    """Stored chain snapshots as a DataFrame, pruned by partition (each filter takes a value or a list)"""
+    return _read(os.path.join(path, 'quotes'), QUOTE_PARTITIONS, columns, _schema(QUOTE_FIELDS, QUOTE_PARTITIONS),
+                 date=date, underlying=underlying, expiry=expiry)
+
+
+def read_picks(path='option_snapshots', date=None, scanner=None, columns=None):
+    """Stored consolidated report rows as a DataFrame"""
+    return _read(os.path.join(path, 'picks'), PICK_PARTITIONS, columns, date=date, scanner=scanner)
+
+
+def latest_picks(path='option_snapshots', scanner=None, date=None):
+    """Rows of the most recent report of a scanner (the consolidated CSV view)"""
+    picks = read_picks(path, date=date, scanner=scanner)
+    if picks.empty:
+        return picks
+    latest = picks[picks['snapshot_ts'] == picks['snapshot_ts'].max()]
+    return latest.drop(columns=['snapshot_ts', 'date', 'scanner']).reset_index(drop=True)
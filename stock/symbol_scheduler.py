@@ -0,0 +1,171 @@
+import math
+import sqlite3
+import time
+
+import numpy as np
+
+
+class SymbolScheduler:
+    """
+    Orders a watchlist so the symbols most likely to pass the gates and produce candidates
+    are scanned (and their options priced and alerted) first.
+
+    Per-symbol gate history is kept in SQLite (the bar cache file, like ATRStore; in memory
+    without one): exponentially decayed counts of scans, gate passes and candidates, the
+    current run of consecutive gate failures, and the last observed ATR%, pullback from
+    the 5-day high and recovery from the 5-day low. A symbol's priority combines
+
+      history   decayed pass and candidate rates, smoothed toward `prior` so new symbols
+                are tried early rather than last
+      signals   cheap pre-signals from the last observation, no IB requests: ATR% against
+                the daily gate threshold and the distance of the pullback from the 3-15%
+                window (recovery >= 1% likewise)
+
+    Symbols that failed the gates in each of their last defer_after scans and whose last
+    signals are weak are deferred to the end of the list (still scanned, never dropped).
+    """
+
+    def __init__(self, path=None, half_life_days=10.0, prior=0.5, prior_weight=2.0,
+                 history_weight=0.5, defer_after=5, defer_below=0.25):
+        self.path = path
+        self.half_life_secs = float(half_life_days) * 86400
+        self.prior = float(prior)
+        self.prior_weight = float(prior_weight)
+        self.history_weight = float(history_weight)
+        self.defer_after = int(defer_after)
+        self.defer_below = float(defer_below)
+        self.observations = {}  # symbol -> (atr_pct, pullback_pct, recovery_pct) seen this scan
+        self.deferred = []
+        self.conn = sqlite3.connect(path or ':memory:', timeout=30.0, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS symbol_gates (
+                symbol TEXT PRIMARY KEY,
+                scans REAL NOT NULL,
+                passes REAL NOT NULL,
+                candidates REAL NOT NULL,
+                fails_in_row INTEGER NOT NULL,
+                atr_pct REAL, pullback_pct REAL, recovery_pct REAL,
+                last_scan REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    # ---------- Scoring ----------
+    @staticmethod
+    def _window_signal(value, low, high, scale):
+        """1 inside [low, high], decaying with the distance (percentage points) outside it"""
+        if value is None or not math.isfinite(value):
+            return 0.5
+        distance = max(low - value, value - high, 0.0)
+        return math.exp(-distance / scale)
+
+    def signal(self, atr_pct, pullback_pct, recovery_pct, min_atr_pct=2.0):
+        """Pre-signal in [0, 1] from the last observation; 0.5 when nothing is known"""
+        if atr_pct is None or not math.isfinite(atr_pct):
+            atr_signal = 0.5
+        elif not min_atr_pct:
+            atr_signal = 1.0
+        else:
+            atr_signal = min(1.0, atr_pct / min_atr_pct) ** 2  # ATR% moves slowly: well below the gate stays below
+        structure = self._window_signal(pullback_pct, 3.0, 15.0, 3.0)
+        recovery = self._window_signal(recovery_pct, 1.0, math.inf, 2.0)
+        return atr_signal * structure * recovery
+
+    def _decay(self, last_scan, now):
+        return 0.5 ** (max(0.0, now - last_scan) / self.half_life_secs)
+
+    def _rate(self, hits, n):
+        return (hits + self.prior * self.prior_weight) / (n + self.prior_weight)
+
+    def scores(self, symbols, min_atr_pct=2.0):
+        """{symbol: (priority, deferred)} for the given symbols"""
+        rows = self._rows(symbols)
+        now = time.time()
+        out = {}
+        for symbol in symbols:
+            row = rows.get(symbol)
+            if row is None:
+                out[symbol] = (self.prior, False)
+                continue
+            scans, passes, candidates, fails_in_row, atr_pct, pullback_pct, recovery_pct, last_scan = row
+            k = self._decay(last_scan, now)
+            history = 0.6 * self._rate(passes * k, scans * k) + 0.4 * self._rate(candidates * k, scans * k)
+            signal = self.signal(atr_pct, pullback_pct, recovery_pct, min_atr_pct)
+            priority = self.history_weight * history + (1 - self.history_weight) * signal
+            out[symbol] = (priority, fails_in_row >= self.defer_after and signal < self.defer_below)
+        return out
+
+    def order(self, symbols, min_atr_pct=2.0):
+        """The symbols by descending priority, deferred ones last; ties keep watchlist order"""
+        symbols = list(dict.fromkeys(symbols))
+        scores = self.scores(symbols, min_atr_pct)
+        ranked = sorted(range(len(symbols)), key=lambda i: (scores[symbols[i]][1], -scores[symbols[i]][0], i))
+        self.deferred = [symbols[i] for i in ranked if scores[symbols[i]][1]]
+        return [symbols[i] for i in ranked]
+
+    # ---------- Learning ----------
+    def observe(self, symbol, price=None, high_5d=None, low_5d=None, atr_pct=None):
+        """Gate inputs seen while scanning one symbol (the serial path; see record_scan)"""
+        pullback = (high_5d - price) / high_5d * 100.0 if price and high_5d else None
+        recovery = (price - low_5d) / low_5d * 100.0 if price and low_5d else None
+        self.observations[symbol] = (atr_pct, pullback, recovery)
+
+    def record_scan(self, passed, candidates):
+        """Fold the observed symbols of a finished scan; passed/candidates are symbol collections"""
+        passed, candidates = set(passed), set(candidates)
+        outcomes = [(s, s in passed, s in candidates, *obs) for s, obs in self.observations.items()]
+        self._record(outcomes)
+        self.observations = {}
+
+    def record_screen(self, screen, candidates):
+        """Fold a pre-screen frame (see prescreen.run_prescreen) and the symbols that produced candidates"""
+        candidates = set(candidates)
+        outcomes = [
+            (symbol, bool(row['passed']), symbol in candidates, row['atr_pct'], row['pullback_pct'], row['recovery_pct'])
+            for symbol, row in screen.iterrows()
+        ]
+        self._record(outcomes)
+        self.observations = {}
+
+    def _record(self, outcomes):
+        now = time.time()
+        rows = self._rows([o[0] for o in outcomes])
+        for symbol, passed, candidate, atr_pct, pullback_pct, recovery_pct in outcomes:
+            scans = passes = hits = 0.0
+            fails_in_row = 0
+            if symbol in rows:
+                scans, passes, hits, fails_in_row, *_, last_scan = rows[symbol]
+                k = self._decay(last_scan, now)
+                scans, passes, hits = scans * k, passes * k, hits * k
+            self.conn.execute(
+                "INSERT OR REPLACE INTO symbol_gates "
+                "(symbol, scans, passes, candidates, fails_in_row, atr_pct, pullback_pct, recovery_pct, last_scan) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (symbol, scans + 1, passes + passed, hits + candidate, 0 if passed else fails_in_row + 1,
+                 _float(atr_pct), _float(pullback_pct), _float(recovery_pct), now)
+            )
+        self.conn.commit()
+
+    def _rows(self, symbols):
+        rows = {}
+        symbols = list(symbols)
+        for i in range(0, len(symbols), 500):
+            chunk = symbols[i:i + 500]
+            for row in self.conn.execute(
+                "SELECT symbol, scans, passes, candidates, fails_in_row, atr_pct, pullback_pct, recovery_pct, last_scan "
+                f"FROM symbol_gates WHERE symbol IN ({','.join('?' * len(chunk))})", chunk
+            ):
+                rows[row[0]] = row[1:]
+        return rows
+
+    def summary(self, symbols=None):
+        known = self.conn.execute("SELECT COUNT(*) FROM symbol_gates").fetchone()[0]
+        head = f" | first: {', '.join(symbols[:5])}" if symbols else ""
+        return f"{known} symbols with gate history | {len(self.deferred)} deferred{head}"
+
+    def close(self):
+        self.conn.close()
+
+
+def _float(value):
+    return float(value) if value is not None and np.isfinite(value) else None
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The stock/ modules are flat and imported by bare name, as the scanners and benchmarks do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,148 @@
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from atr_state import ATRState, ATRStore, wilder_atr_batch
+from scanner_base import ScannerBase
+
+PERIOD = 14
+
+
+def _bars(n, seed=0, intraday=False):
+    rng = np.random.default_rng(seed)
+    closes = 50.0 * np.exp(np.cumsum(rng.normal(0.0, 0.02, n)))
+    opens = np.concatenate([[50.0], closes[:-1]])
+    highs = np.maximum(opens, closes) * (1 + rng.uniform(0.0, 0.02, n))
+    lows = np.minimum(opens, closes) * (1 - rng.uniform(0.0, 0.02, n))
+    if intraday:
+        start, step = datetime(2024, 3, 4, 14, 30, tzinfo=timezone.utc), timedelta(minutes=30)
+    else:
+        start, step = date(2024, 1, 2), timedelta(days=1)
+    return [SimpleNamespace(date=start + i * step, open=o, high=h, low=lo, close=c)
+            for i, (o, h, lo, c) in enumerate(zip(opens, highs, lows, closes))]
+
+
+def _fields(state):
+    return (state.atr, state.prev_close, state.seed_sum, state.seed_count, state.last_ts, state.bars)
+
+
+def _assert_same_state(state, cold):
+    assert state.seed_count == cold.seed_count
+    assert state.last_ts == cold.last_ts and state.bars == cold.bars and state.prev_close == cold.prev_close
+    assert state.seed_sum == pytest.approx(cold.seed_sum, rel=1e-12)
+    if cold.atr is None:
+        assert state.atr is None
+    else:
+        assert state.atr == pytest.approx(cold.atr, rel=1e-12)
+
+
+@pytest.mark.parametrize('intraday', [False, True])
+def test_update_matches_wilder_atr_bar_by_bar(intraday):
+    bars = _bars(80, seed=1, intraday=intraday)
+    state = ATRState(PERIOD)
+    for k, bar in enumerate(bars, start=1):
+        atr = state.update(bar)
+        expected = ScannerBase._wilder_atr(bars[:k], PERIOD)
+        if expected is None:
+            assert atr is None
+        else:
+            assert atr == pytest.approx(expected, rel=1e-12)
+        _assert_same_state(state, ATRState.from_bars(bars[:k], PERIOD))
+
+
+def test_update_ignores_old_and_repeated_bars():
+    bars = _bars(30, seed=2)
+    state = ATRState.from_bars(bars, PERIOD)
+    before = _fields(state)
+    assert state.update(bars[-1]) == before[0]
+    assert state.update(bars[10]) == before[0]
+    assert _fields(state) == before
+
+
+@pytest.mark.parametrize('intraday', [False, True])
+def test_extend_matches_cold_rebuild(intraday):
+    bars = _bars(120, seed=3, intraday=intraday)
+    # Start from a short (unseeded) history and extend through overlapping windows of varying step
+    state = ATRState.from_bars(bars[:6], PERIOD)
+    end = 6
+    for step in [1, 3, 0, 8, 2, 20, 1, 29]:
+        end += step
+        window = bars[max(0, end - 30):end]  # IB returns a trailing window, not the whole history
+        assert state.extend(window)
+        _assert_same_state(state, ATRState.from_bars(bars[:end], PERIOD))
+        expected = ScannerBase._wilder_atr(bars[:end], PERIOD)
+        assert state.atr == pytest.approx(expected, rel=1e-12)
+
+
+def test_extend_refuses_bars_that_do_not_connect():
+    bars = _bars(60, seed=4)
+    assert not ATRState(PERIOD).extend(bars)  # empty state
+    state = ATRState.from_bars(bars[:20], PERIOD)
+    before = _fields(state)
+    assert not state.extend(bars[25:])  # gap after the last folded bar
+    assert not state.extend([])
+    assert _fields(state) == before
+
+
+def test_peek_includes_forming_bar_without_committing():
+    bars = _bars(40, seed=5)
+    state = ATRState.from_bars(bars[:-1], PERIOD)
+    before = _fields(state)
+    assert state.peek(bars[-1]) == pytest.approx(ScannerBase._wilder_atr(bars, PERIOD), rel=1e-12)
+    assert state.peek(bars[-2]) == state.atr
+    assert state.peek(None) == state.atr
+    assert _fields(state) == before
+
+
+def test_from_bars_matches_batch_and_short_histories():
+    bars = _bars(50, seed=6)
+    for n in [0, 1, PERIOD, PERIOD + 1, 50]:
+        state = ATRState.from_bars(bars[:n], PERIOD)
+        expected = ScannerBase._wilder_atr(bars[:n], PERIOD)
+        assert state.atr == (None if expected is None else pytest.approx(expected, rel=1e-12))
+        assert state.bars == n
+    high, low, close = (np.array([getattr(b, k) for b in bars]) for k in ('high', 'low', 'close'))
+    assert wilder_atr_batch(high, low, close, PERIOD) == pytest.approx(ScannerBase._wilder_atr(bars, PERIOD), rel=1e-12)
+
+
+@pytest.mark.parametrize('persist', [False, True])
+def test_store_incremental_matches_cold_rebuild(tmp_path, persist):
+    path = str(tmp_path / 'bar_cache.sqlite') if persist else None
+    bars = _bars(200, seed=7, intraday=True)
+    store = ATRStore(path)
+    end = 60
+    for step in [0, 1, 1, 2, 5, 1, 13, 1]:
+        end += step
+        window = bars[end - 60:end]
+        # The last bar is still forming: a partial version first, then the final one
+        partial = SimpleNamespace(**{**vars(window[-1]), 'high': window[-1].open, 'low': window[-1].open})
+        assert store.atr(7, '30 mins', window[:-1] + [partial], PERIOD) == pytest.approx(
+            ScannerBase._wilder_atr(bars[:end - 1] + [partial], PERIOD), rel=1e-12)
+        atr = store.atr(7, '30 mins', window, PERIOD)
+        assert atr == pytest.approx(ScannerBase._wilder_atr(bars[:end], PERIOD), rel=1e-12)
+        _assert_same_state(store.get(7, '30 mins', PERIOD), ATRState.from_bars(bars[:end - 1], PERIOD))
+    assert store.cold_starts == 1
+    assert store.incremental == 2 * 8 - 1
+
+    if persist:
+        # A restarted store resumes the stored recursion instead of rebuilding
+        store.close()
+        restarted = ATRStore(path)
+        end += 3
+        atr = restarted.atr(7, '30 mins', bars[end - 60:end], PERIOD)
+        assert atr == pytest.approx(ScannerBase._wilder_atr(bars[:end], PERIOD), rel=1e-12)
+        assert (restarted.cold_starts, restarted.incremental) == (0, 1)
+        restarted.close()
+
+
+def test_store_rebuilds_when_state_does_not_connect():
+    bars = _bars(200, seed=8)
+    store = ATRStore(None)
+    store.atr(9, '1 day', bars[:60], PERIOD)
+    # Far past the stored state: the window no longer reaches the last folded bar
+    atr = store.atr(9, '1 day', bars[140:200], PERIOD)
+    assert store.cold_starts == 2
+    assert atr == pytest.approx(ScannerBase._wilder_atr(bars[140:200], PERIOD), rel=1e-12)
+    _assert_same_state(store.get(9, '1 day', PERIOD), ATRState.from_bars(bars[140:199], PERIOD))
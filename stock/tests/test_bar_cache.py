@@ -0,0 +1,74 @@
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from atr_state import ATRState, ATRStore
+from bar_cache import BarCache, CachedBar
+from realtime_bars import IntradayBarAggregator, _epoch
+
+
+@pytest.fixture
+def new_york(monkeypatch):
+    """Run as a TWS host in New York would: naive ib_insync bar times are US/Eastern."""
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def _bar(d, close=10.0):
+    return CachedBar(d, close, close + 0.5, close - 0.5, close, 100.0)
+
+
+def test_naive_bar_times_are_local(new_york):
+    naive = datetime(2024, 3, 4, 10, 0)  # formatDate=1: 10:00 in New York
+    aware = datetime(2024, 3, 4, 15, 0, tzinfo=timezone.utc)  # formatDate=2: same bar
+    assert BarCache._to_ts(naive) == BarCache._to_ts(aware) == '2024-03-04T15:00:00'
+    assert BarCache._from_ts(BarCache._to_ts(naive)) == aware
+    assert _epoch(naive) == _epoch(aware) == aware.timestamp()
+    assert BarCache._to_ts(date(2024, 3, 4)) == '2024-03-04'
+
+
+def test_refresh_duration_gap_from_local_bars(tmp_path, new_york):
+    cache = BarCache(str(tmp_path / 'bar_cache.sqlite'), max_age_secs=0)
+    last = datetime.now().replace(microsecond=0) - timedelta(hours=1)  # naive local, an hour ago
+    cache.update(1, '30 mins', [_bar(last - timedelta(minutes=30)), _bar(last)], full_fetch=True)
+    # One hour plus the re-requested last bar; read as UTC it would be 5-6 hours off
+    n = int(cache.refresh_duration(1, '30 mins', '2 D').split()[0])
+    assert 5390 <= n <= 5410
+    cache.close()
+
+
+def test_aggregator_merges_forming_bar_from_local_seed(new_york):
+    agg = IntradayBarAggregator(ib_client=None, bar_size='30 mins')
+    start = datetime(2024, 3, 4, 15, 0, tzinfo=timezone.utc)
+    # Stream of 5-second bars inside the seed's last interval and the next one
+    agg._fold(7, start.timestamp() + 600, 10.0, 11.5, 9.0, 10.8)
+    agg._fold(7, start.timestamp() + 1800, 10.8, 10.9, 10.7, 10.85)
+    naive_seed = [_bar(datetime(2024, 3, 4, 9, 30)), _bar(datetime(2024, 3, 4, 10, 0))]  # New York times
+    agg.seed(7, naive_seed, fetched_at=start.timestamp() + 900)
+    agg.started[7] = start.timestamp()
+    bars = agg.bars(7)  # the seeding span: its last bar merged with the stream, then the streamed one
+    assert [b.date for b in bars] == [naive_seed[1].date, start + timedelta(minutes=30)]
+    assert (bars[0].high, bars[0].low, bars[0].close) == (11.5, 9.0, 10.8)
+
+
+def test_cache_drops_intraday_rows_stamped_before_utc(tmp_path):
+    path = str(tmp_path / 'bar_cache.sqlite')
+    cache, store = BarCache(path), ATRStore(path)
+    cache.update(1, '30 mins', [_bar(datetime(2024, 3, 4, 10, 0))], full_fetch=True)
+    cache.update(1, '1 day', [_bar(date(2024, 3, 4))], full_fetch=True)
+    for bar_size, d in (('30 mins', datetime(2024, 3, 4, 10, 0)), ('1 day', date(2024, 3, 4))):
+        store.put(1, bar_size, ATRState.from_bars([_bar(d)]))
+    cache.conn.execute("PRAGMA user_version = 0")  # as written by a cache from before the fix
+    cache.conn.commit()
+    cache.close()
+    store.close()
+
+    cache = BarCache(path)
+    assert cache.load(1, '30 mins') == [] and cache.refresh_duration(1, '30 mins', '2 D') == '2 D'
+    assert [b.date for b in cache.load(1, '1 day')] == [date(2024, 3, 4)]
+    assert cache.conn.execute("SELECT bar_size FROM atr_state").fetchall() == [('1 day',)]
+    cache.close()
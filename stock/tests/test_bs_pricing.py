@@ -0,0 +1,139 @@
+import itertools
+from math import erf, exp, log, pi, sqrt
+
+import numpy as np
+import pytest
+
+import bs_pricing
+
+S = 100.0
+STRIKES = np.array([90.0, 95.0, 100.0, 105.0, 130.0])
+T = np.array([14.0, 30.0, 30.0, 60.0, 180.0]) / bs_pricing.DAYS_PER_YEAR
+SIGMA = np.array([0.35, 0.4, 0.55, 0.8, 1.5])
+
+
+def _norm_cdf(x):
+    return 0.5 * (1.0 + erf(x / sqrt(2.0)))
+
+
+def _prob_itm_from_iv(S, K, T_years, iv, r=0.045):
+    """The per-row formula the scanners used before bs_pricing."""
+    try:
+        if not all([S, K, T_years, iv]) or S <= 0 or K <= 0 or T_years <= 0 or iv <= 0:
+            return None
+        d1 = (log(S / K) + (r + 0.5 * iv ** 2) * T_years) / (iv * sqrt(T_years))
+        d2 = d1 - iv * sqrt(T_years)
+        return _norm_cdf(d2)
+    except Exception:
+        return None
+
+
+def _scalar_call(S, K, T_years, iv, r=0.045):
+    """Textbook call price and greeks, one contract at a time."""
+    d1 = (log(S / K) + (r + 0.5 * iv ** 2) * T_years) / (iv * sqrt(T_years))
+    d2 = d1 - iv * sqrt(T_years)
+    pdf_d1 = exp(-0.5 * d1 * d1) / sqrt(2.0 * pi)
+    disc = exp(-r * T_years)
+    return {
+        'd1': d1,
+        'd2': d2,
+        'price': S * _norm_cdf(d1) - K * disc * _norm_cdf(d2),
+        'delta': _norm_cdf(d1),
+        'gamma': pdf_d1 / (S * iv * sqrt(T_years)),
+        'vega': S * pdf_d1 * sqrt(T_years) / 100.0,
+        'theta': (-S * pdf_d1 * iv / (2 * sqrt(T_years)) - r * K * disc * _norm_cdf(d2)) / 365.0,
+        'rho': K * T_years * disc * _norm_cdf(d2) / 100.0,
+        'prob_itm': _norm_cdf(d2),
+    }
+
+
+GRID = list(itertools.product([5.0, 42.5, 180.0], [0.5, 0.9, 1.0, 1.15, 2.0], [1, 7, 45, 400], [0.08, 0.45, 1.2], [0.0, 0.045]))
+# (S, K, T_years, iv): zeros, negatives and NaN anywhere
+INVALID = [(0.0, 100.0, 0.1, 0.3), (100.0, 0.0, 0.1, 0.3), (100.0, 100.0, 0.0, 0.3), (100.0, 100.0, 0.1, 0.0),
+           (-5.0, 100.0, 0.1, 0.3), (100.0, 100.0, -0.1, 0.3), (100.0, 100.0, 0.1, -0.2),
+           (np.nan, 100.0, 0.1, 0.3), (100.0, np.nan, 0.1, 0.3), (100.0, 100.0, np.nan, 0.3), (100.0, 100.0, 0.1, np.nan)]
+
+
+@pytest.fixture(params=['scipy', 'erf'])
+def cdf_backend(request, monkeypatch):
+    if request.param == 'erf':
+        monkeypatch.setattr(bs_pricing, '_ndtr', None)
+    return request.param
+
+
+def _grid_columns():
+    S, moneyness, days, iv, r = (np.array(col, dtype=float) for col in zip(*GRID))
+    return S, S * moneyness, days / bs_pricing.DAYS_PER_YEAR, iv, r
+
+
+def test_prob_itm_matches_scalar_formula(cdf_backend):
+    S, K, T_years, iv, r = _grid_columns()
+    expected = np.array([_prob_itm_from_iv(*row) for row in zip(S, K, T_years, iv, r)])
+    for rate in (0.0, 0.045):
+        rows = r == rate
+        got = bs_pricing.prob_itm(S[rows], K[rows], T_years[rows], iv[rows], r=rate)
+        np.testing.assert_allclose(got, expected[rows], rtol=1e-12, atol=1e-14)
+
+
+def test_d1_d2_and_greeks_match_scalar_formula(cdf_backend):
+    S, K, T_years, iv, r = _grid_columns()
+    for rate in (0.0, 0.045):
+        rows = r == rate
+        d1, d2 = bs_pricing.d1_d2(S[rows], K[rows], T_years[rows], iv[rows], r=rate)
+        bs = bs_pricing.black_scholes(S[rows], K[rows], T_years[rows], iv[rows], r=rate)
+        expected = [_scalar_call(*row, r=rate) for row in zip(S[rows], K[rows], T_years[rows], iv[rows])]
+        np.testing.assert_allclose(d1, [e['d1'] for e in expected], rtol=1e-12)
+        np.testing.assert_allclose(d2, [e['d2'] for e in expected], rtol=1e-12)
+        for key in ('price', 'delta', 'gamma', 'vega', 'theta', 'rho', 'prob_itm'):
+            np.testing.assert_allclose(bs[key], [e[key] for e in expected], rtol=1e-9, atol=1e-12, err_msg=key)
+
+
+def test_invalid_inputs_are_nan_where_scalar_gave_none(cdf_backend):
+    S, K, T_years, iv = (np.array(col) for col in zip(*INVALID))
+    scalar = [_prob_itm_from_iv(*row) for row in INVALID]
+    # The old guard let NaN through to a NaN result; everything else was None
+    assert all(p is None or np.isnan(p) for p in scalar)
+    assert np.isnan(bs_pricing.prob_itm(S, K, T_years, iv)).all()
+    d1, d2 = bs_pricing.d1_d2(S, K, T_years, iv)
+    assert np.isnan(d1).all() and np.isnan(d2).all()
+    bs = bs_pricing.black_scholes(S, K, T_years, iv)
+    for key in ('price', 'delta', 'gamma', 'vega', 'theta', 'rho', 'prob_itm', 'prob_touch'):
+        assert np.isnan(bs[key]).all(), key
+
+    # Invalid cells must not disturb their valid neighbours
+    mixed = bs_pricing.prob_itm(np.append(S, 100.0), np.append(K, 105.0), np.append(T_years, 0.1), np.append(iv, 0.3))
+    assert np.isnan(mixed[:-1]).all()
+    assert mixed[-1] == pytest.approx(_prob_itm_from_iv(100.0, 105.0, 0.1, 0.3), rel=1e-12)
+
+
+@pytest.mark.parametrize('right', ['C', 'P'])
+def test_implied_vol_round_trip(right):
+    price = bs_pricing.black_scholes(S, STRIKES, T, SIGMA, right=right)['price']
+    iv = bs_pricing.implied_vol(price, S, STRIKES, T, right=right)
+    np.testing.assert_allclose(iv, SIGMA, rtol=1e-5)
+
+
+def test_implied_vol_bisection_fallback():
+    price = bs_pricing.black_scholes(S, STRIKES, T, SIGMA)['price']
+    # No Newton steps: every cell goes through _bisect_vol
+    iv = bs_pricing.implied_vol(price, S, STRIKES, T, max_iter=0)
+    np.testing.assert_allclose(iv, SIGMA, atol=1e-5)  # bisection stops once the bracket is under tol wide
+
+
+def test_implied_vol_far_otm_reprices(monkeypatch):
+    # Far OTM, short-dated: Newton leaves the cell and bisection finishes it
+    bisected = []
+    bisect = bs_pricing._bisect_vol
+    monkeypatch.setattr(bs_pricing, '_bisect_vol', lambda *a: bisected.append(a[-1].sum()) or bisect(*a))
+    K, t = np.array([200.0]), np.array([5.0]) / bs_pricing.DAYS_PER_YEAR
+    price = bs_pricing.black_scholes(S, K, t, 2.0)['price']
+    iv = bs_pricing.implied_vol(price, S, K, t)
+    assert bisected == [1]
+    assert np.isfinite(iv).all()
+    np.testing.assert_allclose(bs_pricing.black_scholes(S, K, t, iv)['price'], price, rtol=1e-4)
+
+
+def test_implied_vol_outside_bounds_is_nan():
+    intrinsic = S - 80.0
+    iv = bs_pricing.implied_vol([0.0, intrinsic * 0.9, S * 1.1, 1.0], S, [100.0, 80.0, 100.0, 100.0], [0.1, 0.1, 0.1, 0.0])
+    assert np.isnan(iv).all()
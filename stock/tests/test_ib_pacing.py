@@ -0,0 +1,83 @@
+import pytest
+
+import ib_pacing
+from ib_pacing import IBPacer
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, secs):
+        self.now += secs
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = FakeClock()
+    monkeypatch.setattr(ib_pacing.time, 'time', c.time)
+    return c
+
+
+def test_sixty_requests_per_ten_minutes(clock):
+    pacer = IBPacer(safety_margin_secs=0.5, same_contract_burst=1000)
+    delays = [pacer.reserve_historical(request_key=i) for i in range(60)]
+    assert delays == [0.0] * 60
+    # The 61st waits for the first slot to leave the window
+    assert pacer.reserve_historical(request_key=60) == pytest.approx(600.5)
+    assert pacer.reserve_historical(request_key=61) == pytest.approx(600.5)
+
+    clock.now += 300
+    assert pacer.hist_requests_in_window() == 62  # reserved slots count as soon as they're handed out
+    clock.now += 300.1
+    assert pacer.hist_requests_in_window() == 2
+
+
+def test_identical_request_cooldown(clock):
+    pacer = IBPacer()
+    key = ('AAPL', '2 D', '30 mins')
+    assert pacer.reserve_historical(request_key=key) == 0.0
+    assert pacer.reserve_historical(request_key=('AAPL', '60 D', '1 day')) == 0.0
+    assert pacer.reserve_historical(request_key=key) == pytest.approx(15.0)
+
+    clock.now += 20
+    assert pacer.reserve_historical(request_key=key) == pytest.approx(10.0)  # 15 s after the previous slot
+
+
+def test_line_acquire_release(clock):
+    pacer = IBPacer(max_market_data_lines=3)
+    assert pacer.try_acquire_lines(2)
+    assert not pacer.try_acquire_lines(2)
+    assert pacer.try_acquire_lines_up_to(5) == 1
+    assert pacer.lines_in_use == 3
+    assert pacer.try_acquire_lines_up_to(1) == 0
+
+    pacer.release_lines(2)
+    assert pacer.lines_in_use == 1
+    assert pacer.acquire_some_lines(5, sleep=clock.sleep) == 2
+    assert pacer.peak_lines == 3
+
+    pacer.release_lines(10)  # over-release never goes negative
+    assert pacer.lines_in_use == 0
+    with pytest.raises(ValueError):
+        pacer.try_acquire_lines(4)
+
+
+def test_blocked_acquire_waits_for_a_release(clock):
+    pacer = IBPacer(max_market_data_lines=1)
+    pacer.acquire_lines(1)
+    polls = []
+
+    def sleep(secs):
+        polls.append(secs)
+        clock.sleep(secs)
+        if len(polls) == 3:
+            pacer.release_lines(1)  # freed elsewhere while we wait
+
+    pacer.acquire_lines(1, sleep=sleep)
+    assert len(polls) == 3
+    assert pacer.lines_in_use == 1
+    assert pacer.waits_by_limit['lines'] == 1
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from payoff_engine import PayoffEngine
+
+PRICE, HIGH_5D = 20.0, 22.5
+STRIKES = np.array([18.0, 20.0, 21.0, 22.0, 23.0, 25.0, 30.0])
+T_YEARS = np.array([7, 7, 14, 14, 14, 30, 30]) / 365.0
+IV = np.array([0.6, 0.55, 0.5, 0.5, 0.52, 0.6, 0.7])
+PREMIUM = np.array([2.2, 0.8, 0.5, 0.3, 0.15, 0.2, 0.05])
+
+
+def _features(**kw):
+    return PayoffEngine(**kw).features(PRICE, STRIKES, T_YEARS, IV, PREMIUM, HIGH_5D)
+
+
+def test_monte_carlo_matches_closed_form():
+    exact = _features(model='closed_form')
+    mc = _features(model='monte_carlo', n_paths=100000, batch_paths=10000, seed=7, budget_secs=None)
+    assert (mc['mc_paths'] == 100000).all()
+    for col in ('prob_touch_high', 'prob_ten_bagger'):
+        np.testing.assert_allclose(mc[col], exact[col], atol=0.01)
+    np.testing.assert_allclose(mc['expected_payoff'], exact['expected_payoff'], atol=0.01)
+
+
+def test_monte_carlo_is_reproducible():
+    a = _features(model='monte_carlo', n_paths=4000, batch_paths=1000, seed=3, budget_secs=None)
+    b = _features(model='monte_carlo', n_paths=4000, batch_paths=1000, seed=3, budget_secs=None)
+    c = _features(model='monte_carlo', n_paths=4000, batch_paths=1000, seed=4, budget_secs=None)
+    assert a.equals(b)
+    assert not a.equals(c)
+
+
+def test_closed_form_bounds():
+    out = _features(model='closed_form')
+    assert ((out['prob_touch_high'] >= 0) & (out['prob_touch_high'] <= 1)).all()
+    # The 5-day high is above spot, so touching 10x can't be likelier than touching it for the far strikes
+    assert (out['prob_ten_bagger'].iloc[-2:] <= out['prob_touch_high'].iloc[-2:]).all()
+    # Selling at the high is worth at least its intrinsic value times the odds of getting there
+    floor = out['prob_touch_high'] * np.maximum(HIGH_5D - STRIKES, 0.0)
+    assert (out['expected_payoff'] >= floor - 1e-12).all()
+
+
+def test_invalid_inputs():
+    with pytest.raises(ValueError):
+        PayoffEngine(model='binomial')
+    with pytest.raises(ValueError):
+        PayoffEngine(tail_df=2)
+    out = PayoffEngine().features(PRICE, STRIKES[:2], T_YEARS[:2], [np.nan, 0.0], PREMIUM[:2], HIGH_5D)
+    assert out[['prob_touch_high', 'expected_payoff']].isna().all().all()
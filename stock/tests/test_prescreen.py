@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from cheap_calls_scanner import CheapOptionsScanner
+from prescreen import bar_block, daily_gates, intraday_gate
+
+# Short histories on both sides of the 15-bar daily and 21-bar intraday minimums
+LENGTHS = [0, 1, 5, 14, 15, 16, 20, 21, 22, 40, 60]
+
+
+def _bars(rng, n, start, vol):
+    closes = start * np.exp(np.cumsum(rng.normal(0.0, vol, n)))
+    opens = np.concatenate([[start], closes[:-1]])
+    highs = np.maximum(opens, closes) * (1 + rng.uniform(0.0, vol, n))
+    lows = np.minimum(opens, closes) * (1 - rng.uniform(0.0, vol, n))
+    return [SimpleNamespace(open=o, high=h, low=lo, close=c) for o, h, lo, c in zip(opens, highs, lows, closes)]
+
+
+def _universe(seed, n=400, vol=(0.005, 0.05)):
+    """Random symbols: log-uniform prices from $2 (under the low-price floor) to $300, assorted history lengths."""
+    rng = np.random.default_rng(seed)
+    bars, prices = {}, {}
+    for i in range(n):
+        start = float(np.exp(rng.uniform(np.log(2.0), np.log(300.0))))
+        sym_bars = _bars(rng, int(rng.choice(LENGTHS)), start, rng.uniform(*vol))
+        last = sym_bars[-1].close if sym_bars else start
+        bars[f"S{i:03d}"] = sym_bars
+        prices[f"S{i:03d}"] = last * (1 + rng.normal(0.0, 0.02))
+    return bars, prices
+
+
+@pytest.fixture(params=[dict(), dict(min_atr_pct=1.0, min_abs_atr=0.3), dict(min_atr_pct=None, min_abs_atr_low_price=0.4)],
+                ids=['defaults', 'abs-atr', 'floor-only'])
+def scanner(request):
+    return CheapOptionsScanner(bar_cache_path=None, chain_cache_path=None, snapshot_path=None, auto_connect=False, **request.param)
+
+
+def _scalar_daily(scanner, price, bars):
+    """passes_daily_atr_filters + is_pullback_recovery_candidate as the per-symbol path calls them."""
+    price, high_5d, low_5d, bars, _ = scanner._summarize_daily_bars(price, bars, None)
+    atr = scanner._wilder_atr(bars, 14) if bars else None
+    ok_atr = bool(bars) and scanner.passes_daily_atr_filters(atr, price)[0]
+    ok_structure = scanner.is_pullback_recovery_candidate(price, high_5d, low_5d)[0]
+    return atr, ok_atr, ok_structure
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_daily_gates_match_scalar_filters(scanner, seed):
+    bars, prices = _universe(seed)
+    screen = daily_gates(scanner, list(prices.values()), bar_block(bars))
+    floor_hits = 0
+    for s in bars:
+        atr, ok_atr, ok_structure = _scalar_daily(scanner, prices[s], bars[s])
+        row = screen.loc[s]
+        assert bool(row['pass_daily_atr']) == ok_atr, s
+        assert bool(row['pass_structure']) == ok_structure, s
+        if atr is None:
+            assert np.isnan(row['atr'])
+        else:
+            assert row['atr'] == pytest.approx(atr, rel=1e-9)
+            floor_hits += prices[s] < scanner.low_price_threshold and atr < scanner.min_abs_atr_low_price
+    # Every gate outcome (and the low-price floor) actually shows up in the universe
+    assert screen['pass_daily_atr'].any() and not screen['pass_daily_atr'].all()
+    assert screen['pass_structure'].any() and not screen['pass_structure'].all()
+    assert floor_hits
+
+
+@pytest.mark.parametrize('seed', [4, 5])
+def test_intraday_gate_matches_scalar_gate(scanner, seed):
+    bars, prices = _universe(seed, vol=(0.001, 0.008))  # 30-min bars straddle the 0.8% intraday ATR gate
+    gate = intraday_gate(scanner, list(prices.values()), bar_block(bars))
+    for s in bars:
+        ok, _, iatr, iatr_pct = scanner._evaluate_intraday_bars(bars[s], prices[s])
+        row = gate.loc[s]
+        assert bool(row['pass_intraday_atr']) == ok, s
+        if iatr is None:
+            assert np.isnan(row['iatr']) and np.isnan(row['iatr_pct'])
+        else:
+            assert row['iatr'] == pytest.approx(iatr, rel=1e-9)
+            assert row['iatr_pct'] == pytest.approx(iatr_pct, rel=1e-9)
+    assert gate['pass_intraday_atr'].any() and not gate['pass_intraday_atr'].all()
+
+
+def test_empty_block():
+    scanner = CheapOptionsScanner(bar_cache_path=None, chain_cache_path=None, snapshot_path=None, auto_connect=False)
+    screen = daily_gates(scanner, [12.0, 30.0], bar_block({'A': [], 'B': None}))
+    assert not screen['pass_daily_atr'].any() and not screen['pass_structure'].any()
+    gate = intraday_gate(scanner, [12.0, 30.0], bar_block({'A': [], 'B': None}))
+    assert gate['pass_intraday_atr'].all()  # too little history skips the gate
@@ -0,0 +1,85 @@
+import pandas as pd
+import pytest
+
+import slack_notify
+from slack_notify import MAX_BLOCKS, SlackNotifier, SlackStub, chunk_lines, results_messages
+
+
+@pytest.fixture
+def stub():
+    s = SlackStub(retry_after=0.01)
+    yield s
+    s.close()
+
+
+@pytest.fixture
+def notifier(stub):
+    n = SlackNotifier(stub.url, max_retries=3, backoff_secs=0.01)
+    yield n
+    n.close()
+
+
+def test_chunk_lines_respects_section_limit():
+    lines = [f"line {i:04d} " + 'x' * 90 for i in range(200)]
+    chunks = chunk_lines(lines, max_chars=1000)
+    assert all(len(c) <= 1000 for c in chunks)
+    assert '\n'.join(chunks).split('\n') == lines
+    assert chunk_lines(['y' * 5000], max_chars=3000) == ['y' * 3000]
+
+
+def test_results_messages_split_over_block_limit():
+    lines = ['z' * 2900] * 120  # one section each
+    messages = results_messages('Scan', lines, footer='f')
+    assert len(messages) == 3
+    assert [len(m['blocks']) for m in messages] == [MAX_BLOCKS, MAX_BLOCKS, 120 - 2 * (MAX_BLOCKS - 2) + 2]
+    assert messages[0]['text'] == 'Scan (1/3)'
+    for m in messages:
+        assert m['blocks'][0]['type'] == 'header' and m['blocks'][-1]['type'] == 'context'
+    assert sum(len(m['blocks']) - 2 for m in messages) == 120
+
+
+def test_rate_limited_posts_are_retried(stub, notifier):
+    stub.rate_limited = 2
+    notifier.send_text('hello')
+    assert notifier.flush(timeout=10)
+    assert stub.requests == 3
+    assert stub.payloads == [{'text': 'hello'}]
+    assert (notifier.sent, notifier.failed, notifier.retries) == (1, 0, 2)
+
+
+def test_gives_up_after_max_retries(stub, notifier):
+    stub.rate_limited = 10
+    notifier.send_text('dropped')
+    notifier.send_text('dropped too')
+    assert notifier.flush(timeout=10)
+    assert stub.requests == 8  # 1 + max_retries each
+    assert stub.payloads == []
+    assert (notifier.sent, notifier.failed, notifier.retries) == (0, 2, 6)
+
+
+def test_send_results_delivers_every_chunk_in_order(stub, notifier):
+    stub.rate_limited = 1
+    lines = [f"• SYM{i:03d} " + 'x' * 2900 for i in range(60)]
+    n = notifier.send_results('🎲 Scan', lines, footer='File: scan.csv')
+    assert notifier.flush(timeout=10)
+    assert n == 2 and len(stub.payloads) == 2
+    assert [p['text'] for p in stub.payloads] == ['🎲 Scan (1/2)', '🎲 Scan (2/2)']
+    assert [len(p['blocks']) for p in stub.payloads] == [MAX_BLOCKS, 60 - (MAX_BLOCKS - 2) + 2]
+    sections = [b['text']['text'] for p in stub.payloads for b in p['blocks'] if b['type'] == 'section']
+    assert sections == lines
+    assert notifier.retries == 1
+
+
+def test_send_to_slack_formats_found(stub):
+    found = {'AAA': pd.DataFrame([{'strike': 20.0}]), 'BBB': pd.DataFrame([{'strike': 30.0}])}
+    line = lambda symbol, best: f"{symbol} {best['strike']:.0f}"  # noqa: E731
+    slack_notify.send_to_slack('Cheap Calls Scanner', found, line, 'scan.csv', webhook_url=stub.url)
+    slack_notify.send_to_slack('Cheap Calls Scanner', {}, line, emoji='🎯', empty_text='Nothing', webhook_url=stub.url)
+    assert slack_notify.notifier_for(stub.url).flush(timeout=10)
+    first, empty = stub.payloads
+    assert first['text'] == '🎲 Cheap Calls Scanner - Found 2 opportunities'
+    assert [b['text']['text'] for b in first['blocks'][1:-1]] == ['AAA 20\nBBB 30']
+    assert first['blocks'][-1]['elements'][0]['text'] == 'File: scan.csv'
+    assert empty['text'] == '🎯 Cheap Calls Scanner'
+    assert empty['blocks'][1]['text']['text'] == 'Nothing'
+    slack_notify._notifiers.pop(stub.url).close()
@@ -0,0 +1,120 @@
+import math
+import time
+from collections import deque, namedtuple
+
+# ready/missing are lists of tickers; elapsed is seconds spent waiting
+WaitResult = namedtuple('WaitResult', ['ready', 'missing', 'elapsed'])
+
+
+def _has(value):
+    return value is not None and not (isinstance(value, float) and math.isnan(value))
+
+
+def stock_price_ready(t):
+    """A usable underlying price has arrived (last or bid/ask midpoint)."""
+    price = t.marketPrice()
+    return (_has(price) and price > 0) or (_has(t.last) and t.last > 0)
+
+
+def quote_ready(t):
+    """Both sides of the option quote have arrived."""
+    return _has(t.bid) and _has(t.ask) and t.ask > 0
+
+
+def option_ready(t):
+    """Bid, ask and model greeks (generic tick 106) have all arrived."""
+    return quote_ready(t) and t.modelGreeks is not None
+
+
+def quote_volume_ready(t):
+    """quote_ready plus today's volume, for strategies that filter on volume."""
+    return quote_ready(t) and _has(t.volume)
+
+
+def option_volume_ready(t):
+    """option_ready plus today's volume, for strategies that filter on volume."""
+    return option_ready(t) and _has(t.volume)
+
+
+# (wants greeks, wants volume) -> readiness predicate, so a batch can wait for what every consumer needs
+READY = {
+    (False, False): quote_ready,
+    (True, False): option_ready,
+    (False, True): quote_volume_ready,
+    (True, True): option_volume_ready,
+}
+
+
+class TickerWaves:
+    """
+    Bookkeeping for quoting contracts through a bounded pool of market data lines.
+
+    Contracts go out in waves as lines free up; each ticker has its own deadline (timeout
+    after its request). An expired ticker gives its line back at once; a ready one keeps
+    streaming (volume, open interest, ... may still be arriving) until its line is wanted
+    by a pending contract, or the batch is done. The IB calls live in
+    ScannerBase._stream_tickers; this only tracks positions, deadlines and outcomes.
+    """
+
+    def __init__(self, contracts, ready, timeout, poll_secs=0.05):
+        self.contracts = list(contracts)
+        self.ready = ready
+        self.timeout = float(timeout)
+        self.poll_secs = float(poll_secs)
+        self.pending = deque(range(len(self.contracts)))
+        self.active = {}  # position -> (ticker, deadline)
+        self.lingering = deque()  # ready tickers still holding their line
+        self.tickers = [None] * len(self.contracts)
+        self.done, self.missing = [], []
+        self.start = time.time()
+
+    def take(self, n):
+        """Positions of the next n contracts to request"""
+        return [self.pending.popleft() for _ in range(min(n, len(self.pending)))]
+
+    def started(self, positions, tickers):
+        deadline = time.time() + self.timeout
+        for i, t in zip(positions, tickers):
+            self.tickers[i] = t
+            self.active[i] = (t, deadline)
+
+    def settle(self):
+        """Move ready tickers to lingering; returns the expired ones (their lines are due back)"""
+        now = time.time()
+        expired = []
+        for i, (t, deadline) in list(self.active.items()):
+            if self.ready(t):
+                self.done.append(t)
+                self.lingering.append(t)
+            elif now >= deadline:
+                self.missing.append(t)
+                expired.append(t)
+            else:
+                continue
+            del self.active[i]
+        return expired
+
+    def release_lingering(self, n=None):
+        """Up to n ready tickers (oldest first) whose lines can be handed on"""
+        n = len(self.lingering) if n is None else min(n, len(self.lingering))
+        return [self.lingering.popleft() for _ in range(n)]
+
+    def wake_in(self):
+        """Seconds until the nearest deadline (polled while contracts wait for lines)"""
+        nearest = min(deadline for _, deadline in self.active.values()) - time.time()
+        return max(0.0, min(nearest, self.poll_secs) if self.pending else nearest)
+
+    def result(self):
+        """Requested tickers in contract order, and the combined WaitResult"""
+        return [t for t in self.tickers if t is not None], WaitResult(self.done, self.missing, time.time() - self.start)
+
+
+def describe_wait(result, label='tickers'):
+    total = len(result.ready) + len(result.missing)
+    if not result.missing:
+        return f"⚡ {total}/{total} {label} ready in {result.elapsed:.2f}s"
+    symbols = ", ".join(
+        f"{t.contract.symbol} {t.contract.strike:g}" if t.contract.strike else t.contract.symbol
+        for t in result.missing[:5]
+    )
+    return f"⏳ {len(result.ready)}/{total} {label} ready after {result.elapsed:.2f}s (missing: {symbols})"
@@ -0,0 +1,34 @@
+import pandas as pd
+
+# How the relative score components (risk/reward, volume, open interest) are scaled to [0, 1]:
+#   symbol      against the best value of the same symbol (each symbol's best contract scores high)
+#   global      against the best value of every candidate in the scan
+#   percentile  by percentile rank among every candidate in the scan (robust to one outlier)
+NORMALIZATIONS = ('symbol', 'global', 'percentile')
+
+
+def check_normalization(method):
+    if method not in NORMALIZATIONS:
+        raise ValueError(f"Unknown score normalization {method!r}; use one of {list(NORMALIZATIONS)}")
+    return method
+
+
+def normalized(values, groups=None, method='symbol'):
+    """
+    values scaled to [0, 1] in one vectorized pass; groups (the symbol column) is only used
+    by 'symbol'. A group whose best value isn't positive scores 0; NaNs stay NaN.
+    """
+    values = pd.to_numeric(values, errors='coerce').astype(float)
+    if method == 'percentile':
+        return values.rank(pct=True)
+    if method == 'symbol' and groups is not None:
+        peak = values.groupby(groups, sort=False).transform('max')
+    else:
+        peak = pd.Series(values.max(), index=values.index)
+    scaled = (values / peak.where(peak > 0)).clip(0, 1)
+    return scaled.mask(~(peak > 0), 0.0)
+
+
+def column(df, name, default=0.0):
+    """df[name], or a constant column when the frame doesn't carry it"""
+    return df[name] if name in df else pd.Series(default, index=df.index)
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+
+class VolIndex:
+    """
+    In-memory implied volatility index per underlying, built from the chains the scanners fetch.
+
+    For every expiration it keeps the ATM IV (interpolated at log-moneyness 0) and the
+    skew (slope of IV against log-moneyness), so scoring can ask questions like
+    "is this strike's IV rich or cheap versus its own expiry?" or "is the term
+    structure inverted?" without another round trip to IB.
+    """
+
+    COLUMNS = ['expiration', 'dte', 'strike', 'moneyness', 'iv']
+
+    def __init__(self):
+        self._points = {}  # symbol -> DataFrame[COLUMNS]
+        self._terms = {}   # symbol -> DataFrame[expiration, dte, atm_iv, skew, n]
+
+    def update(self, symbol, price, expirations, strikes, iv, T_years):
+        """Replace the symbol's surface with the latest observations (NaN IVs are ignored)."""
+        strikes = np.asarray(strikes, dtype=float)
+        iv = np.asarray(iv, dtype=float)
+        points = pd.DataFrame({
+            'expiration': np.asarray(expirations, dtype=str),
+            'dte': np.rint(np.asarray(T_years, dtype=float) * 365.0).astype(int),
+            'strike': strikes,
+            'moneyness': np.log(strikes / price) if price else np.nan,
+            'iv': iv,
+        })
+        points = points[np.isfinite(points['iv']) & (points['iv'] > 0) & np.isfinite(points['moneyness'])]
+        if points.empty:
+            return
+        self._points[symbol] = points
+        self._terms[symbol] = pd.DataFrame(
+            [self._fit_expiry(exp, g) for exp, g in points.groupby('expiration', sort=False)],
+            columns=['expiration', 'dte', 'atm_iv', 'skew', 'n'],
+        ).sort_values('dte').reset_index(drop=True)
+
+    @staticmethod
+    def _fit_expiry(expiration, g):
+        g = g.sort_values('moneyness')
+        m, v = g['moneyness'].to_numpy(), g['iv'].to_numpy()
+        atm = float(np.interp(0.0, m, v))  # flat extrapolation past the quoted strikes
+        skew = float(np.polyfit(m, v, 1)[0]) if len(g) >= 2 and np.ptp(m) > 0 else np.nan
+        return expiration, int(g['dte'].iloc[0]), atm, skew, len(g)
+
+    # ---------- Queries ----------
+    def symbols(self):
+        return list(self._terms)
+
+    def term_structure(self, symbol):
+        """Per-expiration ATM IV and skew, nearest expiry first (empty frame if unknown)."""
+        return self._terms.get(symbol, pd.DataFrame(columns=['expiration', 'dte', 'atm_iv', 'skew', 'n'])).copy()
+
+    def atm_iv(self, symbol, dte):
+        """ATM IV at an arbitrary DTE, interpolated linearly in total variance between expiries."""
+        terms = self._terms.get(symbol)
+        if terms is None or terms.empty:
+            return np.nan
+        days = terms['dte'].to_numpy(dtype=float).clip(min=1)
+        total_var = terms['atm_iv'].to_numpy() ** 2 * days
+        dte = max(float(dte), 1.0)
+        return float(np.sqrt(np.interp(dte, days, total_var) / dte))
+
+    def skew(self, symbol, expiration):
+        terms = self._terms.get(symbol)
+        if terms is None:
+            return np.nan
+        row = terms[terms['expiration'] == expiration]
+        return float(row['skew'].iloc[0]) if not row.empty else np.nan
+
+    def term_slope(self, symbol):
+        """ATM IV change per 30 days between the nearest and farthest expiry (negative = inverted)."""
+        terms = self._terms.get(symbol)
+        if terms is None or len(terms) < 2 or terms['dte'].iloc[-1] == terms['dte'].iloc[0]:
+            return np.nan
+        near, far = terms.iloc[0], terms.iloc[-1]
+        return float((far['atm_iv'] - near['atm_iv']) / (far['dte'] - near['dte']) * 30.0)
+
+    def features(self, symbol, expirations, iv):
+        """
+        Per-row surface features aligned with (expirations, iv):
+        dte, atm_iv of the row's expiry, iv_vs_atm (iv / atm_iv - 1), skew and term_slope.
+        """
+        expirations = pd.Series(np.asarray(expirations, dtype=str))
+        terms = self.term_structure(symbol).set_index('expiration')
+        atm = expirations.map(terms['atm_iv']).to_numpy(dtype=float)
+        return pd.DataFrame({
+            'dte': expirations.map(terms['dte']).to_numpy(dtype=float),
+            'atm_iv': atm,
+            'iv_vs_atm': np.asarray(iv, dtype=float) / atm - 1.0,
+            'skew': expirations.map(terms['skew']).to_numpy(dtype=float),
+            'term_slope': self.term_slope(symbol),
+        })
+
+    def summary(self):
+        n_exp = sum(len(t) for t in self._terms.values())
+        return f"{len(self._terms)} underlyings | {n_exp} expirations indexed"